@@ -0,0 +1,27 @@
+"""
+Gunicorn settings for the ASGI deployment (see docker/docker-compose.yml).
+
+Each worker opens its Neo4j pool right after the fork, so the first chat in a
+fresh worker does not pay for the connection handshake. Set NEO4J_WARMUP=0 to
+skip it; a failed warm-up is logged and the worker still starts.
+"""
+
+import os
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    if os.getenv("NEO4J_WARMUP", "1") == "1":
+        from CourseCompass.neo4j_driver import warm_up
+
+        warm_up(int(os.getenv("NEO4J_WARMUP_CONNECTIONS", 2)))
+
+
+def worker_exit(server, worker):
+    from CourseCompass.neo4j_driver import close_driver
+
+    close_driver()
@@ -0,0 +1,229 @@
+"""
+Request metrics
+---------------
+Timing spans for the advisor pipeline, aggregated in-process into Prometheus
+histograms and counters and served as text by CourseCompass.views.metrics.
+
+  with span("llm"):          # one stage: plan, graph, cypher, llm, render
+      ...
+
+  with turn():               # one advisor turn, labelled with its intent
+      ...
+
+Spans are labelled with the intent of the turn they run in (a context
+variable, so it follows sync_to_async and asyncio tasks). The intent is
+usually only known once planning finishes; spans and turns read it when they
+end, so the planning span carries the planned intent too.
+
+Every span is also logged on the "CourseCompass.metrics" logger at DEBUG as
+`span stage=... intent=... seconds=...` (the same fields are passed as
+`extra` for structured formatters). SPAN_LOG_LEVEL=DEBUG turns them on; see
+LOGGING in settings.py.
+
+Numbers are per process: with several workers each one serves its own.
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers in-memory graph lookups up to slow LLM completions.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+current_intent: contextvars.ContextVar = contextvars.ContextVar("current_intent", default="none")
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, labels)} {_number(v)}" for labels, v in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels: str) -> int:
+        with self._lock:
+            series = self._series.get(labels)
+            return sum(series[0]) if series else 0
+
+    def expose(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        All metrics in the Prometheus text exposition format (0.0.4).
+        """
+        return "\n".join(line for metric in self.metrics for line in metric.expose()) + "\n"
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "coursecompass_stage_seconds", "Time spent in one pipeline stage.", ("stage", "intent")))
+STAGE_ERRORS = REGISTRY.register(Counter(
+    "coursecompass_stage_errors_total", "Pipeline stages that raised.", ("stage", "intent")))
+TURN_SECONDS = REGISTRY.register(Histogram(
+    "coursecompass_turn_seconds", "End-to-end advisor turn time.", ("intent",)))
+TURNS = REGISTRY.register(Counter(
+    "coursecompass_turns_total", "Advisor turns by intent and outcome.", ("intent", "outcome")))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "coursecompass_llm_tokens_total", "Tokens reported by the LLM API.", ("model", "kind")))
+
+
+def set_intent(intent: str) -> None:
+    current_intent.set(intent or "none")
+
+
+def _log(kind: str, name: str, intent: str, seconds: float, ok: bool) -> None:
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%s stage=%s intent=%s seconds=%.4f ok=%s", kind, name, intent, seconds, ok,
+                     extra={"span": {"kind": kind, "stage": name, "intent": intent,
+                                     "seconds": seconds, "ok": ok}})
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Times the block as one `stage` of the current turn. An exception counts
+    as a stage error; closing a generator early does not.
+    """
+    started = time.perf_counter()
+    ok = True
+    try:
+        yield
+    except Exception:
+        ok = False
+        raise
+    finally:
+        seconds = time.perf_counter() - started
+        intent = current_intent.get()
+        STAGE_SECONDS.observe(seconds, stage, intent)
+        if not ok:
+            STAGE_ERRORS.inc(stage, intent)
+        _log("span", stage, intent, seconds, ok)
+
+
+def timed(stage: str):
+    """
+    Decorator form of span() for plain and async functions.
+    """
+    def decorate(func):
+        if iscoroutinefunction(func):
+            @wraps(func)
+            async def wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+        else:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with span(stage):
+                    return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_turn(seconds: float, ok: bool = True) -> None:
+    intent = current_intent.get()
+    TURN_SECONDS.observe(seconds, intent)
+    TURNS.inc(intent, "ok" if ok else "error")
+    _log("turn", "turn", intent, seconds, ok)
+
+
+@contextmanager
+def turn():
+    """
+    Times one advisor turn; the intent label is whatever the turn planned.
+    Handled failures (a streamed error event) set `status["ok"] = False` on
+    the yielded dict. The previous intent is restored by value rather than
+    with a context token, so the block may span the yields of a generator.
+    """
+    previous = current_intent.get()
+    current_intent.set("none")
+    status = {"ok": True}
+    started = time.perf_counter()
+    try:
+        yield status
+    except Exception:
+        status["ok"] = False
+        raise
+    finally:
+        record_turn(time.perf_counter() - started, status["ok"])
+        current_intent.set(previous)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -1,29 +1,49 @@
 """
-Neo4j Database Connection Script
---------------------------------
-This script connects to the Neo4j Aura database using the official Neo4j Python driver.
-This contanins the graph of the various courses and their prerequisites.
+Neo4j Database Connection
+-------------------------
+Connects to the Neo4j Aura database that holds the graph of courses and their
+prerequisites, using the official Neo4j Python driver.
 It bypasses SSL certificate verification (use with caution in production) to handle 
 self-signed certificates or local development environments.
 
-Functionality:
-1. Defines database connection credentials.
-2. Configures an SSL context to skip certificate validation.
-3. Establishes a connection to the Neo4j instance.
-4. Verifies the connection.
-5. Runs a simple test query to confirm connectivity.
+The driver is created lazily on first use by `get_driver()`, so importing this
+module (manage.py migrate, collectstatic, tests) never touches the database.
+One driver is kept per process; a forked worker gets its own. `warm_up()` opens
+pool connections ahead of the first request (see CourseCompass/gunicorn.conf.py)
+and `close_driver()` shuts the pool down cleanly. The async drivers used by the
+ASGI views are closed when their event loop shuts down.
+
+Pool tuning (environment):
+  NEO4J_MAX_POOL_SIZE              connections per process (default 50)
+  NEO4J_MAX_CONNECTION_LIFETIME    seconds before a connection is recycled (default 1800;
+                                   keep below Aura's idle timeout)
+  NEO4J_ACQUISITION_TIMEOUT        seconds to wait for a free connection (default 30)
+  NEO4J_LIVENESS_CHECK_TIMEOUT     idle seconds after which a pooled connection is
+                                   checked before reuse (default 60)
 """
 
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, GraphDatabase
+import asyncio
+import atexit
+import logging
 import ssl
 import os
+import threading
+import weakref
+
+logger = logging.getLogger(__name__)
 
 # Neo4j Aura credentials (loaded from environment)
 NEO4J_URI = os.getenv("NEO4J_URI", "database_uri")
 NEO4J_USER = os.getenv("NEO4J_USERNAME", "database_usr")
 NEO4J_PASS = os.getenv("NEO4J_PASSWORD", "database_pass")
 
-
+POOL_SETTINGS = {
+    "max_connection_pool_size": int(os.getenv("NEO4J_MAX_POOL_SIZE", 50)),
+    "max_connection_lifetime": float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", 1800)),
+    "connection_acquisition_timeout": float(os.getenv("NEO4J_ACQUISITION_TIMEOUT", 30)),
+    "liveness_check_timeout": float(os.getenv("NEO4J_LIVENESS_CHECK_TIMEOUT", 60)),
+}
 
 # Create an SSL context that disables certificate verification
 # WARNING: This is insecure for production. 
@@ -32,17 +52,115 @@ ssl_context = ssl.create_default_context()
 ssl_context.check_hostname = False
 ssl_context.verify_mode = ssl.CERT_NONE
 
-# Initialize the Neo4j driver with the provided credentials and SSL settings
-driver = GraphDatabase.driver(
-    NEO4J_URI,
-    auth=(NEO4J_USER, NEO4J_PASS),
-    ssl_context=ssl_context
-)
+_lock = threading.Lock()
+_driver = None
+_driver_pid = None
+
+
+def get_driver():
+    """
+    The process-wide Neo4j driver, created on first call. Creating it does not
+    connect; connections are opened by the pool as sessions need them.
+    """
+    global _driver, _driver_pid
+    pid = os.getpid()
+    if _driver is not None and _driver_pid == pid:
+        return _driver
+    with _lock:
+        if _driver is None or _driver_pid != pid:
+            # After a fork the parent's sockets must not be shared: start a new pool.
+            _driver = GraphDatabase.driver(
+                NEO4J_URI,
+                auth=(NEO4J_USER, NEO4J_PASS),
+                ssl_context=ssl_context,
+                **POOL_SETTINGS,
+            )
+            _driver_pid = pid
+    return _driver
+
+
+def warm_up(connections: int = 2) -> bool:
+    """
+    Verifies connectivity and opens `connections` pooled connections so the
+    first requests do not pay for the TLS handshake. Returns False (and logs)
+    instead of raising when the database is unreachable.
+    """
+    try:
+        driver = get_driver()
+        driver.verify_connectivity()
+        sessions = [driver.session(database="neo4j") for _ in range(max(connections, 1))]
+        try:
+            for session in sessions:
+                session.run("RETURN 1").consume()
+        finally:
+            for session in sessions:
+                session.close()
+        return True
+    except Exception:
+        logger.exception("Neo4j warm-up failed")
+        return False
+
+
+def close_driver() -> None:
+    global _driver, _driver_pid
+    with _lock:
+        if _driver is not None and _driver_pid == os.getpid():
+            _driver.close()
+        _driver, _driver_pid = None, None
+
+
+atexit.register(close_driver)
+
+
+def __getattr__(name):
+    # Backwards compatible `from CourseCompass.neo4j_driver import driver`;
+    # prefer get_driver(), which also survives forks.
+    if name == "driver":
+        return get_driver()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Async driver for the ASGI views (bot/async_agent.py). An async driver is bound
+# to the event loop it was created on, so keep one per loop, together with the
+# task that closes it when the loop shuts down.
+_async_drivers = weakref.WeakKeyDictionary()
+
+
+async def _close_with_loop(async_driver) -> None:
+    """
+    Parked on the driver's loop until it is cancelled: asyncio.run() and
+    asgiref's async_to_sync cancel pending tasks before closing a loop, so the
+    pool is closed with the loop instead of leaking its sockets.
+    """
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await async_driver.close()
+
+
+def get_async_driver():
+    loop = asyncio.get_running_loop()
+    entry = _async_drivers.get(loop)
+    if entry is None:
+        async_driver = AsyncGraphDatabase.driver(
+            NEO4J_URI,
+            auth=(NEO4J_USER, NEO4J_PASS),
+            ssl_context=ssl_context,
+            **POOL_SETTINGS,
+        )
+        entry = _async_drivers[loop] = (async_driver, loop.create_task(_close_with_loop(async_driver)))
+    return entry[0]
 
-# Verify connectivity to the database
-driver.verify_connectivity()
 
-# Open a session and run a simple query to confirm the connection
-with driver.session(database="neo4j") as session:
-    result = session.run("RETURN 1 AS test")
-    print("Connection successful, test result:", result.single()["test"])
+async def aclose_async_driver() -> None:
+    """
+    Closes the running loop's async driver now (a later call creates a new one).
+    """
+    entry = _async_drivers.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        async_driver, closer = entry
+        closer.cancel()
+        try:
+            await closer
+        except asyncio.CancelledError:
+            pass
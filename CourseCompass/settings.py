@@ -133,3 +133,28 @@ env = environ.Env()
 environ.Env.read_env(os.path.join(BASE_DIR, '.env'))
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+
+# Cache used for the catalog version and derived catalog caches (courses/catalog.py).
+# All workers must share it for invalidation to reach them, e.g.
+#   CACHE_URL=redis://localhost:6379/1
+CACHES = {
+    'default': env.cache('CACHE_URL', default='filecache:///tmp/coursecompass_cache'),
+}
+
+# Application logs go to stderr. LOG_LEVEL sets the general level; timing
+# spans (CourseCompass/metrics.py) are logged at DEBUG, so SPAN_LOG_LEVEL=DEBUG
+# turns them on without making everything else verbose.
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'root': {'handlers': ['console'], 'level': env('LOG_LEVEL', default='INFO')},
+    'loggers': {
+        'CourseCompass.metrics': {'level': env('SPAN_LOG_LEVEL', default='INFO')},
+    },
+}
@@ -17,6 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.shortcuts import redirect
+from . import views
 
 urlpatterns = [
    path('', lambda request: redirect('chat/')),  # Redirect root path
@@ -24,4 +25,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('courses/', include('courses.urls')),
     path('chat/', include('bot.urls')),
+    path('healthz/', views.healthz, name='healthz'),
+    path('readyz/', views.readyz, name='readyz'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -0,0 +1,43 @@
+import time
+
+from django.http import HttpResponse, JsonResponse
+
+from . import metrics as request_metrics
+from .neo4j_driver import get_driver
+
+# Readiness is probed often (load balancers, orchestrators); reuse a recent
+# answer instead of hitting Neo4j on every probe.
+READY_CACHE_SECONDS = 5
+_last_ready = {"checked": 0.0, "ok": False, "error": ""}
+
+
+def healthz(request):
+    """
+    Liveness: the process is up and serving requests. Never touches Neo4j.
+    """
+    return JsonResponse({"status": "ok"})
+
+
+def readyz(request):
+    """
+    Readiness: Neo4j is reachable from this worker. 503 while it is not.
+    """
+    now = time.monotonic()
+    if now - _last_ready["checked"] > READY_CACHE_SECONDS:
+        try:
+            get_driver().verify_connectivity()
+            _last_ready.update(ok=True, error="")
+        except Exception as e:
+            _last_ready.update(ok=False, error=f"{type(e).__name__}: {e}")
+        _last_ready["checked"] = now
+
+    if _last_ready["ok"]:
+        return JsonResponse({"status": "ready"})
+    return JsonResponse({"status": "unavailable", "neo4j": _last_ready["error"]}, status=503)
+
+
+def metrics(request):
+    """
+    Per-stage and per-intent timings of this worker in the Prometheus text format.
+    """
+    return HttpResponse(request_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
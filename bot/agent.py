@@ -1,63 +1,60 @@
 import os
 import re
 import json
-from typing import List, Dict, Optional
+import logging
+import threading
+from typing import Iterable, Iterator, List, Dict, Optional
 from .groqllm import GroqLLM
-from CourseCompass.neo4j_driver import driver
+from .llm_cache import LLMCache
+from . import recorder
+from .conversation import ConversationState
+from .eligibility import EligibilityMatrix, get_eligibility
+from .planner import completed_courses, format_plan, plan_for_question
+from .resolver import get_resolver, resolve_courses
+from .retrieval import get_retriever
+from .prompting import build_prompt, encode_catalog
+from CourseCompass import metrics
+from CourseCompass.neo4j_driver import get_driver
+from courses.catalog import VersionedArtifact, get_snapshot
+from courses.closure import get_closure
+
+logger = logging.getLogger(__name__)
 
 # ============================================================
 # CONFIGURATION
 # ============================================================
 API_KEY = os.getenv("GROQ_API_KEY")
 MODEL_NAME = "llama-3.1-8b-instant"
-llm = GroqLLM(api_key=API_KEY, model=MODEL_NAME)
 
-# ============================================================
-# COURSE ALIASES
-# ============================================================
-COURSE_ALIASES = {
-    "data structures": "CS210",
-    "data structures and algorithms": "CS210",
-    "intro to programming": "CS110",
-    "introduction to programming": "CS110",
-    "object oriented programming": "CS115",
-    "web programming": "CS215",
-    "web and database programming": "CS215",
-    "applied calculus i": "MATH103",
-    "calculus 1": "MATH103",
-    "calculus i": "MATH103",
-}
+# Opt-in response cache shared by all workers through a sqlite file.
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+llm_cache = LLMCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL) if LLM_CACHE_PATH else None
+
+llm = GroqLLM(api_key=API_KEY, model=MODEL_NAME, response_cache=llm_cache)
+
+# Number of retrieved courses put in the general / advising prompts (their
+# direct prerequisites are added on top, up to the same number again).
+GENERAL_CONTEXT_COURSES = int(os.getenv("GENERAL_CONTEXT_COURSES", 12))
+ADVISING_CONTEXT_COURSES = int(os.getenv("ADVISING_CONTEXT_COURSES", 20))
 
 # ============================================================
 # UTILITY HELPERS
 # ============================================================
 def normalize_course_code(text: str) -> str:
     """
-    Normalize course names or phrases into the graph's code format.
-    For example, "data structures" → "CS 210", "cs210" → "CS 210"
+    The first course mentioned in the text, in the graph's code format:
+    "cs210" -> "CS 210", "data strucures" -> "CS 210" (see bot/resolver.py).
     """
-    text = text.lower().strip()
-
-    # Map aliases first
-    for alias, code in COURSE_ALIASES.items():
-        if alias in text:
-            # Insert a space after department letters if missing
-            return re.sub(r"([a-z]+)(\d+)", r"\1 \2", code.upper())
-
-    # Match patterns like "cs210", "math103", etc. and insert space
-    match = re.search(r"\b(cs|math|stat|eng|bio|chem)[\s\-]?(\d{3})\b", text)
-    if match:
-        dept = match.group(1).upper()
-        num = match.group(2)
-        return f"{dept} {num}"  # ✅ space added here
-
-    return ""
+    codes = resolve_courses(text)
+    return codes[0] if codes else ""
 
 
 
+@metrics.timed("cypher")
 def run_query(query: str, params: Optional[dict] = None) -> List[Dict]:
     try:
-        with driver.session() as session:
+        with get_driver().session() as session:
             result = session.run(query, params or {})
             return [record.data() for record in result]
     except Exception as e:
@@ -66,24 +63,14 @@ def run_query(query: str, params: Optional[dict] = None) -> List[Dict]:
 # ============================================================
 # GRAPH QUERIES
 # ============================================================
-def cypher_course_info(code: str):
-    query = """
+# Query text is shared with the async helpers in bot/async_agent.py.
+COURSE_INFO_QUERY = """
     MATCH (c:Course {code:$code})
     RETURN c.code AS code, c.title AS title, c.credits AS credits,
            c.level AS level, c.description AS description
     """
-    return run_query(query, {"code": code})
 
-def cypher_prereqs_full(code: str, depth: int = 3):
-    """
-    Retrieves a course and all of its prerequisite courses (direct and indirect),
-    including each course's title and description, and the logical grouping type
-    (AND / OR / CUSTOM) defined in the graph schema.
-
-    Graph schema:
-      (Course)-[:REQUIRES]->(PrerequisiteGroup)-[:HAS]->(Course)
-    """
-    query = f"""
+PREREQS_FULL_QUERY = """
     MATCH (target:Course {{code:$code}})-[:REQUIRES]->(g:PrerequisiteGroup)-[:HAS*1..{depth}]->(p:Course)
     WITH DISTINCT target, g, p
     RETURN DISTINCT
@@ -98,8 +85,52 @@ def cypher_prereqs_full(code: str, depth: int = 3):
     ORDER BY group_type, prereq_code
     """
 
-    res = run_query(query, {"code": code})
+# Hop limit for "all prerequisites" when the closure is unavailable.
+MAX_PREREQ_DEPTH = 5
+
+NEXT_AFTER_QUERY = """
+    MATCH (next:Course)-[:REQUIRES]->(:PrerequisiteGroup)-[:HAS]->(c:Course {code:$code})
+    RETURN DISTINCT next.code AS code, next.title AS title
+    """
+
+@metrics.timed("graph")
+@recorder.captured
+def cypher_course_info(code: str):
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.course_info(code)
+
+    return run_query(COURSE_INFO_QUERY, {"code": code})
+
+@metrics.timed("graph")
+@recorder.captured
+def cypher_prereqs_full(code: str, depth: Optional[int] = 3):
+    """
+    Retrieves a course and all of its prerequisite courses (direct and indirect),
+    including each course's title and description, and the logical grouping type
+    (AND / OR / CUSTOM) defined in the graph schema.
+
+    Graph schema:
+      (Course)-[:REQUIRES]->(PrerequisiteGroup)-[:HAS]->(Course)
+
+    depth=None asks for every prerequisite, read from the precomputed closure
+    (courses/closure.py). Otherwise answered from the in-process catalog
+    snapshot when it is available.
+    """
+    if depth is None:
+        closure = get_closure()
+        if closure is not None:
+            return closure.prereqs(code)
+        depth = MAX_PREREQ_DEPTH
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.prereqs(code, depth)
 
+    res = run_query(PREREQS_FULL_QUERY.format(depth=depth), {"code": code})
+    return prereq_rows_to_data(res)
+
+def prereq_rows_to_data(res: List[Dict]) -> dict:
     if not res or "error" in res[0]:
         return {"target": {}, "prereqs": []}
 
@@ -124,12 +155,71 @@ def cypher_prereqs_full(code: str, depth: int = 3):
 
 
 
+@metrics.timed("graph")
+@recorder.captured
 def cypher_next_after(code: str):
-    query = """
-    MATCH (next:Course)-[:REQUIRES]->(:PrerequisiteGroup)-[:HAS]->(c:Course {code:$code})
-    RETURN DISTINCT next.code AS code, next.title AS title
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.successors(code)
+
+    return run_query(NEXT_AFTER_QUERY, {"code": code})
+
+# Course info, prerequisite groups (with AND/OR logic), transitive prerequisites
+# and successor courses in one round trip. REQUIRES|HAS*2..10 walks up to five
+# course hops (course -> group -> course ...).
+COURSE_DETAIL_QUERY = """
+    MATCH (c:Course {code:$code})
+    OPTIONAL MATCH (c)-[:REQUIRES]->(g:PrerequisiteGroup)
+    OPTIONAL MATCH (g)-[:HAS]->(p:Course)
+    WITH c, g, collect(p.code) AS members
+    WITH c, collect(CASE WHEN g IS NULL THEN NULL
+                         ELSE {type: g.type, recommended: g.recommended, courses: members} END) AS groups
+    OPTIONAL MATCH (c)-[:REQUIRES|HAS*2..10]->(a:Course)
+    WITH c, groups, collect(DISTINCT a.code) AS all_prereqs
+    OPTIONAL MATCH (n:Course)-[:REQUIRES]->(:PrerequisiteGroup)-[:HAS]->(c)
+    WITH c, groups, all_prereqs, collect(DISTINCT n) AS next_nodes
+    RETURN c.code AS code, c.title AS title, c.credits AS credits,
+           c.level AS level, c.description AS description,
+           groups, all_prereqs,
+           [n IN next_nodes | {code: n.code, title: n.title}] AS next_courses
     """
-    return run_query(query, {"code": code})
+
+@metrics.timed("graph")
+@recorder.captured
+def cypher_course_detail(code: str) -> Optional[dict]:
+    """
+    Everything respond_course_info needs about a course, or None if it is unknown.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.course_detail(code)
+
+    rows = run_query(COURSE_DETAIL_QUERY, {"code": code})
+    if not rows or "error" in rows[0]:
+        return None
+    return rows[0]
+
+def describe_prereq_groups(groups: List[Dict]) -> str:
+    """
+    Renders prerequisite groups with their logic, e.g.
+    "CS 110 and CS 115; one of MATH 103 or MATH 104 (recommended)".
+    """
+    parts = []
+    for group in sorted(groups, key=lambda g: (g.get("recommended") is not False, str(g.get("type")))):
+        courses = sorted(group.get("courses") or [])
+        if not courses:
+            continue
+        group_type = (group.get("type") or "CUSTOM").upper()
+        if group_type == "AND":
+            text = " and ".join(courses)
+        elif group_type == "OR":
+            text = courses[0] if len(courses) == 1 else "one of " + " or ".join(courses)
+        else:
+            text = f"{group.get('type')}: {', '.join(courses)}"
+        if group.get("recommended") is True:
+            text += " (recommended)"
+        parts.append(text)
+    return "; ".join(parts) if parts else "None"
 
 # ============================================================
 # INTENT PLANNING (LLM)
@@ -158,6 +248,7 @@ PrerequisiteGroup node fields: type ("AND", "OR", "CUSTOM"), recommended (true/f
 | **next_course_query** | Student wants to know what comes *after* a course. | "What can I take after CS110?" / "Which courses require CS210?" |
 | **course_info** | Student asks for detailed info about one course. | "Tell me about CS215." / "What is CS110 about?" |
 | **advising** | Student wants help planning or choosing courses. | "Which courses should I take next term?" / "Can you help me plan my degree?" |
+| **eligibility** | Student asks which courses they can take now, given what they have completed. | "What can I take now? I've done CS110 and MATH103." / "Which courses am I eligible for?" |
 | **smalltalk** | Greetings, thanks, or casual conversation. | "Hi there!" / "Thanks for your help." |
 | **general** | Any other question not clearly tied to a course or advising topic. | "Who founded the university?" / "When does the semester start?" |
 
@@ -207,7 +298,7 @@ Q: "Hello there!"
 }}
 
 ---
-
+{history}
 Question: "{question}"
 """
 
@@ -219,6 +310,7 @@ ALLOWED_INTENTS = {
     "next_course_query",
     "course_info",
     "advising",
+    "eligibility",
     "smalltalk",
     "general"
 }
@@ -229,20 +321,42 @@ def extract_first_json_object(text: str) -> Optional[str]:
         match = re.search(r"(\{[\s\S]*\})", text)
     return match.group(1) if match else None
 
-def plan_from_llm(question: str) -> dict:
+def history_section(history: str) -> str:
+    """
+    The conversation so far as a prompt section, or "" for a first question.
+    """
+    if not history:
+        return ""
+    return f"\nConversation so far (resolve words like \"that\" or \"it\" against it):\n{history}\n"
+
+def planner_prompt(question: str, history: str = "") -> str:
+    return build_prompt("planner", INTENT_PLAN_PROMPT, question=question, history=history_section(history))
+
+def plan_from_llm(question: str, history: str = "") -> dict:
     try:
-        raw = llm.invoke(INTENT_PLAN_PROMPT.format(question=question)).strip()
+        raw = llm.invoke(planner_prompt(question, history)).strip()
+    except Exception as e:
+        logger.error("Planner LLM call failed: %s", e)
+        raw = ""
+    return parse_plan(raw)
 
+def parse_plan(raw: str) -> dict:
+    """
+    Turns the planner model's raw output into a normalized plan dict.
+    """
+    try:
         cleaned = re.sub(r"```(?:json)?", "", raw, flags=re.I).strip()
         cleaned = cleaned[cleaned.find("{"):] if "{" in cleaned else cleaned
 
         try:
             plan = json.loads(cleaned)
         except Exception as e:
-            print("[ERROR] JSON decode failed:")
+            logger.warning("Planner output is not valid JSON: %s", e)
+            plan = {}
+        if not isinstance(plan, dict):
             plan = {}
     except Exception as e:
-        print("[ERROR] Plan parsing failed completely:")
+        logger.warning("Plan parsing failed: %s", e)
         plan = {}
 
     # normalize as before …
@@ -259,89 +373,375 @@ def plan_from_llm(question: str) -> dict:
         "intent": intent,
         "course_codes": normalized_codes,
         "reasoning": plan.get("reasoning", ""),
-        "raw_model": raw if 'raw' in locals() else ""
+        "raw_model": raw
     }
 
-def summarize_graph_context(limit: int = 50) -> str:
+# ============================================================
+# INTENT PLANNING (FAST PATH)
+# ============================================================
+# Clear-cut questions ("hi", "prereqs for CS210") are classified locally with
+# keyword patterns; only ambiguous ones pay for a plan_from_llm round trip.
+ROUTER_MIN_CONFIDENCE = 0.8
+
+# The whole message must be greetings or thanks: "thanks! and what is after
+# that?" is a question, not smalltalk.
+SMALLTALK_PATTERN = re.compile(
+    r"^(?:(?:hi|hello|hey|hiya|yo|good (?:morning|afternoon|evening)|thanks|thank you|thx|"
+    r"cheers|bye|goodbye|see you|how are you)(?: (?:there|so much|a lot|again|all|everyone|coursecompass))*"
+    r"[\s!.,?]*)+$"
+)
+
+# Patterns that need a course code, checked in priority order:
+# the first intent that matches wins when several do.
+CODE_INTENT_PATTERNS = [
+    ("all_prerequisites", re.compile(
+        r"\ball (the )?(prereq|prerequisite|course|requirement)s?\b|\bwhat do i need (to take )?before\b|"
+        r"\bleading up to\b|\bfull (chain|path)\b|\bentire (chain|path)\b|\beverything (i need )?before\b"
+    )),
+    ("next_course_query", re.compile(
+        r"\bafter\b|\bnext\b(?! (semester|term|year|fall|spring|summer|winter)\b)|\bfollow(s|ing)? (on|up)?\b|\b(courses?|classes?) (that )?(require|need|build on)\b|"
+        r"\bunlock|\bleads? to\b"
+    )),
+    ("prereq_query", re.compile(
+        r"\bpre-?req|\bprerequisite|\brequired (for|before)\b|\brequirements? (for|of)\b|"
+        r"\bneed (to take |to have )?before\b|\bwhat do(es)? .* require\b"
+    )),
+    ("course_info", re.compile(
+        r"\btell me about\b|\bwhat is\b|\bwhat's\b|\babout\b|\bdescribe\b|\bdescription\b|\binfo\b|"
+        r"\binformation\b|\bdetails?\b|\bhow many credits\b|\bwhat level\b|\boverview\b"
+    )),
+]
+
+# Checked before the code patterns: the codes in these questions are completed
+# courses, not the subject ("what can I take now that I passed CS110?").
+ELIGIBILITY_PATTERN = re.compile(
+    r"\beligib|\bqualif(y|ied) for\b|\ballowed to take\b|"
+    r"\bwhat (courses |classes )?(can|could) i (take|enrol+ in|register for)\b(?! after)"
+)
+
+ADVISING_PATTERN = re.compile(
+    r"\b(plan|planning|schedule|which courses should|what (courses|classes) should|next (term|semester)|"
+    r"recommend|suggest|degree|major|minor|graduate|course load|path to)\b"
+)
+
+# Pronouns that refer back to the previous course ("after that", "is it hard").
+FOLLOW_UP_PATTERN = re.compile(r"\b(that|it|this|that one|this one|same course)\b")
+
+_router_lock = threading.Lock()
+ROUTER_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def route_question(question: str, last_code: Optional[str] = None) -> Optional[dict]:
     """
-    Collects a brief textual overview of available courses and their relationships.
-    This helps the LLM reason about advising or general questions with real context.
+    Classifies a question without the LLM. Returns a plan in the same shape as
+    plan_from_llm (plus "confidence"), or None when the question is ambiguous.
+    `last_code` resolves follow-ups such as "and what about after that?".
+    Questions naming several courses ("Is CS 210 required for CS 215?") are
+    left to the LLM planner, since the keyword patterns only know one subject.
     """
-    try:
-        with driver.session() as session:
-            query = """
+    text = re.sub(r"\s+", " ", question.lower()).strip()
+    codes = list(dict.fromkeys(resolve_courses(text)))
+    code = codes[0] if codes else ""
+    follow_up = False
+
+    if ELIGIBILITY_PATTERN.search(text):
+        # The codes here are completed courses, however many there are.
+        return _fast_plan("eligibility", codes, "Asks which courses are open to them.", 0.9)
+    if len(codes) > 1:
+        return None
+
+    if not code:
+        if SMALLTALK_PATTERN.match(text):
+            return _fast_plan("smalltalk", [], "Greeting or thanks.", 0.95)
+        if last_code and FOLLOW_UP_PATTERN.search(text):
+            code, follow_up = last_code, True
+        elif ADVISING_PATTERN.search(text):
+            return _fast_plan("advising", [], "Planning or course-selection keywords.", 0.85)
+        else:
+            return None
+
+    matched = [intent for intent, pattern in CODE_INTENT_PATTERNS if pattern.search(text)]
+    if not matched:
+        return None
+
+    # course_info keywords ("what is", "about") are weak: drop them when a
+    # stronger intent also matched. Several strong matches fall back to
+    # pattern priority with low confidence unless they are prereq variants.
+    matched = [m for m in matched if m != "course_info"] or matched
+    intent = matched[0]
+    if len(matched) == 1 or set(matched[:2]) == {"all_prerequisites", "prereq_query"}:
+        confidence = 0.9
+    else:
+        confidence = 0.6
+    if follow_up:
+        confidence -= 0.05
+    return _fast_plan(intent, [code], f"Matched {intent} keywords for {code}.", confidence)
+
+
+def _fast_plan(intent: str, codes: List[str], reasoning: str, confidence: float) -> dict:
+    return {
+        "intent": intent,
+        "course_codes": codes,
+        "reasoning": reasoning,
+        "raw_model": "",
+        "confidence": confidence,
+    }
+
+
+def _record_route(intent: str, source: str) -> None:
+    with _router_lock:
+        counts = ROUTER_STATS.setdefault(intent, {"fast": 0, "llm": 0})
+        counts[source] += 1
+
+
+def router_stats() -> dict:
+    """
+    Per-intent counts of fast-path vs LLM plans, with the fast-path hit rate.
+    `llm_calls_saved` is the number of plan_from_llm calls avoided.
+    """
+    with _router_lock:
+        snapshot = {intent: dict(counts) for intent, counts in ROUTER_STATS.items()}
+
+    total_fast = sum(c["fast"] for c in snapshot.values())
+    total = total_fast + sum(c["llm"] for c in snapshot.values())
+    for counts in snapshot.values():
+        seen = counts["fast"] + counts["llm"]
+        counts["hit_rate"] = counts["fast"] / seen if seen else 0.0
+    return {
+        "intents": snapshot,
+        "llm_calls_saved": total_fast,
+        "hit_rate": total_fast / total if total else 0.0,
+    }
+
+
+def plan_question(question: str, last_code: Optional[str] = None, history: str = "") -> dict:
+    """
+    Plans a question with the fast-path router, falling back to plan_from_llm
+    (which sees the conversation `history`) when the router is not confident enough.
+    """
+    plan = route_question(question, last_code)
+    if plan and plan["confidence"] >= ROUTER_MIN_CONFIDENCE:
+        _record_route(plan["intent"], "fast")
+        return plan
+
+    plan = plan_from_llm(question, history)
+    _record_route(plan["intent"], "llm")
+    return plan
+
+GRAPH_DIGEST_QUERY = """
             MATCH (c:Course)
             OPTIONAL MATCH (c)-[:REQUIRES]->(g:PrerequisiteGroup)-[:HAS]->(p:Course)
             WITH c, collect(DISTINCT p.code) AS prereqs
             RETURN c.code AS code, c.title AS title, c.level AS level, c.credits AS credits, prereqs
             ORDER BY c.level, c.code
-            LIMIT $limit
             """
-            result = session.run(query, {"limit": limit})
-            rows = [record.data() for record in result]
-            if not rows:
-                return "(no course data found in graph)"
-            
-            lines = []
-            for r in rows:
-                prereq_str = ", ".join(r["prereqs"]) if r["prereqs"] else "None"
-                lines.append(
-                    f"{r['code']} — {r['title']} | Level {r['level']} | {r['credits']} credits | Prereqs: {prereq_str}"
-                )
-            return "\n".join(lines)
+
+GRAPH_CONTEXT_QUERY = GRAPH_DIGEST_QUERY + "LIMIT $limit\n"
+
+def build_graph_digest(version: str) -> List[Dict]:
+    """
+    GRAPH_DIGEST_QUERY rows for the whole catalog. Built once per catalog
+    version and shared across workers.
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        return snapshot.overview()
+    with get_driver().session() as session:
+        return session.execute_read(lambda tx: tx.run(GRAPH_DIGEST_QUERY).data())
+
+graph_digest = VersionedArtifact("graph_digest", build_graph_digest, shared=True)
+
+def digest_stats() -> dict:
+    """
+    Build time and hit rate of the catalog digest, to confirm the aggregation
+    query only runs once per catalog version.
+    """
+    return graph_digest.stats()
+
+def graph_context_rows(limit: int = 50) -> List[Dict]:
+    rows = graph_digest.get()
+    if rows is not None:
+        return rows[:limit]
+    with get_driver().session() as session:
+        result = session.run(GRAPH_CONTEXT_QUERY, {"limit": limit})
+        return [record.data() for record in result]
+
+def summarize_graph_context(limit: int = 50) -> str:
+    """
+    Collects a brief textual overview of available courses and their relationships.
+    This helps the LLM reason about advising or general questions with real context.
+    """
+    try:
+        return format_graph_context(graph_context_rows(limit))
     except Exception as e:
         return f"(graph context unavailable: {e})"
+
+def relevant_graph_rows(question: str, k: int) -> List[Dict]:
+    """
+    The k catalog courses most relevant to the question (BM25 over code, title
+    and description) plus their direct prerequisites. Falls back to the first
+    k digest rows when nothing matches or the index is unavailable.
+    """
+    retriever = get_retriever()
+    if retriever is not None:
+        rows = retriever.context_rows(question, k)
+        if rows:
+            return rows
+    try:
+        return graph_context_rows(k)
+    except Exception as e:
+        logger.error("Graph context unavailable: %s", e)
+        return []
+
+def format_graph_context(rows: List[Dict]) -> str:
+    if not rows:
+        return "(no course data found in graph)"
+
+    lines = []
+    for r in rows:
+        prereq_str = ", ".join(r["prereqs"]) if r["prereqs"] else "None"
+        lines.append(
+            f"{r['code']} — {r['title']} | Level {r['level']} | {r['credits']} credits | Prereqs: {prereq_str}"
+        )
+    return "\n".join(lines)
+
+def catalog_lines(rows: List[Dict]) -> List[str]:
+    """
+    Prompt form of catalog rows: the compact table, trimmed by build_prompt.
+    """
+    return encode_catalog(rows) or ["(no course data found in graph)"]
+
 # ============================================================
 # RESPONSE HANDLERS
 # ============================================================
-def respond_smalltalk(question: str) -> str:
-    return llm.invoke(f"Respond warmly and politely to this greeting, you are a helpfull University adadmic advisor call CourseCompass: {question}").strip()
+# Text intents are split into a "draft" (the prompt plus a deterministic
+# fallback answer) and its completion, so the same draft can be completed in
+# one call (advisor_response) or streamed token by token (advisor_response_stream).
+# A draft with prompt=None is already final: its fallback is the answer.
+# Drafts accept pre-fetched graph data so the async agent can supply it.
+def make_draft(prompt: Optional[str], fallback: Optional[str] = None) -> dict:
+    return {"prompt": prompt, "fallback": fallback}
 
-def respond_general(question: str) -> str:
+
+def complete_draft(draft: dict) -> str:
+    if draft["prompt"] is None:
+        return draft["fallback"] or ""
+    return finish_draft(draft, llm.invoke(draft["prompt"]))
+
+
+def finish_draft(draft: dict, response: str) -> str:
     """
-    General intent: broader academic questions (not specific to one course).
-    Provides full graph context in case the model wants to refer to real examples.
+    Falls back to the deterministic answer when the model returns (almost) nothing.
     """
-    graph_context = summarize_graph_context(limit=40)
-    prompt = f"""
+    response = response.strip()
+    if draft["fallback"] and (not response or len(response.split()) < 4):
+        response = draft["fallback"]
+    return response
+
+
+SMALLTALK_PROMPT = "Respond warmly and politely to this greeting, you are a helpfull University adadmic advisor call CourseCompass: {question}"
+
+def draft_smalltalk(question: str) -> dict:
+    return make_draft(build_prompt("smalltalk", SMALLTALK_PROMPT, question=question))
+
+def respond_smalltalk(question: str) -> str:
+    return complete_draft(draft_smalltalk(question))
+
+GENERAL_PROMPT = """
 You are a knowledgeable academic assistant called CourseCompass who can answer general student questions.
 Use the context below only if it helps; otherwise, answer using your own understanding.
 Stay concise (2–4 sentences) and conversational. Use the description of courses if relevant.
-
+{history}
 Student's question: "{question}"
 
 University Course Graph (for reference) but do not mention that you use this graph:
-{graph_context}
+{catalog}
 
 Assistant:
 """
-    return llm.invoke(prompt).strip()
-
 
-def respond_advising(question: str) -> str:
+def draft_general(question: str, catalog_rows: Optional[List[Dict]] = None, history: str = "") -> dict:
     """
-    Advising intent: Student seeks course guidance or planning help.
-    The LLM receives full graph context to reason over real course options.
+    General intent: broader academic questions (not specific to one course).
+    Provides the most relevant catalog courses in case the model wants to refer to real examples.
     """
-    graph_context = summarize_graph_context(limit=60)
-    prompt = f"""
+    if catalog_rows is None:
+        catalog_rows = relevant_graph_rows(question, GENERAL_CONTEXT_COURSES)
+    prompt = build_prompt("general", GENERAL_PROMPT, elastic="catalog", min_lines=2,
+                          question=question, history=history_section(history),
+                          catalog=catalog_lines(catalog_rows))
+    return make_draft(prompt)
+
+def respond_general(question: str) -> str:
+    return complete_draft(draft_general(question))
+
+
+ADVISING_PROMPT = """
 You are a friendly academic advisor at a university.
 The student is asking for advice about which courses to take.
 Use the provided course catalog below as real reference material, 
 but only include details that are relevant to the question.
 Keep your answer friendly, clear, and personalized (3–5 sentences).
-
+{history}
 Student's question: "{question}"
 
 Course Catalog (context):
-{graph_context}
+{catalog}
 
 Advisor:
 """
-    return llm.invoke(prompt).strip()
+
+DEGREE_PLAN_PROMPT = """
+You are a friendly academic advisor at a university.
+The student asked: "{question}"
+
+A schedule that satisfies every prerequisite has already been computed:
+{plan}
+
+Explain this plan to the student in 3–5 sentences. Do not add, drop or move
+courses between terms; mention anything that could not be scheduled.
+
+Advisor:
+"""
+
+def degree_plan(question: str, completed: Optional[Iterable[str]] = None) -> Optional[dict]:
+    """
+    Term-by-term plan for the courses named in the question (see bot/planner.py),
+    or None when it names no target course or the catalog is unavailable.
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    return plan_for_question(snapshot, question, completed or (), closure=get_closure(), resolver=get_resolver())
+
+def draft_degree_plan(question: str, plan: dict) -> dict:
+    lines = format_plan(plan)
+    prompt = build_prompt("degree_plan", DEGREE_PLAN_PROMPT, elastic="plan", question=question, plan=lines)
+    return make_draft(prompt, fallback="\n".join(lines))
+
+def draft_advising(question: str, catalog_rows: Optional[List[Dict]] = None, plan: Optional[dict] = None,
+                   history: str = "") -> dict:
+    """
+    Advising intent: Student seeks course guidance or planning help.
+    When the question names target courses, the planner computes the schedule
+    and the LLM only narrates it. Otherwise the LLM receives the catalog
+    courses most relevant to the question to reason over real options.
+    """
+    if plan is not None:
+        return draft_degree_plan(question, plan)
+    if catalog_rows is None:
+        catalog_rows = relevant_graph_rows(question, ADVISING_CONTEXT_COURSES)
+    prompt = build_prompt("advising", ADVISING_PROMPT, elastic="catalog", min_lines=2,
+                          question=question, history=history_section(history),
+                          catalog=catalog_lines(catalog_rows))
+    return make_draft(prompt)
+
+def respond_advising(question: str, completed: Optional[Iterable[str]] = None) -> str:
+    return complete_draft(draft_advising(question, plan=degree_plan(question, completed)))
 
 import json
 
+@metrics.timed("render")
 def render_prereq_graph(data: dict) -> str:
     target = data["target"]
     prereqs = data["prereqs"]
@@ -368,12 +768,13 @@ def render_prereq_graph(data: dict) -> str:
                 }
             })
 
-        # Link prerequisite -> target
+        # Link prerequisite -> the course that requires it
+        required_by = p.get("required_by") or target["code"]
         edges.append({
             "data": {
-                "id": f"{p['code']}->{target['code']}",
+                "id": f"{p['code']}->{required_by}",
                 "source": p["code"],
-                "target": target["code"],
+                "target": required_by,
                 "type": p.get("type", "CUSTOM")
             }
         })
@@ -407,7 +808,7 @@ def render_prereq_graph(data: dict) -> str:
 # ============================================================
 # GRAPH-BASED RESPONSE LOGIC
 # ============================================================
-def respond_prereq_query(course_code: str, question: Optional[str] = None, depth: int = 3) -> str:
+def respond_prereq_query(course_code: str, question: Optional[str] = None, depth: Optional[int] = 3) -> str:
     """
     Generate a factual prerequisite graph + very short summary.
     The graph is rendered directly from Neo4j data (no LLM),
@@ -434,22 +835,29 @@ def respond_prereq_query(course_code: str, question: Optional[str] = None, depth
     # -------------------------------------------------------------
     # 3️⃣  Ask LLM for one-sentence summary
     # -------------------------------------------------------------
-    prereq_list = ", ".join([p["code"] for p in prereqs])
-    prompt = f"""
+    summary = llm.invoke(prereq_summary_prompt(target)).strip()
+    if not summary:
+        summary = f"These prerequisites provide the essential background for {course_code}."
+
+    # -------------------------------------------------------------
+    # 4️⃣  Return ready-to-render HTML response
+    # -------------------------------------------------------------
+    return wrap_prereq_response(graph_html, summary)
+
+PREREQ_SUMMARY_PROMPT = """
 You are an academic advisor.
 Provide ONE short factual sentence (under 25 words)
-summarizing how these courses prepare a student for {target.get('code','this course')} ({target.get('title','')}).
+summarizing how these courses prepare a student for {code} ({title}).
 
 Do not restate the course codes.
 Just describe the general skills or foundation gained.
 """
-    summary = llm.invoke(prompt).strip()
-    if not summary:
-        summary = f"These prerequisites provide the essential background for {course_code}."
 
-    # -------------------------------------------------------------
-    # 4️⃣  Return ready-to-render HTML response
-    # -------------------------------------------------------------
+def prereq_summary_prompt(target: dict) -> str:
+    return build_prompt("prereq_summary", PREREQ_SUMMARY_PROMPT,
+                        code=target.get('code', 'this course'), title=target.get('title', ''))
+
+def wrap_prereq_response(graph_html: str, summary: str) -> str:
     return f"""
     <div class='prereq-response'>
       {graph_html}
@@ -457,161 +865,281 @@ Just describe the general skills or foundation gained.
     </div>
     """
 
-def respond_next_course_query(course_code: str, question: Optional[str] = None) -> str:
+NEXT_COURSE_PROMPT = """
+You are a helpful university academic advisor.
+Student asked: "{question}"
+
+Here is what the database says:
+
+Course: {course_code}
+Next possible courses (that require it):
+{next_courses}
+
+Respond conversationally in 2–4 sentences:
+- Accurately reflect the factual context (these are the verified next courses).
+- Briefly explain how these follow-up courses build on the knowledge from {course_code}.
+- Keep the tone warm, helpful, and concise.
+"""
+
+def draft_next_course_query(course_code: str, question: Optional[str] = None,
+                            res: Optional[List[Dict]] = None) -> dict:
     """
     Respond to queries asking what courses come AFTER a given course —
     i.e., which courses list this one as a prerequisite.
     """
     if not course_code:
-        return "Could you tell me which course you're referring to?"
+        return make_draft(None, "Could you tell me which course you're referring to?")
 
-    res = cypher_next_after(course_code)
-    print("[DEBUG] Raw Cypher result:", res, flush=True)
+    if res is None:
+        res = cypher_next_after(course_code)
+    logger.debug("Next courses after %s: %s", course_code, res)
 
     if not res or "error" in res[0]:
-        return f"I couldn’t find any courses that require {course_code}."
+        return make_draft(None, f"I couldn’t find any courses that require {course_code}.")
 
     formatted = [f"{r['code']} — {r.get('title', '')}" for r in res if r.get('code')]
     if not formatted:
-        return f"There are no courses that list {course_code} as a prerequisite."
+        return make_draft(None, f"There are no courses that list {course_code} as a prerequisite.")
 
     joined = (
         ", ".join(formatted[:-1]) + (f", and {formatted[-1]}" if len(formatted) > 1 else formatted[0])
     )
 
-    factual_context = f"""
-Course: {course_code}
-Next possible courses (that require it):
-{joined}
-"""
-
-    prompt = f"""
-You are a helpful university academic advisor.
-Student asked: "{question or f'What can I take after {course_code}?'}"
-
-Here is what the database says:
-{factual_context}
+    # One course per line so a long list can be trimmed to the prompt budget.
+    prompt = build_prompt("next_course_query", NEXT_COURSE_PROMPT, elastic="next_courses",
+                          question=question or f"What can I take after {course_code}?",
+                          course_code=course_code, next_courses=formatted)
+    return make_draft(prompt, f"After completing **{course_code}**, you can take {joined} next.")
 
-Respond conversationally in 2–4 sentences:
-- Accurately reflect the factual context (these are the verified next courses).
-- Briefly explain how these follow-up courses build on the knowledge from {course_code}.
-- Keep the tone warm, helpful, and concise.
-"""
-    response = llm.invoke(prompt).strip()
-
-    if not response or len(response.split()) < 4:
-        response = f"After completing **{course_code}**, you can take {joined} next."
-    return response
-
-def respond_course_info(question: str, course_code: str) -> str:
-    if not course_code:
-        return "Could you specify which course you’d like to know more about?"
-
-    rows = cypher_course_info(course_code)
-    if not rows or "error" in rows[0]:
-        return f"I couldn’t find detailed information for {course_code}."
-
-    c = rows[0]
-    title = c.get("title", "Unknown Course")
-    desc = c.get("description", "")
-    level = c.get("level", "N/A")
-    credits = c.get("credits", "N/A")
+def respond_next_course_query(course_code: str, question: Optional[str] = None) -> str:
+    return complete_draft(draft_next_course_query(course_code, question))
 
-    prereq_rows = cypher_prereqs_full(course_code)
-    prereqs = [r["code"] for r in prereq_rows if "code" in r] if prereq_rows else []
-    prereq_str = ", ".join(prereqs) if prereqs else "None"
+COURSE_INFO_PROMPT = """
+You are a friendly university advisor.
+A student asked: "{question}"
 
-    next_rows = cypher_next_after(course_code)
-    next_courses = [r["code"] for r in next_rows if "code" in r] if next_rows else []
-    next_str = ", ".join(next_courses) if next_courses else "None"
+Here is the factual information from the university database:
 
-    factual_context = f"""
 Course Code: {course_code}
 Title: {title}
 Credits: {credits}
 Level: {level}
-Description: {desc or 'No description available.'}
-Prerequisites: {prereq_str}
-Next Courses: {next_str}
-"""
-
-    prompt = f"""
-You are a friendly university advisor.
-A student asked: "{question}"
-
-Here is the factual information from the university database:
-{factual_context}
+Description: {description}
+Prerequisites: {prereqs}
+Next Courses: {next_courses}
 
 Now, summarize this naturally in a conversational tone (3–5 sentences).
 If possible, mention what the course prepares students for or what comes next.
 Avoid repeating the raw data directly; make it sound helpful and engaging.
 """
-    response = llm.invoke(prompt).strip()
 
-    if not response or len(response.split()) < 4:
-        response = (
-            f"**{course_code} — {title}** is a level {level} course worth {credits} credits.\n\n"
-            f"{desc}\n\nPrerequisites: {prereq_str}. Next recommended courses: {next_str}."
-        )
-    return response
+def draft_course_info(question: str, course_code: str, detail: Optional[dict] = None) -> dict:
+    if not course_code:
+        return make_draft(None, "Could you specify which course you’d like to know more about?")
+
+    if detail is None:
+        detail = cypher_course_detail(course_code)
+    if not detail:
+        return make_draft(None, f"I couldn’t find detailed information for {course_code}.")
+
+    title = detail.get("title") or "Unknown Course"
+    desc = detail.get("description") or ""
+    level = detail.get("level") or "N/A"
+    credits = detail.get("credits") or "N/A"
+
+    prereq_str = describe_prereq_groups(detail["groups"])
+    direct = {code for group in detail["groups"] for code in group["courses"]}
+    earlier = [code for code in detail["all_prereqs"] if code not in direct]
+    if earlier:
+        prereq_str += f" (which in turn build on {', '.join(sorted(earlier))})"
+
+    next_courses = [r["code"] for r in detail["next_courses"]]
+    next_str = ", ".join(next_courses) if next_courses else "None"
+
+    # The description is the only open-ended field; it is clipped to the budget.
+    prompt = build_prompt("course_info", COURSE_INFO_PROMPT, elastic="description",
+                          question=question, course_code=course_code, title=title,
+                          credits=credits, level=level, prereqs=prereq_str, next_courses=next_str,
+                          description=desc or "No description available.")
+    fallback = (
+        f"**{course_code} — {title}** is a level {level} course worth {credits} credits.\n\n"
+        f"{desc}\n\nPrerequisites: {prereq_str}. Next recommended courses: {next_str}."
+    )
+    return make_draft(prompt, fallback)
+
+def respond_course_info(question: str, course_code: str) -> str:
+    return complete_draft(draft_course_info(question, course_code))
 
 # ============================================================
 # MAIN ENTRYPOINT
 # ============================================================
-conversation_history: List[Dict[str, str]] = []
-last_course_code: Optional[str] = None
+# Intents answered with a rendered prerequisite graph (HTML) rather than text.
+PREREQ_INTENTS = {"prereq_query", "all_prerequisites"}
+# Intents about one course; a follow-up without a code reuses the last one.
+COURSE_INTENTS = PREREQ_INTENTS | {"next_course_query", "course_info"}
 
-def advisor_response(question: str):
-    global conversation_history, last_course_code
+def begin_turn(question: str, state: ConversationState, history: str = "") -> dict:
+    """
+    Records the question, plans it and returns the plan with the resolved course code.
+    `history` is the transcript taken before this question was recorded.
+    """
+    with metrics.span("plan"):
+        return record_plan(question, plan_question(question, state.last_course_code, history), state)
 
-    conversation_history.append({"role": "user", "content": question})
-    plan = plan_from_llm(question)
+def record_plan(question: str, plan: dict, state: ConversationState) -> dict:
+    state.add("user", question)
 
     intent = plan.get("intent", "general")
     course_codes = plan.get("course_codes", [])
+    if not course_codes and intent in COURSE_INTENTS and state.last_course_code:
+        course_codes = [state.last_course_code]
     if course_codes:
-        last_course_code = course_codes[0]
+        state.last_course_code = course_codes[0]
 
-    print("\n" + "=" * 80)
-    print(f"[DEBUG] Intent: {intent} | Codes: {course_codes} | Reason: {plan.get('reasoning','')}")
-    print("=" * 80 + "\n")
+    metrics.set_intent(intent)
+    logger.debug("Intent: %s | Codes: %s | Reason: %s", intent, course_codes, plan.get("reasoning", ""))
 
-    # Graph-based intents that can output HTML
-    graph_intents = {"prereq_query", "all_prerequisites", "next_course_query", "course_info"}
+    plan["intent"] = intent
+    plan["course_codes"] = course_codes
+    plan["code"] = course_codes[0] if course_codes else None
+    recorder.annotate(plan=dict(plan))
+    return plan
 
-    # ----------------------------------------------------------------------
-    # 1️⃣  Non-graph intents (plain text)
-    # ----------------------------------------------------------------------
+def remember_answer(state: ConversationState, plan: dict, result: dict) -> None:
+    if result["type"] == "html":
+        state.add("assistant", f"[prerequisite graph for {plan['code']}]")
+    else:
+        state.add("assistant", result["content"])
+
+# ============================================================
+# ELIGIBILITY
+# ============================================================
+ELIGIBILITY_MAX_LISTED = 15
+
+def draft_eligibility(question: str, completed: Optional[Iterable[str]] = None,
+                      matrix: Optional[EligibilityMatrix] = None) -> dict:
+    """
+    Eligibility intent: answered deterministically (no LLM) from the compiled
+    prerequisite matrix. Completed courses are the student's Enrollment rows
+    plus every course code mentioned in the question.
+    """
+    if matrix is None:
+        matrix = get_eligibility()
+    if matrix is None:
+        return make_draft(None, "I can't reach the course catalog right now. Please try again shortly.")
+
+    done = sorted({c for c in resolve_courses(question) if c in matrix.snapshot}
+                  | {c for c in completed or () if c in matrix.snapshot})
+    courses = matrix.eligible(done)
+    if not courses:
+        return make_draft(None, "I couldn't find any course you can take next.")
+
+    listed = ", ".join(f"{c['code']} ({c['title']})" if c["title"] else c["code"]
+                       for c in courses[:ELIGIBILITY_MAX_LISTED])
+    more = len(courses) - ELIGIBILITY_MAX_LISTED
+    if more > 0:
+        listed += f", and {more} more"
+    if done:
+        answer = f"With {', '.join(done)} completed, you can take: {listed}."
+    else:
+        answer = (f"Courses with no required prerequisites: {listed}. "
+                  "Tell me which courses you've completed and I'll include what they unlock.")
+    return make_draft(None, answer)
+
+def draft_for_intent(intent: str, code: Optional[str], question: str, student_id: Optional[str] = None,
+                     history: str = "") -> dict:
+    """
+    Builds the draft for a text intent. Unknown intents are answered as general questions.
+    `student_id` lets advising plans start from the student's Enrollment records;
+    `history` (ConversationState.transcript) goes into the open-ended prompts.
+    """
     if intent == "smalltalk":
-        return respond_smalltalk(question)
+        return draft_smalltalk(question)
     if intent == "advising":
-        return respond_advising(question)
-    if intent not in graph_intents:
-        return respond_general(question)
-
-    # ----------------------------------------------------------------------
-    # 2️⃣  Graph-driven intents (HTML or enhanced text)
-    # ----------------------------------------------------------------------
-    code = course_codes[0] if course_codes else None
-
-    if intent in {"prereq_query", "all_prerequisites"}:
-        depth = 1 if intent == "prereq_query" else 5
-        html = respond_prereq_query(code, question, depth=depth)
-        with open("example.txt", "w") as file:
-            file.write(html)
-        return {"type": "html", "content": html}
-
-    elif intent == "next_course_query":
-        # This one might remain text or later become graph too
-        response = respond_next_course_query(code, question)
-        return {"type": "text", "content": response}
-
-    elif intent == "course_info":
-        response = respond_course_info(question, code)
-        return {"type": "text", "content": response}
-
-    # Default fallback (safety net)
-    return {"type": "text", "content": respond_general(question)}
+        completed = completed_courses(student_id) if student_id else None
+        return draft_advising(question, plan=degree_plan(question, completed), history=history)
+    if intent == "eligibility":
+        return draft_eligibility(question, completed_courses(student_id) if student_id else None)
+    if intent == "next_course_query":
+        return draft_next_course_query(code, question)
+    if intent == "course_info":
+        return draft_course_info(question, code)
+    return draft_general(question, history=history)
+
+def prereq_depth(intent: str) -> Optional[int]:
+    """
+    Direct prerequisites for prereq_query; the full closure for all_prerequisites.
+    """
+    return 1 if intent == "prereq_query" else None
+
+def respond_prereq_intent(intent: str, code: Optional[str], question: str) -> str:
+    return respond_prereq_query(code, question, depth=prereq_depth(intent))
+
+# Used when no per-session state is passed (CLI, scripts); bounded like any other.
+_default_state = ConversationState()
+
+def advisor_response(question: str, state: Optional[ConversationState] = None):
+    state = state if state is not None else _default_state
+    with metrics.turn(), recorder.capture(question, state):
+        history = state.transcript()
+        plan = begin_turn(question, state, history)
+        intent, code = plan["intent"], plan["code"]
+
+        # Graph-driven prerequisite intents render HTML
+        if intent in PREREQ_INTENTS:
+            result = {"type": "html", "content": respond_prereq_intent(intent, code, question)}
+        else:
+            # Everything else is plain text
+            response = complete_draft(draft_for_intent(intent, code, question, state.student_id, history))
+            result = {"type": "text", "content": response}
+        recorder.annotate(result=result)
+
+    remember_answer(state, plan, result)
+    return result
+
+def advisor_response_stream(question: str, state: Optional[ConversationState] = None) -> Iterator[dict]:
+    """
+    Streaming variant of advisor_response. Yields events:
+      {"type": "token", "content": "..."}    incremental text from the LLM
+      {"type": "text" | "html", "content": "..."}  a complete answer (replaces any tokens)
+      {"type": "error", "content": "..."}
+      {"type": "done"}
+    """
+    state = state if state is not None else _default_state
+    record, result = recorder.start(question, state), None
+    with metrics.turn() as status:
+        try:
+            history = state.transcript()
+            plan = begin_turn(question, state, history)
+            intent, code = plan["intent"], plan["code"]
+
+            if intent in PREREQ_INTENTS:
+                result = {"type": "html", "content": respond_prereq_intent(intent, code, question)}
+                yield result
+            else:
+                draft = draft_for_intent(intent, code, question, state.student_id, history)
+                if draft["prompt"] is None:
+                    result = {"type": "text", "content": draft["fallback"] or ""}
+                    yield result
+                else:
+                    parts = []
+                    for token in llm.stream(draft["prompt"]):
+                        parts.append(token)
+                        yield {"type": "token", "content": token}
+                    response = "".join(parts)
+                    result = {"type": "text", "content": finish_draft(draft, response)}
+                    if result["content"] != response.strip():
+                        yield result
+            remember_answer(state, plan, result)
+        except Exception as e:
+            status["ok"] = False
+            logger.exception("Streaming response failed")
+            recorder.finish(record, result, error=f"{type(e).__name__}: {e}")
+            yield {"type": "error", "content": "Sorry, something went wrong while answering."}
+        else:
+            recorder.finish(record, result)
+
+    yield {"type": "done"}
 
 
 # ============================================================
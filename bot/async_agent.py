@@ -0,0 +1,218 @@
+"""
+Async advisor pipeline
+----------------------
+Mirror of advisor_response / advisor_response_stream for the ASGI views. The LLM
+is called through GroqLLM's httpx path (ainvoke / astream) and graph lookups go
+through neo4j's AsyncGraphDatabase, so a single worker can hold hundreds of
+chats open while they wait on Groq.
+
+Prompt building is shared with bot/agent.py: the sync draft_* helpers accept
+pre-fetched graph data, and this module only supplies that data asynchronously.
+"""
+
+import logging
+from typing import AsyncIterator, Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+
+from CourseCompass import metrics
+from CourseCompass.neo4j_driver import get_async_driver
+from courses.catalog import get_snapshot
+from courses.closure import get_closure
+from . import agent, recorder
+from .agent import llm
+from .conversation import ConversationState
+from .eligibility import get_eligibility
+from .planner import acompleted_courses
+
+logger = logging.getLogger(__name__)
+
+# The snapshot, digest and retrieval index live in memory; only a version change
+# triggers a (sync) reload, so run them off the event loop.
+aget_snapshot = sync_to_async(get_snapshot, thread_sensitive=False)
+aget_closure = sync_to_async(get_closure, thread_sensitive=False)
+arelevant_graph_rows = sync_to_async(agent.relevant_graph_rows, thread_sensitive=False)
+adegree_plan = sync_to_async(agent.degree_plan, thread_sensitive=False)
+aget_eligibility = sync_to_async(get_eligibility, thread_sensitive=False)
+# Routing resolves course mentions against the snapshot and the eligibility
+# draft evaluates the matrix; both are CPU work that would stall the loop.
+aroute_question = sync_to_async(agent.route_question, thread_sensitive=False)
+adraft_eligibility = sync_to_async(agent.draft_eligibility, thread_sensitive=False)
+
+
+# ============================================================
+# GRAPH QUERIES
+# ============================================================
+@metrics.timed("cypher")
+async def arun_query(query: str, params: Optional[dict] = None) -> List[Dict]:
+    try:
+        async with get_async_driver().session() as session:
+            result = await session.run(query, params or {})
+            return [record.data() async for record in result]
+    except Exception as e:
+        return [{"error": str(e)}]
+
+@metrics.timed("graph")
+@recorder.captured
+async def acypher_course_info(code: str):
+    snapshot = await aget_snapshot()
+    if snapshot is not None:
+        return snapshot.course_info(code)
+    return await arun_query(agent.COURSE_INFO_QUERY, {"code": code})
+
+@metrics.timed("graph")
+@recorder.captured
+async def acypher_prereqs_full(code: str, depth: Optional[int] = 3):
+    if depth is None:
+        closure = await aget_closure()
+        if closure is not None:
+            return closure.prereqs(code)
+        depth = agent.MAX_PREREQ_DEPTH
+    snapshot = await aget_snapshot()
+    if snapshot is not None:
+        return snapshot.prereqs(code, depth)
+    res = await arun_query(agent.PREREQS_FULL_QUERY.format(depth=depth), {"code": code})
+    return agent.prereq_rows_to_data(res)
+
+@metrics.timed("graph")
+@recorder.captured
+async def acypher_next_after(code: str):
+    snapshot = await aget_snapshot()
+    if snapshot is not None:
+        return snapshot.successors(code)
+    return await arun_query(agent.NEXT_AFTER_QUERY, {"code": code})
+
+@metrics.timed("graph")
+@recorder.captured
+async def acypher_course_detail(code: str) -> Optional[dict]:
+    snapshot = await aget_snapshot()
+    if snapshot is not None:
+        return snapshot.course_detail(code)
+    rows = await arun_query(agent.COURSE_DETAIL_QUERY, {"code": code})
+    if not rows or "error" in rows[0]:
+        return None
+    return rows[0]
+
+
+# ============================================================
+# PLANNING AND DRAFTS
+# ============================================================
+async def aplan_question(question: str, last_code: Optional[str] = None, history: str = "") -> dict:
+    plan = await aroute_question(question, last_code)
+    if plan and plan["confidence"] >= agent.ROUTER_MIN_CONFIDENCE:
+        agent._record_route(plan["intent"], "fast")
+        return plan
+
+    try:
+        raw = (await llm.ainvoke(agent.planner_prompt(question, history))).strip()
+    except Exception as e:
+        logger.error("Planner LLM call failed: %s", e)
+        raw = ""
+    plan = agent.parse_plan(raw)
+    agent._record_route(plan["intent"], "llm")
+    return plan
+
+async def adraft_for_intent(intent: str, code: Optional[str], question: str, student_id: Optional[str] = None,
+                            history: str = "") -> dict:
+    if intent == "smalltalk":
+        return agent.draft_smalltalk(question)
+    if intent == "advising":
+        completed = await acompleted_courses(student_id) if student_id else None
+        plan = await adegree_plan(question, completed)
+        if plan is not None:
+            return agent.draft_degree_plan(question, plan)
+        return agent.draft_advising(question, await arelevant_graph_rows(question, agent.ADVISING_CONTEXT_COURSES),
+                                    history=history)
+    if intent == "eligibility":
+        completed = await acompleted_courses(student_id) if student_id else None
+        return await adraft_eligibility(question, completed, await aget_eligibility())
+    if intent == "next_course_query":
+        res = await acypher_next_after(code) if code else None
+        return agent.draft_next_course_query(code, question, res)
+    if intent == "course_info":
+        if not code:
+            return agent.draft_course_info(question, code)
+        return agent.draft_course_info(question, code, await acypher_course_detail(code) or {})
+    return agent.draft_general(question, await arelevant_graph_rows(question, agent.GENERAL_CONTEXT_COURSES),
+                               history=history)
+
+async def arespond_prereq_query(course_code: str, depth: Optional[int] = 3) -> str:
+    if not course_code:
+        return "Could you tell me which course you're referring to?"
+
+    data = await acypher_prereqs_full(course_code, depth)
+    if not data.get("prereqs"):
+        return f"There are no prerequisites listed for {course_code}."
+
+    graph_html = agent.render_prereq_graph(data)
+    summary = (await llm.ainvoke(agent.prereq_summary_prompt(data["target"]))).strip()
+    if not summary:
+        summary = f"These prerequisites provide the essential background for {course_code}."
+    return agent.wrap_prereq_response(graph_html, summary)
+
+
+# ============================================================
+# MAIN ENTRYPOINTS
+# ============================================================
+async def abegin_turn(question: str, state: ConversationState, history: str = "") -> dict:
+    with metrics.span("plan"):
+        return agent.record_plan(question, await aplan_question(question, state.last_course_code, history), state)
+
+async def aadvisor_response(question: str, state: ConversationState) -> dict:
+    with metrics.turn(), recorder.capture(question, state):
+        history = state.transcript()
+        plan = await abegin_turn(question, state, history)
+        intent, code = plan["intent"], plan["code"]
+
+        if intent in agent.PREREQ_INTENTS:
+            result = {"type": "html", "content": await arespond_prereq_query(code, agent.prereq_depth(intent))}
+        else:
+            draft = await adraft_for_intent(intent, code, question, state.student_id, history)
+            if draft["prompt"] is None:
+                result = {"type": "text", "content": draft["fallback"] or ""}
+            else:
+                response = agent.finish_draft(draft, await llm.ainvoke(draft["prompt"]))
+                result = {"type": "text", "content": response}
+        recorder.annotate(result=result)
+
+    agent.remember_answer(state, plan, result)
+    return result
+
+async def aadvisor_response_stream(question: str, state: ConversationState) -> AsyncIterator[dict]:
+    """
+    Async counterpart of agent.advisor_response_stream; yields the same events.
+    """
+    record, result = recorder.start(question, state), None
+    with metrics.turn() as status:
+        try:
+            history = state.transcript()
+            plan = await abegin_turn(question, state, history)
+            intent, code = plan["intent"], plan["code"]
+
+            if intent in agent.PREREQ_INTENTS:
+                result = {"type": "html", "content": await arespond_prereq_query(code, agent.prereq_depth(intent))}
+                yield result
+            else:
+                draft = await adraft_for_intent(intent, code, question, state.student_id, history)
+                if draft["prompt"] is None:
+                    result = {"type": "text", "content": draft["fallback"] or ""}
+                    yield result
+                else:
+                    parts = []
+                    async for token in llm.astream(draft["prompt"]):
+                        parts.append(token)
+                        yield {"type": "token", "content": token}
+                    response = "".join(parts)
+                    result = {"type": "text", "content": agent.finish_draft(draft, response)}
+                    if result["content"] != response.strip():
+                        yield result
+            agent.remember_answer(state, plan, result)
+        except Exception as e:
+            status["ok"] = False
+            logger.exception("Streaming response failed")
+            recorder.finish(record, result, error=f"{type(e).__name__}: {e}")
+            yield {"type": "error", "content": "Sorry, something went wrong while answering."}
+        else:
+            recorder.finish(record, result)
+
+    yield {"type": "done"}
@@ -0,0 +1,361 @@
+"""
+Offline advisor benchmark
+-------------------------
+Measures advisor_response and the send_message view without Groq or Neo4j:
+
+  * StubGroqServer is a local chat-completions endpoint (JSON and SSE) with a
+    configurable first-token latency and token rate;
+  * synthetic_catalog() generates a seeded, acyclic catalog of any size, and
+    install_catalog() primes the catalog snapshot with it, so every graph
+    lookup is served in-process exactly as in production.
+
+Run through `manage.py bench_advisor`; results are saved as JSON so two runs
+can be compared with --compare.
+"""
+
+import asyncio
+import json
+import math
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from courses.catalog import CatalogSnapshot, bump_catalog_version, snapshot_artifact
+
+DEPARTMENTS = ["CS", "MATH", "STAT", "PHYS", "CHEM", "BIO", "ECON", "PHIL", "ENG", "HIST"]
+TITLE_WORDS = [
+    "Applied", "Advanced", "Foundations of", "Topics in", "Introduction to", "Principles of",
+    "Methods in", "Theory of", "Systems for", "Design of",
+]
+SUBJECTS = [
+    "Algorithms", "Databases", "Networks", "Statistics", "Calculus", "Mechanics", "Genetics",
+    "Markets", "Ethics", "Writing", "Graphics", "Compilers", "Optimization", "Ecology", "Logic",
+]
+
+# question templates per intent; {code}/{other} are filled with catalog codes
+QUESTIONS = {
+    "smalltalk": ["hi", "thanks!"],
+    "prereq_query": ["What are the prerequisites for {code}?"],
+    "all_prerequisites": ["What do I need before I can take {code}?"],
+    "next_course_query": ["What can I take after {code}?"],
+    "course_info": ["Tell me about {code}."],
+    "advising": ["I've taken {other}. Plan my way to {code}.", "Which courses should I take next term?"],
+    "eligibility": ["What can I take now? I've passed {other}."],
+    "general": ["When does the semester start?"],
+}
+
+
+# ============================================================
+# SYNTHETIC CATALOG
+# ============================================================
+def synthetic_catalog(size: int, seed: int = 7) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    (courses, groups) rows in the shape load_snapshot reads. Courses only
+    require courses generated before them, so the graph is acyclic; about a
+    third of the groups are OR groups and one in eight is recommended.
+    """
+    rng = random.Random(seed)
+    courses, groups = [], []
+    per_department = -(-size // len(DEPARTMENTS))
+    numbered: Dict[Tuple[str, int], int] = {}
+    for i in range(size):
+        dept = DEPARTMENTS[i % len(DEPARTMENTS)]
+        level = 100 * (1 + min(4 * (i // len(DEPARTMENTS)) // per_department, 3))
+        k = numbered[dept, level] = numbered.get((dept, level), -1) + 1
+        code = f"{dept} {level + k % 100}" + (chr(64 + k // 100) if k >= 100 else "")
+        courses.append({
+            "code": code,
+            "title": f"{rng.choice(TITLE_WORDS)} {rng.choice(SUBJECTS)} {i}",
+            "credits": rng.choice([3, 3, 3, 4, 1]),
+            "level": level,
+            "description": f"{rng.choice(SUBJECTS)} and {rng.choice(SUBJECTS).lower()} for level {level} students.",
+        })
+        if i < len(DEPARTMENTS):
+            continue
+        for g in range(rng.choice([0, 1, 1, 2, 3])):
+            members = sorted({courses[rng.randrange(i)]["code"] for _ in range(rng.choice([1, 1, 2, 3]))})
+            groups.append({
+                "course": code,
+                "id": f"{code}:{g}",
+                "type": "OR" if len(members) > 1 and rng.random() < 0.35 else "AND",
+                "recommended": rng.random() < 0.125,
+                "members": members,
+            })
+    return courses, groups
+
+
+def install_catalog(courses: List[Dict[str, Any]], groups: List[Dict[str, Any]]) -> CatalogSnapshot:
+    """
+    Makes `get_snapshot()` return a snapshot of the given rows under a fresh
+    catalog version, so derived artifacts rebuild from it without Neo4j.
+    """
+    version = bump_catalog_version()
+    snapshot = CatalogSnapshot(version, courses, groups)
+    snapshot_artifact.prime(snapshot, version)
+    return snapshot
+
+
+def questions_for(snapshot: CatalogSnapshot, count: int, seed: int = 7,
+                  intents: Optional[Sequence[str]] = None) -> List[Tuple[str, str]]:
+    """
+    (intent label, question) pairs cycling through the intents.
+    """
+    rng = random.Random(seed)
+    intents = list(intents or QUESTIONS)
+    pairs = []
+    for i in range(count):
+        intent = intents[i % len(intents)]
+        template = rng.choice(QUESTIONS[intent])
+        code, other = rng.choice(snapshot.codes), rng.choice(snapshot.codes)
+        pairs.append((intent, template.format(code=code, other=other)))
+    return pairs
+
+
+# ============================================================
+# GROQ STUB
+# ============================================================
+class StubGroqServer:
+    """
+    Local OpenAI/Groq-compatible chat-completions endpoint. Each response
+    waits `latency` seconds, then produces `tokens` words at `tokens_per_second`
+    (all at once for JSON responses, one SSE event per word when streaming).
+    The intent planner prompt gets a JSON plan back.
+
+    Tests can script responses: `script` holds (status, headers, body) tuples
+    served in order, the last one repeating, and `stream_lines` replaces the
+    generated SSE lines of streaming requests.
+    """
+
+    def __init__(self, latency: float = 0.2, tokens_per_second: float = 500.0, tokens: int = 60,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.tokens = tokens
+        self.requests = 0
+        self.script: List[Tuple[int, Dict[str, str], Any]] = []
+        self.stream_lines: Optional[List[str]] = None
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/openai/v1/chat/completions"
+
+    def __enter__(self) -> "StubGroqServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="groq-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def completion(self, prompt: str) -> List[str]:
+        if "structured planner" in prompt:
+            return ['{"intent": "general", "course_codes": [], "reasoning": "stub"}']
+        return [f"word{i} " for i in range(self.tokens)]
+
+    def respond(self, prompt: str) -> Optional[Tuple[int, Dict[str, str], Any]]:
+        """
+        The scripted response for this request, or None to generate one.
+        """
+        with self._lock:
+            if not self.script:
+                return None
+            return self.script[0] if len(self.script) == 1 else self.script.pop(0)
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.requests += 1
+                prompt = "".join(m.get("content", "") for m in payload.get("messages", []))
+                time.sleep(stub.latency)
+                scripted = stub.respond(prompt)
+                if scripted is not None:
+                    status, headers, body = scripted
+                    self.send_json(body, status, headers)
+                    return
+                if payload.get("stream") and stub.stream_lines is not None:
+                    self.stream(stub.stream_lines)
+                    return
+                parts = stub.completion(prompt)
+                usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(parts),
+                         "total_tokens": len(prompt) // 4 + len(parts)}
+                if payload.get("stream"):
+                    lines = [f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': part}}]})}"
+                             for part in parts]
+                    self.stream(lines + [f"data: {json.dumps({'choices': [], 'usage': usage})}", "data: [DONE]"])
+                else:
+                    time.sleep(len(parts) / stub.tokens_per_second)
+                    self.send_json({
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(parts)}}],
+                        "usage": usage,
+                    })
+
+            def send_json(self, body, status=200, headers=None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def stream(self, lines):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for line in lines:
+                    self.wfile.write(f"{line}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(1 / stub.tokens_per_second)
+                self.close_connection = True
+
+        return Handler
+
+
+# ============================================================
+# MEASUREMENT
+# ============================================================
+def percentile(samples: Sequence[float], q: float) -> float:
+    """
+    Nearest-rank percentile (q in 0..100) of the samples.
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """
+    count, mean and p50/p95/p99 in milliseconds.
+    """
+    return {
+        "count": len(samples),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+    }
+
+
+def report(timings: List[Tuple[str, float, bool]], elapsed: float) -> Dict[str, Any]:
+    by_intent: Dict[str, List[float]] = {}
+    for intent, seconds, _ in timings:
+        by_intent.setdefault(intent, []).append(seconds)
+    return {
+        "requests": len(timings),
+        "errors": sum(1 for _, _, ok in timings if not ok),
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(timings) / elapsed, 2) if elapsed > 0 else 0.0,
+        "overall": summarize([seconds for _, seconds, _ in timings]),
+        "intents": {intent: summarize(samples) for intent, samples in sorted(by_intent.items())},
+    }
+
+
+def bench_advisor_response(pairs: List[Tuple[str, str]], concurrency: int) -> Dict[str, Any]:
+    """
+    Runs agent.advisor_response for every question from `concurrency` threads,
+    one conversation per client.
+    """
+    from .agent import advisor_response
+    from .conversation import ConversationState
+
+    def client(chunk):
+        state = ConversationState()
+        timings = []
+        for intent, question in chunk:
+            started = time.perf_counter()
+            try:
+                advisor_response(question, state)
+                ok = True
+            except Exception:
+                ok = False
+            timings.append((intent, time.perf_counter() - started, ok))
+        return timings
+
+    chunks = [pairs[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = [t for result in pool.map(client, chunks) for t in result]
+    return report(timings, time.perf_counter() - started)
+
+
+def bench_send_message(pairs: List[Tuple[str, str]], concurrency: int) -> Dict[str, Any]:
+    """
+    POSTs every question to bot.views.send_message through Django's AsyncClient
+    from `concurrency` concurrent clients (each with its own session).
+    """
+    from django.test import AsyncClient
+    from django.urls import reverse
+
+    url = reverse("bot:send_message")
+
+    async def client(chunk):
+        http = AsyncClient()
+        timings = []
+        for intent, question in chunk:
+            started = time.perf_counter()
+            try:
+                response = await http.post(url, {"message": question})
+                ok = response.status_code == 200
+            except Exception:
+                ok = False
+            timings.append((intent, time.perf_counter() - started, ok))
+        return timings
+
+    async def run():
+        results = await asyncio.gather(*(client(pairs[i::concurrency]) for i in range(concurrency)))
+        return [t for result in results for t in result]
+
+    started = time.perf_counter()
+    timings = asyncio.run(run())
+    return report(timings, time.perf_counter() - started)
+
+
+def compare(previous: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Lines comparing p50/p95/rps of two saved results, per target and intent.
+    """
+    lines = []
+    for target, now in current.get("results", {}).items():
+        before = previous.get("results", {}).get(target)
+        if not before:
+            continue
+        lines.append(f"{target}: rps {before['rps']} -> {now['rps']} ({_change(before['rps'], now['rps'])})")
+        rows = [("overall", before["overall"], now["overall"])]
+        rows += [(intent, before["intents"][intent], stats)
+                 for intent, stats in now["intents"].items() if intent in before["intents"]]
+        for name, old, new in rows:
+            lines.append(
+                f"  {name:<18} p50 {old['p50_ms']:>8.1f} -> {new['p50_ms']:>8.1f} ms ({_change(old['p50_ms'], new['p50_ms'])})"
+                f"   p95 {old['p95_ms']:>8.1f} -> {new['p95_ms']:>8.1f} ms ({_change(old['p95_ms'], new['p95_ms'])})"
+            )
+    return lines
+
+
+def _change(old: float, new: float) -> str:
+    if not old:
+        return "n/a"
+    return f"{(new - old) / old * 100:+.1f}%"
+
@@ -0,0 +1,104 @@
+"""
+Per-session conversation state
+------------------------------
+Replaces the process-wide `conversation_history` / `last_course_code` globals.
+Each Django session gets a bounded ring buffer of recent turns, the last course
+it talked about (so "and what about after that?" resolves per user) and an
+optional rolling summary of turns that fell out of the buffer. `transcript()`
+renders the summary and the latest turns for the planner and the open-ended
+draft prompts (general, advising).
+
+State is stored in the cache named by settings.CONVERSATION_CACHE_ALIAS
+(default "default"), so every worker sharing that cache sees the same state.
+"""
+
+from collections import deque
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.cache import caches
+
+HISTORY_TURNS = getattr(settings, "CONVERSATION_HISTORY_TURNS", 10)
+SUMMARY_MAX_CHARS = getattr(settings, "CONVERSATION_SUMMARY_MAX_CHARS", 600)
+ROLLING_SUMMARY = getattr(settings, "CONVERSATION_ROLLING_SUMMARY", True)
+STATE_TTL = getattr(settings, "CONVERSATION_TTL", 2 * 3600)
+TURN_MAX_CHARS = 500
+# Latest turns shown to the LLM, and how much of each.
+CONTEXT_TURNS = getattr(settings, "CONVERSATION_CONTEXT_TURNS", 4)
+CONTEXT_TURN_CHARS = 200
+
+
+class ConversationState:
+    def __init__(self, turns=None, last_course_code: Optional[str] = None, summary: str = ""):
+        self.turns = deque(turns or [], maxlen=HISTORY_TURNS)
+        self.last_course_code = last_course_code
+        self.summary = summary
+        # Set per request from the session (not stored with the state).
+        self.student_id: Optional[str] = None
+        self.session_id: Optional[str] = None
+
+    def add(self, role: str, content: str) -> None:
+        if len(self.turns) == self.turns.maxlen:
+            self._fold_into_summary(self.turns[0])
+        self.turns.append({"role": role, "content": content[:TURN_MAX_CHARS]})
+
+    def transcript(self) -> str:
+        """
+        The rolling summary and the latest turns as prompt text, oldest first;
+        "" at the start of a conversation.
+        """
+        lines = [f"Earlier questions: {self.summary}"] if self.summary else []
+        for turn in list(self.turns)[-CONTEXT_TURNS:]:
+            speaker = "Student" if turn["role"] == "user" else "Advisor"
+            lines.append(f"{speaker}: {turn['content'][:CONTEXT_TURN_CHARS]}")
+        return "\n".join(lines)
+
+    def _fold_into_summary(self, turn: Dict[str, str]) -> None:
+        # Only questions are kept: they carry the topics, answers can be re-derived.
+        if not ROLLING_SUMMARY or turn["role"] != "user":
+            return
+        summary = f"{self.summary} | {turn['content'][:120]}" if self.summary else turn["content"][:120]
+        self.summary = summary[-SUMMARY_MAX_CHARS:]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "turns": list(self.turns),
+            "last_course_code": self.last_course_code,
+            "summary": self.summary,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "ConversationState":
+        if not data:
+            return cls()
+        return cls(data.get("turns"), data.get("last_course_code"), data.get("summary", ""))
+
+
+def _cache():
+    return caches[getattr(settings, "CONVERSATION_CACHE_ALIAS", "default")]
+
+
+def _key(session_key: str) -> str:
+    return f"bot:conversation:{session_key}"
+
+
+def load_state(session_key: Optional[str]) -> ConversationState:
+    if not session_key:
+        return ConversationState()
+    return ConversationState.from_dict(_cache().get(_key(session_key)))
+
+
+def save_state(session_key: Optional[str], state: ConversationState) -> None:
+    if session_key:
+        _cache().set(_key(session_key), state.to_dict(), STATE_TTL)
+
+
+async def aload_state(session_key: Optional[str]) -> ConversationState:
+    if not session_key:
+        return ConversationState()
+    return ConversationState.from_dict(await _cache().aget(_key(session_key)))
+
+
+async def asave_state(session_key: Optional[str], state: ConversationState) -> None:
+    if session_key:
+        await _cache().aset(_key(session_key), state.to_dict(), STATE_TTL)
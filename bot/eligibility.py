@@ -0,0 +1,127 @@
+"""
+Course eligibility
+------------------
+Answers "what can I take now?" for one student or many at once.
+
+Every required (non-recommended) prerequisite group is compiled into flat
+NumPy arrays: its member course indices, where each group starts, and how many
+members must be done (all for AND, N for "N of", otherwise one). Groups are
+ordered by the course that owns them. For a boolean matrix of completed
+courses (students x courses) one pass then gives
+
+  counts  = add.reduceat(done[:, members], group starts)   done members per group
+  unmet   = counts < quota
+  blocked = logical_or.reduceat(unmet, course starts)      any unmet group per course
+
+and a course is eligible when it is neither blocked nor already done.
+Recommended groups never block a course.
+
+The compiled matrix is rebuilt once per catalog version.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from courses.catalog import CatalogSnapshot, VersionedArtifact, get_snapshot
+
+from .planner import group_quota
+
+# Students evaluated per NumPy pass in a batch; bounds the (students x members) temporary.
+BATCH_ROWS = 256
+
+
+class EligibilityMatrix:
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        members: List[int] = []
+        group_starts: List[int] = []
+        quotas: List[int] = []
+        course_starts: List[int] = []
+        gated: List[int] = []
+
+        for c in range(len(snapshot)):
+            first = len(group_starts)
+            for g in snapshot.groups_of(c):
+                group = snapshot.members_of(g)
+                if snapshot.group_recommended[g] or not len(group):
+                    continue
+                group_starts.append(len(members))
+                members.extend(group)
+                quotas.append(group_quota(snapshot.group_types[g], len(group)))
+            if len(group_starts) > first:
+                course_starts.append(first)
+                gated.append(c)
+
+        self.members = np.asarray(members, dtype=np.intp)
+        self.group_starts = np.asarray(group_starts, dtype=np.intp)
+        self.quotas = np.asarray(quotas, dtype=np.int32)
+        self.course_starts = np.asarray(course_starts, dtype=np.intp)
+        self.gated = np.asarray(gated, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.snapshot)
+
+    def completed_matrix(self, completed: Sequence[Iterable[str]]) -> np.ndarray:
+        """
+        Boolean (students x courses) matrix from lists of course codes; codes
+        not in the catalog are ignored.
+        """
+        done = np.zeros((len(completed), len(self)), dtype=bool)
+        for row, codes in enumerate(completed):
+            for code in codes:
+                c = self.snapshot.lookup(code)
+                if c is not None:
+                    done[row, c] = True
+        return done
+
+    def evaluate(self, done: np.ndarray) -> np.ndarray:
+        """
+        Boolean (students x courses) matrix of courses each student may take next.
+        """
+        done = np.atleast_2d(done)
+        eligible = ~done
+        if not len(self.group_starts):
+            return eligible
+        for start in range(0, done.shape[0], BATCH_ROWS):
+            block = done[start:start + BATCH_ROWS]
+            counts = np.add.reduceat(block[:, self.members].astype(np.int32), self.group_starts, axis=1)
+            unmet = counts < self.quotas
+            blocked = np.logical_or.reduceat(unmet, self.course_starts, axis=1)
+            eligible[start:start + BATCH_ROWS, self.gated] &= ~blocked
+        return eligible
+
+    def eligible_batch(self, completed: Sequence[Iterable[str]]) -> List[List[Dict[str, Any]]]:
+        """
+        For each list of completed codes, the eligible courses ordered by level then code.
+        """
+        snapshot = self.snapshot
+        rows = self.evaluate(self.completed_matrix(completed))
+        results = []
+        for row in rows:
+            courses = sorted(np.flatnonzero(row).tolist(),
+                             key=lambda c: (snapshot.levels[c] is None, snapshot.levels[c] or 0, snapshot.codes[c]))
+            results.append([
+                {"code": snapshot.codes[c], "title": snapshot.titles[c],
+                 "level": snapshot.levels[c], "credits": snapshot.credits[c]}
+                for c in courses
+            ])
+        return results
+
+    def eligible(self, completed: Iterable[str]) -> List[Dict[str, Any]]:
+        return self.eligible_batch([list(completed)])[0]
+
+
+def build_eligibility(version: str) -> EligibilityMatrix:
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise RuntimeError("catalog snapshot unavailable")
+    return EligibilityMatrix(snapshot)
+
+
+eligibility_artifact = VersionedArtifact("eligibility", build_eligibility)
+
+
+def get_eligibility() -> Optional[EligibilityMatrix]:
+    return eligibility_artifact.get()
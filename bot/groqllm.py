@@ -1,8 +1,19 @@
-from typing import Optional, List, Any, Dict
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Any, Dict, Iterator, AsyncIterator
+from asgiref.sync import sync_to_async
 from pydantic import BaseModel, Field
 from langchain.llms.base import LLM
 from langchain.schema import LLMResult, Generation
-import requests
+from langchain_core.outputs import GenerationChunk
+from CourseCompass.metrics import span
+from .transport import default_transport
+from .prompting import usage_stats
+from .recorder import record_llm
+
+logger = logging.getLogger(__name__)
 
 class GroqLLM(LLM, BaseModel):
     """
@@ -15,27 +26,34 @@ class GroqLLM(LLM, BaseModel):
     timeout: float = 30.0  # seconds
     temperature: float = 0.0
     max_tokens: Optional[int] = 512
+    # Optional bot.llm_cache.LLMCache; responses are reused for identical
+    # prompt + model parameters.
+    response_cache: Optional[Any] = Field(default=None, exclude=True)
+    # Optional bot.transport.GroqTransport; defaults to the pooled per-worker one.
+    transport: Optional[Any] = Field(default=None, exclude=True)
+    # Max prompts in flight for batch calls (llm.generate / llm.batch / agenerate).
+    batch_concurrency: int = 4
 
-    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        headers = {
+    def _headers(self) -> Dict[str, str]:
+        return {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}",
         }
 
-        # For debugging, keep but avoid printing secrets
-        print("Payload sent to Groq API:", {**payload, "messages": "[omitted for brevity]"})
+    def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        headers = self._headers()
 
-        resp = requests.post(self.api_url, headers=headers, json=payload, timeout=self.timeout)
-        if not resp.ok:
-            # Surface Groq's actual error text so you know WHY it's 400
-            raise RuntimeError(f"Groq error {resp.status_code}: {resp.text}")
+        # Never log the messages or the headers (API key)
+        logger.debug("Groq request: %s", {**payload, "messages": "[omitted]"})
 
-        data = resp.json()
-        # Optional debug
-        print("Response JSON keys:", list(data.keys()))
+        # Retries 429/5xx and surfaces Groq's actual error text otherwise
+        transport = self.transport or default_transport()
+        with span("llm"):
+            data = transport.post_json(self.api_url, headers, payload, self.timeout)
+        logger.debug("Groq response keys: %s", list(data.keys()))
         return data
 
-    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+    def _payload(self, prompt: str, stop: Optional[List[str]] = None) -> Dict[str, Any]:
         payload = {
             "model": self.model,
             "messages": [{"role": "user", "content": prompt}],
@@ -45,22 +63,182 @@ class GroqLLM(LLM, BaseModel):
             payload["max_tokens"] = self.max_tokens
         if stop:
             payload["stop"] = stop
+        return payload
 
-        data = self._post(payload)
+    def _cache_lookup(self, prompt: str, stop: Optional[List[str]]):
+        if self.response_cache is None:
+            return None, None
+        cache_key = self.response_cache.make_key(prompt, stop, self._identifying_params)
+        return cache_key, self.response_cache.get(cache_key)
+
+    # The cache reads and writes sqlite; the async path runs them off the event loop.
+    async def _acache_lookup(self, prompt: str, stop: Optional[List[str]]):
+        if self.response_cache is None:
+            return None, None
+        cache_key = self.response_cache.make_key(prompt, stop, self._identifying_params)
+        return cache_key, await sync_to_async(self.response_cache.get, thread_sensitive=False)(cache_key)
+
+    async def _acache_store(self, cache_key: str, text: str) -> None:
+        await sync_to_async(self.response_cache.set, thread_sensitive=False)(cache_key, text)
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None) -> str:
+        started = time.perf_counter()
+        cache_key, cached = self._cache_lookup(prompt, stop)
+        if cached is not None:
+            record_llm(prompt, cached, started, cached=True)
+            return cached
+
+        data = self._post(self._payload(prompt, stop))
 
         # Defensive extraction
         try:
-            return data["choices"][0]["message"]["content"]
+            text = data["choices"][0]["message"]["content"]
         except (KeyError, IndexError, TypeError):
             raise ValueError(f"Unexpected Groq response format: {data}")
+        usage_stats.record(self.model, data.get("usage"), prompt)
+        record_llm(prompt, text, started)
+
+        if cache_key is not None:
+            self.response_cache.set(cache_key, text)
+        return text
+
+    def stream_text(self, prompt: str, stop: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        Yields the completion incrementally (chat-completions with stream=True).
+        A cached response is yielded as a single chunk.
+        """
+        started = time.perf_counter()
+        cache_key, cached = self._cache_lookup(prompt, stop)
+        if cached is not None:
+            record_llm(prompt, cached, started, cached=True)
+            yield cached
+            return
+
+        payload = {**self._payload(prompt, stop), "stream": True}
+        transport = self.transport or default_transport()
+
+        parts = []
+        with span("llm"):
+            for event in transport.post_stream(self.api_url, self._headers(), payload, self.timeout):
+                usage_stats.record(self.model, _stream_usage(event), prompt)
+                if isinstance(event, dict) and event.get("choices") == []:
+                    continue  # usage-only final chunk
+                try:
+                    delta = event["choices"][0].get("delta", {}).get("content")
+                except (KeyError, IndexError, TypeError, AttributeError):
+                    raise ValueError(f"Unexpected Groq stream event: {event}")
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        record_llm(prompt, "".join(parts), started)
+
+        if cache_key is not None:
+            self.response_cache.set(cache_key, "".join(parts))
+
+    def _stream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[GenerationChunk]:
+        # Backs LangChain's llm.stream(prompt)
+        for text in self.stream_text(prompt, stop):
+            chunk = GenerationChunk(text=text)
+            if run_manager:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    # -- async path (httpx), used by bot/async_agent.py via ainvoke/astream --
+    async def _acall(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                     **kwargs: Any) -> str:
+        started = time.perf_counter()
+        cache_key, cached = await self._acache_lookup(prompt, stop)
+        if cached is not None:
+            record_llm(prompt, cached, started, cached=True)
+            return cached
+
+        transport = self.transport or default_transport()
+        with span("llm"):
+            data = await transport.apost_json(self.api_url, self._headers(), self._payload(prompt, stop), self.timeout)
+        try:
+            text = data["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise ValueError(f"Unexpected Groq response format: {data}")
+        usage_stats.record(self.model, data.get("usage"), prompt)
+        record_llm(prompt, text, started)
+
+        if cache_key is not None:
+            await self._acache_store(cache_key, text)
+        return text
+
+    async def _astream(self, prompt: str, stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[GenerationChunk]:
+        started = time.perf_counter()
+        cache_key, cached = await self._acache_lookup(prompt, stop)
+        if cached is not None:
+            record_llm(prompt, cached, started, cached=True)
+            yield GenerationChunk(text=cached)
+            return
+
+        transport = self.transport or default_transport()
+        payload = {**self._payload(prompt, stop), "stream": True}
+        parts = []
+        with span("llm"):
+            async for event in transport.apost_stream(self.api_url, self._headers(), payload, self.timeout):
+                usage_stats.record(self.model, _stream_usage(event), prompt)
+                if isinstance(event, dict) and event.get("choices") == []:
+                    continue  # usage-only final chunk
+                try:
+                    delta = event["choices"][0].get("delta", {}).get("content")
+                except (KeyError, IndexError, TypeError, AttributeError):
+                    raise ValueError(f"Unexpected Groq stream event: {event}")
+                if not delta:
+                    continue
+                parts.append(delta)
+                chunk = GenerationChunk(text=delta)
+                if run_manager:
+                    await run_manager.on_llm_new_token(delta, chunk=chunk)
+                yield chunk
+        record_llm(prompt, "".join(parts), started)
+
+        if cache_key is not None:
+            await self._acache_store(cache_key, "".join(parts))
 
     def _generate(self, prompts: List[str], stop: Optional[List[str]] = None, **kwargs: Any) -> LLMResult:
-        generations = []
-        for prompt in prompts:
-            text = self._call(prompt, stop)
-            generations.append([Generation(text=text)])
+        """
+        Runs up to `batch_concurrency` prompts at once, keeping results in input
+        order. In a batch of several prompts a failing one yields an empty
+        generation with the error in generation_info instead of failing the
+        whole batch; a single prompt (invoke) raises as usual.
+        """
+        if len(prompts) <= 1:
+            return LLMResult(generations=[[Generation(text=self._call(prompt, stop))] for prompt in prompts])
+
+        def run(prompt: str) -> List[Generation]:
+            try:
+                return [Generation(text=self._call(prompt, stop))]
+            except Exception as e:
+                return [Generation(text="", generation_info={"error": f"{type(e).__name__}: {e}"})]
+
+        if self.batch_concurrency <= 1:
+            return LLMResult(generations=[run(prompt) for prompt in prompts])
+
+        workers = min(self.batch_concurrency, len(prompts))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="groq-batch") as pool:
+            generations = list(pool.map(run, prompts))
         return LLMResult(generations=generations)
 
+    async def _agenerate(self, prompts: List[str], stop: Optional[List[str]] = None, **kwargs: Any) -> LLMResult:
+        if len(prompts) <= 1:
+            return LLMResult(generations=[[Generation(text=await self._acall(prompt, stop))] for prompt in prompts])
+        semaphore = asyncio.Semaphore(max(self.batch_concurrency, 1))
+
+        async def run(prompt: str) -> List[Generation]:
+            async with semaphore:
+                try:
+                    return [Generation(text=await self._acall(prompt, stop))]
+                except Exception as e:
+                    return [Generation(text="", generation_info={"error": f"{type(e).__name__}: {e}"})]
+
+        generations = await asyncio.gather(*(run(prompt) for prompt in prompts))
+        return LLMResult(generations=list(generations))
+
     @property
     def _llm_type(self) -> str:
         return "groq"
@@ -74,3 +252,11 @@ class GroqLLM(LLM, BaseModel):
             "temperature": self.temperature,
             "max_tokens": self.max_tokens,
         }
+
+
+def _stream_usage(event: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    # Groq reports usage once, on the final chunk, under "x_groq" (or "usage"
+    # for OpenAI-compatible servers).
+    if not isinstance(event, dict):
+        return None
+    return event.get("usage") or (event.get("x_groq") or {}).get("usage")
@@ -0,0 +1,155 @@
+"""
+Response cache for GroqLLM
+--------------------------
+A bounded in-memory LRU in front of a sqlite file that every gunicorn worker on
+the host can share. Entries expire after `ttl` seconds; the sqlite table is
+trimmed to `max_disk_entries` rows, oldest first.
+
+Enable it by setting LLM_CACHE_PATH (see bot/agent.py). Only responses for
+identical prompts *and* identical model parameters are reused, so it is most
+effective at temperature 0.0.
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: Optional[str],
+        ttl: float = 24 * 3600,
+        max_memory_entries: int = 1024,
+        max_disk_entries: int = 50_000,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._writes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.path:
+            try:
+                self._connection().execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+                )
+                self._connection().execute("CREATE INDEX IF NOT EXISTS llm_cache_created ON llm_cache (created)")
+            except sqlite3.Error:
+                logger.exception("LLM cache disabled on-disk store at %s", self.path)
+                self.path = None
+
+    @staticmethod
+    def make_key(prompt: str, stop: Optional[List[str]], params: Dict[str, Any]) -> str:
+        raw = json.dumps({"prompt": prompt, "stop": stop or [], "params": params}, sort_keys=True)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if now - created < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        row = None
+        if self.path:
+            try:
+                row = self._connection().execute(
+                    "SELECT value, created FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error:
+                logger.warning("LLM cache read failed", exc_info=True)
+
+        if row is not None and now - row[1] < self.ttl:
+            self._remember(key, row[0], row[1])
+            with self._lock:
+                self.disk_hits += 1
+            return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: str) -> None:
+        created = time.time()
+        self._remember(key, value, created)
+        if not self.path:
+            return
+
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created) VALUES (?, ?, ?)",
+                (key, value, created),
+            )
+            with self._lock:
+                self._writes += 1
+                trim = self._writes % 100 == 0
+            if trim:
+                self._trim(conn, created)
+        except sqlite3.Error:
+            logger.warning("LLM cache write failed", exc_info=True)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            self._connection().execute("DELETE FROM llm_cache")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        with self._lock:
+            self._memory[key] = (value, created)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _trim(self, conn: sqlite3.Connection, now: float) -> None:
+        conn.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+        conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            " SELECT key FROM llm_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite connections are not shareable across threads; keep one per thread.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,115 @@
+"""
+manage.py bench_advisor [--courses N] [--clients N] [--requests N]
+                        [--latency S] [--token-rate T] [--target advisor|send_message|both]
+                        [--output results.json] [--compare previous.json]
+
+Offline latency/throughput benchmark of the advisor (see bot/benchmark.py).
+Groq is replaced by a local stub and Neo4j by a synthetic catalog, and the
+cache is a private local-memory one, so nothing outside the process is
+touched. Prints p50/p95/p99 per intent and requests per second.
+"""
+
+import json
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from bot import agent
+from bot.benchmark import (
+    QUESTIONS, StubGroqServer, bench_advisor_response, bench_send_message, compare,
+    install_catalog, questions_for, synthetic_catalog,
+)
+
+BENCH_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "bench"}}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+class Command(BaseCommand):
+    help = "Measure advisor latency per intent and throughput against a stub LLM and a synthetic catalog."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--courses", type=int, default=1000, help="Synthetic catalog size (default 1000)")
+        parser.add_argument("--clients", type=int, default=8, help="Concurrent clients (default 8)")
+        parser.add_argument("--requests", type=int, default=400, help="Questions per target (default 400)")
+        parser.add_argument("--latency", type=float, default=0.2, help="Stub LLM latency in seconds (default 0.2)")
+        parser.add_argument("--token-rate", type=float, default=500.0,
+                            help="Stub LLM tokens per second (default 500)")
+        parser.add_argument("--intents", default="", help="Comma-separated intents to ask (default: all)")
+        parser.add_argument("--target", choices=["advisor", "send_message", "both"], default="both")
+        parser.add_argument("--seed", type=int, default=7)
+        parser.add_argument("--output", help="Write the results as JSON to this file")
+        parser.add_argument("--compare", help="Print the change against a previously saved results file")
+
+    def handle(self, *args, **options):
+        intents = [i.strip() for i in options["intents"].split(",") if i.strip()] or list(QUESTIONS)
+        unknown = [i for i in intents if i not in QUESTIONS]
+        if unknown:
+            raise CommandError(f"Unknown intents {', '.join(unknown)}; choose from {', '.join(QUESTIONS)}")
+        if options["courses"] < 20 or options["clients"] < 1 or options["requests"] < 1:
+            raise CommandError("--courses must be at least 20, --clients and --requests at least 1")
+        previous = None
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                previous = json.load(f)
+
+        targets = ["advisor", "send_message"] if options["target"] == "both" else [options["target"]]
+        results = {}
+        with override_settings(CACHES=BENCH_CACHES, SESSION_ENGINE="django.contrib.sessions.backends.cache",
+                               ALLOWED_HOSTS=["testserver", "localhost"]):
+            started = time.perf_counter()
+            snapshot = install_catalog(*synthetic_catalog(options["courses"], options["seed"]))
+            self.stdout.write(
+                f"Synthetic catalog: {len(snapshot)} courses, {len(snapshot.group_types)} groups "
+                f"({time.perf_counter() - started:.2f}s)"
+            )
+            pairs = questions_for(snapshot, options["requests"], options["seed"], intents)
+
+            with StubGroqServer(options["latency"], options["token_rate"]) as stub:
+                api_url, response_cache = agent.llm.api_url, agent.llm.response_cache
+                agent.llm.api_url, agent.llm.response_cache = stub.url, None
+                try:
+                    for target in targets:
+                        run = bench_advisor_response if target == "advisor" else bench_send_message
+                        results[target] = run(pairs, options["clients"])
+                        self.report(target, results[target])
+                finally:
+                    agent.llm.api_url, agent.llm.response_cache = api_url, response_cache
+                self.stdout.write(f"Stub LLM served {stub.requests} requests")
+
+        saved = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "params": {key: options[key] for key in
+                       ("courses", "clients", "requests", "latency", "token_rate", "seed")} | {"intents": intents},
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(saved, f, indent=2)
+            self.stdout.write(f"Saved results to {options['output']}")
+        if previous is not None:
+            if previous.get("params") != saved["params"]:
+                self.stderr.write("Note: the compared run used different parameters.")
+            for line in compare(previous, saved):
+                self.stdout.write(line)
+
+    def report(self, target: str, result: dict):
+        self.stdout.write(self.style.SUCCESS(
+            f"{target}: {result['requests']} requests in {result['elapsed_s']}s, "
+            f"{result['rps']} req/s, {result['errors']} errors"
+        ))
+        rows = [("overall", result["overall"])] + list(result["intents"].items())
+        for name, stats in rows:
+            self.stdout.write(
+                f"  {name:<18} n={stats['count']:<5} p50 {stats['p50_ms']:>8.1f} ms"
+                f"  p95 {stats['p95_ms']:>8.1f} ms  p99 {stats['p99_ms']:>8.1f} ms"
+            )
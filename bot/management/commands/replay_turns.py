@@ -0,0 +1,120 @@
+"""
+manage.py replay_turns LOG [LOG ...] [--backend recorded|live] [--session ID] [--limit N]
+                       [--output results.json] [--show N]
+
+Re-runs the sessions captured by bot/recorder.py (TURN_LOG_PATH) through
+advisor_response, one session at a time and in recorded order, and reports
+how many answers and intents still match and how latency moved.
+
+--backend recorded (default) answers every graph lookup and LLM call from
+the recording, so only this version's code runs; differences come from code
+changes alone. Catalog-derived data that is not looked up through the graph
+helpers (planner, eligibility, retrieval) comes from the current catalog.
+--backend live calls the configured Neo4j and Groq instead, bypassing the LLM
+response cache.
+"""
+
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bot import agent, recorder
+from bot.benchmark import summarize
+from bot.conversation import ConversationState
+
+
+class Command(BaseCommand):
+    help = "Replay recorded advisor sessions and compare answers and latency with the recording."
+
+    def add_arguments(self, parser):
+        parser.add_argument("logs", nargs="+", help="Turn log files (rotated files included)")
+        parser.add_argument("--backend", choices=["recorded", "live"], default="recorded")
+        parser.add_argument("--session", help="Only replay this session id")
+        parser.add_argument("--limit", type=int, default=0, help="Replay at most N sessions")
+        parser.add_argument("--output", help="Write per-turn results as JSON to this file")
+        parser.add_argument("--show", type=int, default=5, help="Print the first N changed answers (default 5)")
+
+    def handle(self, *args, **options):
+        try:
+            grouped = recorder.sessions(recorder.read_turns(options["logs"]))
+        except OSError as e:
+            raise CommandError(str(e))
+        if options["session"]:
+            grouped = {k: v for k, v in grouped.items() if k == options["session"]}
+        if options["limit"]:
+            grouped = dict(list(grouped.items())[:options["limit"]])
+        if not grouped:
+            raise CommandError("No recorded turns to replay.")
+
+        recorded_mode = options["backend"] == "recorded"
+        log_path, response_cache = recorder.TURN_LOG_PATH, agent.llm.response_cache
+        recorder.TURN_LOG_PATH = None  # do not record the replay itself
+        rows = []
+        try:
+            for session, turns in grouped.items():
+                state = ConversationState()
+                state.session_id = session
+                for turn in turns:
+                    rows.append(self.replay(turn, state, recorded_mode))
+        finally:
+            recorder.TURN_LOG_PATH, agent.llm.response_cache = log_path, response_cache
+
+        self.report(rows, options["show"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump({"backend": options["backend"], "turns": rows}, f, indent=2, default=str)
+            self.stdout.write(f"Saved results to {options['output']}")
+
+    def replay(self, turn: dict, state: ConversationState, recorded_mode: bool) -> dict:
+        state.student_id = turn.get("student_id")
+        backend = recorder.RecordedBackend(turn) if recorded_mode else None
+        agent.llm.response_cache = backend
+        token = recorder.replay_source.set(backend)
+        error = None
+        started = time.perf_counter()
+        try:
+            with recorder.collect() as replayed:
+                result = agent.advisor_response(turn["question"], state)
+        except Exception as e:
+            result, error = None, f"{type(e).__name__}: {e}"
+        finally:
+            recorder.replay_source.reset(token)
+        seconds = time.perf_counter() - started
+
+        before = turn.get("result") or {}
+        after = result or {}
+        return {
+            "id": turn.get("id"),
+            "session": turn.get("session"),
+            "question": turn["question"],
+            "intent": (turn.get("plan") or {}).get("intent"),
+            "replayed_intent": (replayed.get("plan") or {}).get("intent"),
+            "same_answer": before.get("content") == after.get("content"),
+            "recorded": before.get("content"),
+            "replayed": after.get("content"),
+            "recorded_seconds": turn.get("seconds"),
+            "replayed_seconds": round(seconds, 6),
+            "misses": backend.misses if backend is not None else None,
+            "error": error,
+        }
+
+    def report(self, rows: list, show: int):
+        same = sum(1 for r in rows if r["same_answer"])
+        intent_changes = sum(1 for r in rows if r["intent"] != r["replayed_intent"])
+        misses = sum(r["misses"] or 0 for r in rows)
+        errors = sum(1 for r in rows if r["error"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Replayed {len(rows)} turns: {same} identical answers, {intent_changes} intent changes, "
+            f"{misses} unrecorded backend calls, {errors} errors"
+        ))
+        for label, key in (("recorded", "recorded_seconds"), ("replayed", "replayed_seconds")):
+            stats = summarize([r[key] for r in rows if r[key] is not None])
+            self.stdout.write(f"  {label:<9} p50 {stats['p50_ms']:>8.1f} ms  p95 {stats['p95_ms']:>8.1f} ms"
+                              f"  p99 {stats['p99_ms']:>8.1f} ms")
+        for r in [r for r in rows if not r["same_answer"]][:show]:
+            self.stdout.write(f"\n[{r['session']}] {r['question']}")
+            if r["intent"] != r["replayed_intent"]:
+                self.stdout.write(f"  intent: {r['intent']} -> {r['replayed_intent']}")
+            self.stdout.write(f"  recorded: {str(r['recorded'])[:200]}")
+            self.stdout.write(f"  replayed: {r['error'] or str(r['replayed'])[:200]}")
@@ -0,0 +1,312 @@
+"""
+Degree planner
+--------------
+Deterministic term-by-term schedule over the prerequisite graph, so the
+advising answer narrates a plan instead of asking the LLM to reason about
+dependencies.
+
+Given the courses a student has done (from the question and their Enrollment
+rows) and the courses they want to reach, the planner
+
+  1. selects what has to be taken: every member of a required AND group, and
+     for OR / "N of" groups the cheapest options (already done or planned
+     first, then fewest unavoidable prerequisites per the closure);
+     recommended groups are ignored;
+  2. schedules the selection greedily term by term under a credit limit,
+     placing courses on the longest remaining prerequisite chain first.
+
+Both steps are linear in the selected courses and their groups (plus a heap),
+so thousands of courses plan in milliseconds.
+"""
+
+import heapq
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from courses.catalog import CatalogSnapshot
+
+from .models import Enrollment
+from .resolver import CourseResolver
+
+TERM_CREDITS = int(os.getenv("PLAN_TERM_CREDITS", 15))
+MAX_TERMS = int(os.getenv("PLAN_MAX_TERMS", 16))
+DEFAULT_COURSE_CREDITS = 3
+# Enrollment grades that do not count as completing a course (no grade = in progress, counted).
+FAILING_GRADES = {"F", "W", "WF", "I", "NC", "U"}
+
+# Walked left to right with the resolved course mentions: a "done" keyword marks
+# the courses after it as completed until a "target" keyword or the end of the sentence.
+# Done keywords are past forms only: "complete" and "finish" name goals.
+KEYWORD_PATTERN = re.compile(
+    r"(?P<done>\b(?:took|taken|completed|finished|passed|done with|had|have|I've|already)\b)"
+    r"|(?P<target>\b(?:take|taking|reach|get to|get into|plan|want|need|finish|for|toward|towards|graduate)\b)"
+    r"|(?P<stop>[.;!?])",
+    re.IGNORECASE,
+)
+CREDITS_PATTERN = re.compile(r"\b(\d{1,2})\s*(?:credits?|credit hours|units)\b", re.IGNORECASE)
+QUOTA_PATTERN = re.compile(r"^\s*(\d+)\s*of\b", re.IGNORECASE)
+
+
+# ============================================================
+# STUDENT HISTORY
+# ============================================================
+def _counts(grade: Optional[str]) -> bool:
+    return (grade or "").strip().upper() not in FAILING_GRADES
+
+
+def _enrollments(student_ids: Iterable[str]):
+    return Enrollment.objects.filter(student__student_id__in=list(student_ids)).values_list(
+        "student__student_id", "course_code", "grade")
+
+
+def completed_by_student(student_ids: Iterable[str]) -> Dict[str, Set[str]]:
+    """
+    {student_id: codes passed or in progress} for many students in one query.
+    """
+    student_ids = list(student_ids)
+    completed: Dict[str, Set[str]] = {student_id: set() for student_id in student_ids}
+    for student_id, code, grade in _enrollments(student_ids):
+        if _counts(grade):
+            completed[student_id].add(code)
+    return completed
+
+
+def completed_courses(student_id: str) -> Set[str]:
+    """
+    Codes the student has passed or is currently taking.
+    """
+    return completed_by_student([student_id])[student_id]
+
+
+async def acompleted_courses(student_id: str) -> Set[str]:
+    return {code async for _, code, grade in _enrollments([student_id]) if _counts(grade)}
+
+
+# ============================================================
+# QUESTION PARSING
+# ============================================================
+def parse_planning_question(snapshot: CatalogSnapshot, question: str,
+                            resolver: Optional[CourseResolver] = None) -> Dict[str, Any]:
+    """
+    Splits the catalog courses mentioned in a question into completed ones
+    ("I've taken CS 110 and CS 115") and targets, and picks up a per-term
+    credit limit ("12 credits a term").
+    """
+    resolver = resolver or CourseResolver(snapshot)
+    events = [(m.start(), m.lastgroup, None) for m in KEYWORD_PATTERN.finditer(question)]
+    events += [(start, "course", code) for start, _, code in resolver.mentions(question)]
+
+    completed, targets = [], []
+    bucket = targets
+    for _, kind, code in sorted(events):
+        if kind == "done":
+            bucket = completed
+        elif kind != "course":
+            bucket = targets
+        elif code in snapshot and code not in bucket:
+            bucket.append(snapshot.codes[snapshot.lookup(code)])
+    match = CREDITS_PATTERN.search(question)
+    return {
+        "completed": completed,
+        "targets": [code for code in targets if code not in completed],
+        "credit_limit": int(match.group(1)) if match else None,
+    }
+
+
+# ============================================================
+# SELECTION
+# ============================================================
+def group_quota(group_type: str, size: int) -> int:
+    """
+    How many members of a group must be taken: all for AND, N for "N of", else one.
+    """
+    if group_type.upper() == "AND":
+        return size
+    match = QUOTA_PATTERN.match(group_type)
+    return min(int(match.group(1)), size) if match else min(1, size)
+
+
+def select_courses(snapshot: CatalogSnapshot, done: Set[int], targets: Iterable[int], closure=None):
+    """
+    (selected, chosen): the courses to take and, per selected course, the
+    prerequisites chosen to satisfy its required groups.
+    """
+    done_bits = 0
+    for c in done:
+        done_bits |= 1 << c
+
+    def cost(m: int) -> int:
+        return (closure.must[m] & ~done_bits).bit_count() if closure is not None else 0
+
+    selected: Set[int] = set()
+    chosen: Dict[int, List[int]] = {}
+    stack = [c for c in targets if c not in done]
+    selected.update(stack)
+    while stack:
+        c = stack.pop()
+        if c in chosen:
+            continue
+        picks: List[int] = []
+        for g in snapshot.groups_of(c):
+            if snapshot.group_recommended[g]:
+                continue
+            members = list(snapshot.members_of(g))
+            quota = group_quota(snapshot.group_types[g], len(members))
+            ranked = sorted(members, key=lambda m: (m not in done, m not in selected, cost(m), snapshot.codes[m]))
+            for m in ranked[:quota]:
+                if m in done:
+                    continue
+                if m not in picks:
+                    picks.append(m)
+                if m not in selected:
+                    selected.add(m)
+                    stack.append(m)
+        chosen[c] = picks
+    return selected, chosen
+
+
+# ============================================================
+# SCHEDULING
+# ============================================================
+def course_credits(snapshot: CatalogSnapshot, c: int) -> int:
+    try:
+        return int(snapshot.credits[c])
+    except (TypeError, ValueError):
+        return DEFAULT_COURSE_CREDITS
+
+
+def schedule(snapshot: CatalogSnapshot, selected: Set[int], chosen: Dict[int, List[int]],
+             credit_limit: int = TERM_CREDITS, term_limits: Optional[Sequence[int]] = None,
+             max_terms: int = MAX_TERMS) -> List[List[int]]:
+    """
+    Greedy list scheduling: each term takes the ready courses with the longest
+    chain of selected courses depending on them, until the credit limit is hit.
+    A course worth more than the limit gets a term of its own.
+    """
+    dependents: Dict[int, List[int]] = {c: [] for c in selected}
+    waiting = {c: 0 for c in selected}
+    for c in selected:
+        for p in chosen.get(c, []):
+            if p in selected:
+                dependents[p].append(c)
+                waiting[c] += 1
+
+    # Longest chain of dependents, computed in reverse topological order.
+    order = [c for c in selected if waiting[c] == 0]
+    remaining = dict(waiting)
+    for c in order:
+        for s in dependents[c]:
+            remaining[s] -= 1
+            if remaining[s] == 0:
+                order.append(s)
+    height = {c: 0 for c in selected}
+    for c in reversed(order):
+        height[c] = max((height[s] + 1 for s in dependents[c]), default=0)
+
+    def entry(c: int):
+        return (-height[c], snapshot.levels[c] or 0, snapshot.codes[c], c)
+
+    ready = [entry(c) for c in selected if waiting[c] == 0]
+    heapq.heapify(ready)
+    terms: List[List[int]] = []
+    while ready and len(terms) < max_terms:
+        limit = term_limits[len(terms)] if term_limits and len(terms) < len(term_limits) else credit_limit
+        term, credits, deferred = [], 0, []
+        while ready and credits < limit:
+            item = heapq.heappop(ready)
+            c = item[-1]
+            cr = course_credits(snapshot, c)
+            if term and credits + cr > limit:
+                deferred.append(item)
+                continue
+            term.append(c)
+            credits += cr
+        for item in deferred:
+            heapq.heappush(ready, item)
+        for c in term:
+            for s in dependents[c]:
+                waiting[s] -= 1
+                if waiting[s] == 0:
+                    heapq.heappush(ready, entry(s))
+        terms.append(term)
+    return terms
+
+
+# ============================================================
+# ENTRYPOINT
+# ============================================================
+def plan_degree(snapshot: CatalogSnapshot, completed: Iterable[str], targets: Iterable[str],
+                credit_limit: Optional[int] = None, term_limits: Optional[Sequence[int]] = None,
+                closure=None, max_terms: int = MAX_TERMS) -> Dict[str, Any]:
+    """
+    Term-by-term plan to reach `targets` from `completed`:
+
+      {"targets", "completed", "unknown", "credit_limit",
+       "terms": [{"term": 1, "courses": [{"code", "title", "credits"}], "credits"}],
+       "unscheduled": [codes left over: prerequisite cycles or beyond max_terms]}
+    """
+    credit_limit = credit_limit or TERM_CREDITS
+    if closure is not None and closure.snapshot is not snapshot:
+        closure = None
+    done = {c for c in map(snapshot.lookup, completed) if c is not None}
+    target_ids, unknown = [], []
+    for code in targets:
+        c = snapshot.lookup(code)
+        if c is None:
+            unknown.append(code)
+        elif c not in target_ids:
+            target_ids.append(c)
+
+    selected, chosen = select_courses(snapshot, done, target_ids, closure)
+    terms = schedule(snapshot, selected, chosen, credit_limit, term_limits, max_terms)
+    scheduled = {c for term in terms for c in term}
+
+    return {
+        "targets": [snapshot.codes[c] for c in target_ids],
+        "completed": sorted(snapshot.codes[c] for c in done),
+        "unknown": unknown,
+        "credit_limit": credit_limit,
+        "terms": [
+            {
+                "term": i,
+                "courses": [
+                    {"code": snapshot.codes[c], "title": snapshot.titles[c], "credits": course_credits(snapshot, c)}
+                    for c in term
+                ],
+                "credits": sum(course_credits(snapshot, c) for c in term),
+            }
+            for i, term in enumerate(terms, start=1)
+        ],
+        "unscheduled": sorted(snapshot.codes[c] for c in selected - scheduled),
+    }
+
+
+def plan_for_question(snapshot: CatalogSnapshot, question: str, completed: Iterable[str] = (),
+                      closure=None, resolver: Optional[CourseResolver] = None) -> Optional[Dict[str, Any]]:
+    """
+    A plan for the targets named in the question, or None if it names none.
+    """
+    parsed = parse_planning_question(snapshot, question, resolver)
+    if not parsed["targets"]:
+        return None
+    return plan_degree(snapshot, set(completed) | set(parsed["completed"]), parsed["targets"],
+                       parsed["credit_limit"], closure=closure)
+
+
+def format_plan(plan: Dict[str, Any]) -> List[str]:
+    """
+    One line per term plus notes; used as the prompt context and the fallback answer.
+    """
+    lines = [
+        f"Term {term['term']} ({term['credits']} credits): "
+        + ", ".join(f"{c['code']} {c['title']}".strip() for c in term["courses"])
+        for term in plan["terms"]
+    ]
+    if not plan["terms"] and not plan["unscheduled"]:
+        lines.append(f"All prerequisites for {', '.join(plan['targets'])} are already complete.")
+    if plan["unscheduled"]:
+        lines.append(f"Could not schedule: {', '.join(plan['unscheduled'])}.")
+    if plan["unknown"]:
+        lines.append(f"Not in the catalog: {', '.join(plan['unknown'])}.")
+    return lines
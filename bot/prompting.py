@@ -0,0 +1,219 @@
+"""
+Prompt token budgets
+--------------------
+Every prompt the advisor sends is built through `build_prompt`, which
+estimates the tokens of each section, and trims the one elastic section
+(usually the catalog context) until the whole prompt fits the intent's budget.
+Catalog rows are sent as a compact pipe-separated table instead of prose lines.
+
+Estimates are a cheap characters-per-token heuristic; GroqLLM reports the real
+`usage` of every call to `usage_stats`, so the two can be compared with
+`prompt_stats()` / `usage_stats.snapshot()`.
+
+Budgets can be overridden per intent with PROMPT_BUDGET_<INTENT> env vars,
+e.g. PROMPT_BUDGET_ADVISING=1500.
+"""
+
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Union
+
+from CourseCompass.metrics import LLM_TOKENS
+
+logger = logging.getLogger(__name__)
+
+# Llama-family tokenizers average a little under four characters per token on
+# English text; code-heavy text such as "CS 210|3|100" is denser.
+CHARS_PER_TOKEN = 3.6
+
+DEFAULT_BUDGETS = {
+    "planner": 1000,
+    "smalltalk": 150,
+    "general": 700,
+    "advising": 1100,
+    "degree_plan": 700,
+    "course_info": 550,
+    "next_course_query": 450,
+    "prereq_summary": 150,
+}
+# Longest student question kept in any prompt.
+QUESTION_MAX_TOKENS = int(os.getenv("PROMPT_QUESTION_MAX_TOKENS", 200))
+# Most conversation history kept in a prompt; the oldest lines go first.
+HISTORY_MAX_TOKENS = int(os.getenv("PROMPT_HISTORY_MAX_TOKENS", 150))
+
+
+def budget_for(intent: str) -> int:
+    default = DEFAULT_BUDGETS.get(intent, DEFAULT_BUDGETS["general"])
+    return int(os.getenv(f"PROMPT_BUDGET_{intent.upper()}", default))
+
+
+def estimate_tokens(text: str) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def clip_text(text: str, max_tokens: int) -> str:
+    """
+    Cuts text to roughly `max_tokens`, at a word boundary when possible.
+    """
+    max_chars = int(max_tokens * CHARS_PER_TOKEN)
+    if len(text) <= max_chars:
+        return text
+    clipped = text[:max_chars]
+    if " " in clipped[max_chars // 2:]:
+        clipped = clipped[:clipped.rindex(" ")]
+    return clipped.rstrip() + "…"
+
+
+# ============================================================
+# COMPACT CATALOG ENCODING
+# ============================================================
+CATALOG_HEADER = "code|title|level|credits|prereqs"
+
+
+def encode_catalog(rows: Sequence[Dict]) -> List[str]:
+    """
+    Catalog rows (the shape of GRAPH_CONTEXT_QUERY) as a header line plus one
+    pipe-separated line per course. About 40% fewer tokens than the prose form
+    "CS 210 — Data Structures | Level 200 | 3 credits | Prereqs: CS 115".
+    """
+    if not rows:
+        return []
+    lines = [CATALOG_HEADER]
+    for r in rows:
+        prereqs = ",".join(r.get("prereqs") or []) or "-"
+        lines.append(f"{r['code']}|{r.get('title') or ''}|{_blank(r.get('level'))}|{_blank(r.get('credits'))}|{prereqs}")
+    return lines
+
+
+def _blank(value) -> str:
+    return "" if value is None else str(value)
+
+
+# ============================================================
+# PROMPT BUILDING
+# ============================================================
+_stats_lock = threading.Lock()
+PROMPT_STATS: Dict[str, Dict[str, int]] = {}
+
+
+def build_prompt(intent: str, template: str, elastic: Optional[str] = None,
+                 min_lines: int = 1, **sections: Union[str, Sequence[str]]) -> str:
+    """
+    Formats `template` with `sections`. The section named `elastic` may be a list
+    of lines: trailing lines are dropped (keeping at least `min_lines`) and then
+    the last line is clipped until the prompt fits the intent's token budget.
+    Other sections are used as given, except that "question" is clipped to
+    QUESTION_MAX_TOKENS and "history" keeps its latest lines within
+    HISTORY_MAX_TOKENS.
+    """
+    budget = budget_for(intent)
+    values = {name: value for name, value in sections.items() if name != elastic}
+    if "question" in values:
+        values["question"] = clip_text(values["question"], QUESTION_MAX_TOKENS)
+    if values.get("history"):
+        lines = values["history"].splitlines()
+        while len(lines) > 1 and estimate_tokens("\n".join(lines)) > HISTORY_MAX_TOKENS:
+            lines.pop(0)
+        values["history"] = clip_text("\n".join(lines), HISTORY_MAX_TOKENS)
+
+    dropped = 0
+    if elastic is None:
+        fixed_tokens = estimate_tokens(template.format(**values))
+    else:
+        value = sections.get(elastic)
+        lines = [value] if isinstance(value, str) else list(value or [])
+        fixed_tokens = estimate_tokens(template.format(**values, **{elastic: ""}))
+        available = budget - fixed_tokens
+        while len(lines) > min_lines and estimate_tokens("\n".join(lines)) > available:
+            lines.pop()
+            dropped += 1
+        if lines and estimate_tokens("\n".join(lines)) > available:
+            head = "\n".join(lines[:-1])
+            lines[-1] = clip_text(lines[-1], max(available - estimate_tokens(head), 0))
+        values[elastic] = "\n".join(lines)
+
+    prompt = template.format(**values)
+    _record_prompt(intent, fixed_tokens, estimate_tokens(prompt), budget, dropped)
+    return prompt
+
+
+def _record_prompt(intent: str, fixed_tokens: int, total_tokens: int, budget: int, dropped: int) -> None:
+    logger.debug("Prompt %s: ~%d tokens (fixed ~%d, budget %d, %d context lines dropped)",
+                 intent, total_tokens, fixed_tokens, budget, dropped)
+    with _stats_lock:
+        stats = PROMPT_STATS.setdefault(intent, {"prompts": 0, "estimated_tokens": 0, "over_budget": 0, "lines_dropped": 0})
+        stats["prompts"] += 1
+        stats["estimated_tokens"] += total_tokens
+        stats["lines_dropped"] += dropped
+        if total_tokens > budget:
+            stats["over_budget"] += 1
+
+
+def prompt_stats() -> Dict[str, Dict[str, float]]:
+    """
+    Per-intent prompt counts, mean estimated input tokens and how often context
+    had to be trimmed or the fixed part alone exceeded the budget.
+    """
+    with _stats_lock:
+        snapshot = {intent: dict(stats) for intent, stats in PROMPT_STATS.items()}
+    for intent, stats in snapshot.items():
+        stats["budget"] = budget_for(intent)
+        stats["mean_estimated_tokens"] = stats["estimated_tokens"] / stats["prompts"]
+    return snapshot
+
+
+# ============================================================
+# ACTUAL USAGE
+# ============================================================
+class UsageStats:
+    """
+    Running totals of the `usage` block Groq returns, next to our estimate of
+    the prompt tokens, so the heuristic and the budgets can be checked.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_prompt_tokens = 0
+        self.total_time = 0.0
+
+    def record(self, model: str, usage: Optional[Dict], prompt: str) -> None:
+        if not usage:
+            return
+        estimated = estimate_tokens(prompt)
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+        total_time = usage.get("total_time") or 0.0
+        logger.info("Groq usage model=%s prompt_tokens=%d (estimated %d) completion_tokens=%d total_time=%.3fs",
+                    model, prompt_tokens, estimated, completion_tokens, total_time)
+        LLM_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+        LLM_TOKENS.inc(model, "completion", amount=completion_tokens)
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.estimated_prompt_tokens += estimated
+            self.total_time += total_time
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            calls = self.calls
+            return {
+                "calls": calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "mean_prompt_tokens": self.prompt_tokens / calls if calls else 0.0,
+                "mean_completion_tokens": self.completion_tokens / calls if calls else 0.0,
+                # > 1 means the heuristic over-estimates.
+                "estimate_ratio": self.estimated_prompt_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "total_time": self.total_time,
+            }
+
+
+usage_stats = UsageStats()
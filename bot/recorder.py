@@ -0,0 +1,368 @@
+"""
+Turn recorder
+-------------
+Appends one JSON line per advisor turn to a log, without blocking the request:
+the question, the plan, every graph lookup with its result, every LLM prompt
+and completion, the answer and the timings. `manage.py replay_turns` re-runs
+the captured sessions against the recorded or the live backends.
+
+A turn is collected in a context variable while it runs (so it follows
+sync_to_async and asyncio tasks) and handed to a background writer thread
+when it ends. If the writer falls behind, turns are dropped rather than
+queued without bound.
+
+Configuration (environment):
+  TURN_LOG_PATH       log file; unset disables recording. "{pid}" in the path
+                      is replaced by the process id, so each worker writes and
+                      rotates its own file
+  TURN_LOG_SAMPLE     fraction of sessions recorded, 0..1 (default 1). Whole
+                      sessions are kept or skipped, so replays stay coherent
+  TURN_LOG_MAX_BYTES  size at which the log is rotated (default 50 MB)
+  TURN_LOG_BACKUPS    rotated files kept as PATH.1 .. PATH.N (default 3)
+"""
+
+import atexit
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from inspect import iscoroutinefunction
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TURN_LOG_PATH = os.getenv("TURN_LOG_PATH")
+TURN_LOG_SAMPLE = float(os.getenv("TURN_LOG_SAMPLE", 1.0))
+TURN_LOG_MAX_BYTES = int(os.getenv("TURN_LOG_MAX_BYTES", 50 * 1024 * 1024))
+TURN_LOG_BACKUPS = int(os.getenv("TURN_LOG_BACKUPS", 3))
+# Turns waiting for the writer; beyond this they are dropped.
+TURN_LOG_QUEUE = 1000
+
+current_turn: contextvars.ContextVar = contextvars.ContextVar("current_turn", default=None)
+# Set by the replay tool: answers graph lookups from a recording.
+replay_source: contextvars.ContextVar = contextvars.ContextVar("replay_source", default=None)
+
+
+# ============================================================
+# WRITER
+# ============================================================
+class TurnLog:
+    """
+    Background JSONL writer with size-based rotation.
+    """
+
+    def __init__(self, path: str, max_bytes: int = TURN_LOG_MAX_BYTES, backups: int = TURN_LOG_BACKUPS,
+                 queue_size: int = TURN_LOG_QUEUE):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name="turn-log", daemon=True)
+        self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Writes what is queued and stops the writer thread.
+        """
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        f = None
+        try:
+            while True:
+                record = self._queue.get()
+                if record is None:
+                    return
+                batch = [record]
+                while True:  # drain what is already waiting before flushing
+                    try:
+                        record = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if record is None:
+                        self._queue.put(None)
+                        break
+                    batch.append(record)
+                for record in batch:
+                    try:
+                        line = json.dumps(record, default=str) + "\n"
+                        if f is None:
+                            f = open(self.path, "a", encoding="utf-8")
+                        if f.tell() and f.tell() + len(line) > self.max_bytes:
+                            f.close()
+                            self._rotate()
+                            f = open(self.path, "a", encoding="utf-8")
+                        f.write(line)
+                        self.written += 1
+                    except (OSError, TypeError, ValueError):
+                        logger.warning("Turn log write to %s failed", self.path, exc_info=True)
+                if f is not None:
+                    f.flush()
+        finally:
+            if f is not None:
+                f.close()
+
+    def _rotate(self) -> None:
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+
+_log: Optional[TurnLog] = None
+_log_lock = threading.Lock()
+_log_pid: Optional[int] = None
+
+
+def turn_log() -> Optional[TurnLog]:
+    """
+    This process's writer, started on first use (and again after a fork).
+    """
+    global _log, _log_pid
+    if not TURN_LOG_PATH:
+        return None
+    if _log is None or _log_pid != os.getpid():
+        with _log_lock:
+            if _log is None or _log_pid != os.getpid():
+                _log, _log_pid = TurnLog(TURN_LOG_PATH), os.getpid()
+                atexit.register(_log.close)
+    return _log
+
+
+def sampled(session: str, rate: float = TURN_LOG_SAMPLE) -> bool:
+    """
+    Whether a session is recorded; stable for the session's lifetime.
+    """
+    if rate >= 1:
+        return True
+    digest = hashlib.sha256(session.encode()).digest()
+    return int.from_bytes(digest[:8], "big") / 2 ** 64 < rate
+
+
+# ============================================================
+# CAPTURE
+# ============================================================
+def session_label(session_key: Optional[str]) -> str:
+    """
+    Log-safe session id: a hash, never the session cookie itself.
+    """
+    if not session_key:
+        return "local"
+    return hashlib.sha256(session_key.encode()).hexdigest()[:16]
+
+
+def start(question: str, state) -> Optional[Dict[str, Any]]:
+    """
+    Begins recording a turn if logging is on and the session is sampled.
+    """
+    log = turn_log()
+    session = getattr(state, "session_id", None) or "local"
+    if log is None or not sampled(session):
+        return None
+    record = {
+        "id": uuid.uuid4().hex,
+        "session": session,
+        "student_id": getattr(state, "student_id", None),
+        "started": time.time(),
+        "question": question,
+        "events": [],
+        "_perf": time.perf_counter(),
+    }
+    current_turn.set(record)
+    return record
+
+
+def finish(record: Optional[Dict[str, Any]], result: Any = None, error: Optional[str] = None) -> None:
+    """
+    Ends the turn and queues it for writing. Safe to call with None.
+    """
+    if record is None:
+        return
+    current_turn.set(None)
+    record["seconds"] = round(time.perf_counter() - record.pop("_perf"), 6)
+    if result is not None or "result" not in record:
+        record["result"] = result
+    if error:
+        record["error"] = error
+    turn_log().submit(record)
+
+
+@contextmanager
+def capture(question: str, state) -> Iterator[Optional[Dict[str, Any]]]:
+    record = start(question, state)
+    try:
+        yield record
+    except Exception as e:
+        finish(record, error=f"{type(e).__name__}: {e}")
+        raise
+    else:
+        finish(record)
+
+
+@contextmanager
+def collect() -> Iterator[Dict[str, Any]]:
+    """
+    Collects the events of the turns run inside the block into a dict that is
+    not written anywhere (used by replay to see what a replayed turn did).
+    """
+    record: Dict[str, Any] = {"events": []}
+    token = current_turn.set(record)
+    try:
+        yield record
+    finally:
+        current_turn.reset(token)
+
+
+def annotate(**fields: Any) -> None:
+    record = current_turn.get()
+    if record is not None:
+        record.update(fields)
+
+
+def record_event(kind: str, **data: Any) -> None:
+    record = current_turn.get()
+    if record is not None:
+        record["events"].append({"kind": kind, **data})
+
+
+def record_llm(prompt: str, completion: str, started: float, cached: bool = False) -> None:
+    record_event("llm", prompt=prompt, completion=completion,
+                 seconds=round(time.perf_counter() - started, 6), cached=cached)
+
+
+def _call_key(name: str, args: Tuple, kwargs: Dict) -> str:
+    return json.dumps([name, list(args), kwargs], default=str, sort_keys=True)
+
+
+def captured(func):
+    """
+    Records a graph lookup's arguments and result in the current turn, and
+    answers it from the recording while a replay source is set. The async
+    variants (acypher_*) share the sync names so either path replays.
+    """
+    name = func.__name__[1:] if iscoroutinefunction(func) and func.__name__.startswith("a") else func.__name__
+
+    def lookup(args, kwargs):
+        source = replay_source.get()
+        return source.graph_result(_call_key(name, args, kwargs)) if source is not None else (False, None)
+
+    def remember(args, kwargs, result, started):
+        record_event("graph", call=name, args=list(args), kwargs=kwargs, result=result,
+                     seconds=round(time.perf_counter() - started, 6))
+
+    if iscoroutinefunction(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            hit, result = lookup(args, kwargs)
+            if hit:
+                return result
+            started = time.perf_counter()
+            result = await func(*args, **kwargs)
+            remember(args, kwargs, result, started)
+            return result
+    else:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            hit, result = lookup(args, kwargs)
+            if hit:
+                return result
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            remember(args, kwargs, result, started)
+            return result
+    return wrapper
+
+
+# ============================================================
+# REPLAY
+# ============================================================
+def read_turns(paths: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Recorded turns from one or more logs (rotated files included), oldest first.
+    Lines that do not parse are skipped.
+    """
+    turns = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    turns.append(json.loads(line))
+                except ValueError:
+                    continue
+    turns.sort(key=lambda t: t.get("started", 0))
+    return turns
+
+
+def sessions(turns: Iterable[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    grouped: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for turn in turns:
+        grouped[turn.get("session") or "local"].append(turn)
+    return dict(grouped)
+
+
+class RecordedBackend:
+    """
+    Serves one recorded turn's graph results and LLM completions. Installed as
+    the replay source (graph lookups) and as GroqLLM.response_cache (LLM
+    calls), which GroqLLM consults before any network call. Repeated identical
+    calls are answered in recorded order; `misses` counts calls the recording
+    cannot answer (the answer then differs from the recording).
+    """
+
+    def __init__(self, turn: Dict[str, Any]):
+        self.graph: Dict[str, deque] = defaultdict(deque)
+        self.completions: Dict[str, deque] = defaultdict(deque)
+        self.misses = 0
+        for event in turn.get("events", []):
+            if event.get("kind") == "graph":
+                key = _call_key(event["call"], tuple(event.get("args", [])), event.get("kwargs", {}))
+                self.graph[key].append(event.get("result"))
+            elif event.get("kind") == "llm":
+                self.completions[event["prompt"]].append(event.get("completion", ""))
+
+    def graph_result(self, key: str) -> Tuple[bool, Any]:
+        results = self.graph.get(key)
+        if not results:
+            self.misses += 1
+            return False, None
+        return True, results.popleft() if len(results) > 1 else results[0]
+
+    # -- LLMCache interface ----------------------------------------------------
+    @staticmethod
+    def make_key(prompt: str, stop: Optional[List[str]], params: Dict[str, Any]) -> str:
+        return prompt
+
+    def get(self, prompt: str) -> Optional[str]:
+        completions = self.completions.get(prompt)
+        if not completions:
+            self.misses += 1
+            return ""  # never fall through to the network in recorded mode
+        return completions.popleft() if len(completions) > 1 else completions[0]
+
+    def set(self, key: str, value: str) -> None:
+        pass
@@ -0,0 +1,260 @@
+"""
+Course mention resolver
+-----------------------
+Finds every course a question mentions in one left-to-right pass over its
+words, replacing the substring scan over a fixed alias table.
+
+Built from the live catalog once per catalog version:
+
+  * a code index: "cs210", "CS 210" and "cs-210" resolve for every department
+    in the catalog;
+  * a word-level Aho-Corasick automaton over course titles (two or more words,
+    unambiguous) and the hand-written aliases below;
+  * bounded edit-distance correction of words that are not in the title
+    vocabulary ("strucures" -> "structures"), via a deletion index so each
+    word costs a few hash lookups rather than a scan of the vocabulary.
+
+Without a catalog the resolver still knows the aliases and the core
+departments, so routing keeps working when Neo4j is down.
+"""
+
+import re
+from collections import deque
+from typing import Dict, List, Optional, Set, Tuple
+
+from courses.catalog import CatalogSnapshot, VersionedArtifact, code_key, get_snapshot
+
+from .retrieval import STOPWORDS
+
+# Colloquial names that are not the catalog title.
+COURSE_ALIASES = {
+    "data structures": "CS 210",
+    "data structures and algorithms": "CS 210",
+    "intro to programming": "CS 110",
+    "introduction to programming": "CS 110",
+    "object oriented programming": "CS 115",
+    "web programming": "CS 215",
+    "web and database programming": "CS 215",
+    "applied calculus i": "MATH 103",
+    "calculus 1": "MATH 103",
+    "calculus i": "MATH 103",
+}
+# Departments recognised when the catalog is unavailable.
+DEFAULT_DEPARTMENTS = ("cs", "math", "stat", "eng", "bio", "chem")
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+CODE_TOKEN = re.compile(r"^([a-z]{2,5})(\d{3}[a-z]?)$")
+NUMBER_TOKEN = re.compile(r"^\d{3}[a-z]?$")
+# Shortest word that is spelling-corrected, and the edit distance allowed by length.
+MIN_FUZZY_LENGTH = 5
+LONG_WORD_LENGTH = 8
+
+# (start offset in the text, end offset, course code)
+Mention = Tuple[int, int, str]
+
+
+def words(text: str) -> List[Tuple[str, int, int]]:
+    """
+    Lowercased alphanumeric words with their character spans.
+    """
+    return [(m.group(), m.start(), m.end()) for m in WORD_PATTERN.finditer((text or "").lower())]
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance, or limit + 1 as soon as it must exceed `limit`.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        current = [i]
+        for j, cb in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def deletions(word: str, depth: int) -> Set[str]:
+    """
+    Every string obtained by deleting up to `depth` characters from `word`.
+    """
+    found = {word}
+    frontier = {word}
+    for _ in range(depth):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def max_distance(word: str) -> int:
+    return 2 if len(word) >= LONG_WORD_LENGTH else 1
+
+
+class PhraseAutomaton:
+    """
+    Aho-Corasick automaton over word sequences. `scan` yields
+    (first word index, last word index, value) for every phrase occurrence.
+    """
+
+    def __init__(self, phrases: Dict[Tuple[str, ...], str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[Tuple[int, str]]] = [[]]
+        for phrase, value in phrases.items():
+            node = 0
+            for word in phrase:
+                if word not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][word] = len(self.goto) - 1
+                node = self.goto[node][word]
+            self.out[node].append((len(phrase), value))
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for word, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and word not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(word, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def scan(self, tokens: List[str]):
+        node = 0
+        for i, word in enumerate(tokens):
+            while node and word not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(word, 0)
+            for length, value in self.out[node]:
+                yield i - length + 1, i, value
+
+
+class CourseResolver:
+    def __init__(self, snapshot: Optional[CatalogSnapshot] = None, aliases: Optional[Dict[str, str]] = None):
+        self.snapshot = snapshot
+        aliases = COURSE_ALIASES if aliases is None else aliases
+        if snapshot is not None:
+            self.departments = {
+                match.group(1) for match in (CODE_TOKEN.match(code_key(code).lower()) for code in snapshot.codes)
+                if match
+            }
+        else:
+            self.departments = set(DEFAULT_DEPARTMENTS)
+
+        phrases: Dict[Tuple[str, ...], str] = {}
+        ambiguous: Set[Tuple[str, ...]] = set()
+        if snapshot is not None:
+            for code, title in zip(snapshot.codes, snapshot.titles):
+                phrase = tuple(w for w, _, _ in words(title))
+                if len(phrase) < 2:
+                    continue
+                if phrases.get(phrase, code) != code:
+                    ambiguous.add(phrase)
+                phrases[phrase] = code
+        for phrase in ambiguous:
+            del phrases[phrase]
+        for alias, code in aliases.items():
+            phrases[tuple(w for w, _, _ in words(alias))] = self._format(code)
+        self.automaton = PhraseAutomaton(phrases)
+
+        self.vocabulary = {word for phrase in phrases for word in phrase}
+        self.deletion_index: Dict[str, Set[str]] = {}
+        for word in self.vocabulary:
+            if len(word) >= MIN_FUZZY_LENGTH and word.isalpha():
+                for variant in deletions(word, max_distance(word)):
+                    self.deletion_index.setdefault(variant, set()).add(word)
+
+    def _format(self, code: str) -> str:
+        """
+        The catalog's spelling of a code if it exists, else "DEPT 123".
+        """
+        if self.snapshot is not None:
+            c = self.snapshot.lookup(code)
+            if c is not None:
+                return self.snapshot.codes[c]
+        match = CODE_TOKEN.match(code_key(code).lower())
+        return f"{match.group(1).upper()} {match.group(2).upper()}" if match else code
+
+    def correct(self, word: str) -> str:
+        """
+        The closest vocabulary word within the length-based edit distance, or `word`.
+        """
+        if word in self.vocabulary or len(word) < MIN_FUZZY_LENGTH or not word.isalpha() or word in STOPWORDS:
+            return word
+        limit = max_distance(word)
+        candidates = set()
+        for variant in deletions(word, limit):
+            candidates |= self.deletion_index.get(variant, set())
+        best, best_distance = word, limit + 1
+        for candidate in sorted(candidates):
+            distance = edit_distance(word, candidate, limit)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def mentions(self, text: str) -> List[Mention]:
+        """
+        Non-overlapping course mentions in order; longer phrases win over the
+        shorter ones they contain.
+        """
+        tokens = words(text)
+        found: List[Tuple[int, int, str]] = []
+
+        i = 0
+        while i < len(tokens):
+            word = tokens[i][0]
+            match = CODE_TOKEN.match(word)
+            if match and match.group(1) in self.departments:
+                found.append((i, i, self._format(word)))
+            elif (word in self.departments and i + 1 < len(tokens)
+                  and NUMBER_TOKEN.match(tokens[i + 1][0])):
+                found.append((i, i + 1, self._format(word + tokens[i + 1][0])))
+                i += 1
+            i += 1
+
+        corrected = [self.correct(word) for word, _, _ in tokens]
+        found.extend(self.automaton.scan(corrected))
+
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        mentions: List[Mention] = []
+        end = -1
+        for first, last, code in found:
+            if first > end:
+                mentions.append((tokens[first][1], tokens[last][2], code))
+                end = last
+        return mentions
+
+    def resolve(self, text: str) -> List[str]:
+        """
+        Distinct course codes mentioned in `text`, in order of first mention.
+        """
+        return list(dict.fromkeys(code for _, _, code in self.mentions(text)))
+
+
+def build_resolver(version: str) -> CourseResolver:
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise RuntimeError("catalog snapshot unavailable")
+    return CourseResolver(snapshot)
+
+
+resolver_artifact = VersionedArtifact("resolver", build_resolver)
+fallback_resolver = CourseResolver()
+
+
+def get_resolver() -> Optional[CourseResolver]:
+    return resolver_artifact.get()
+
+
+def resolve_courses(text: str) -> List[str]:
+    """
+    Course codes mentioned in `text`, from the catalog resolver when the
+    catalog is readable and the alias/core-department fallback otherwise.
+    """
+    return (get_resolver() or fallback_resolver).resolve(text)
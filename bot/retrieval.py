@@ -0,0 +1,144 @@
+"""
+Relevance retrieval over the course catalog
+-------------------------------------------
+A small in-memory BM25 index over each course's code, title and description.
+The general and advising prompts include only the top-k courses for the
+question (plus their direct prerequisites), so the prompt size stays the same
+however large the catalog grows.
+
+The index is built from the catalog snapshot once per catalog version
+(see courses.catalog.VersionedArtifact).
+"""
+
+import re
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from courses.catalog import CatalogSnapshot, VersionedArtifact, get_snapshot
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+a about after an and any are as at be before can course courses do does for from
+have how i in is it me my of on or should take taking that the this to what
+when which with would you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric tokens without stopwords. "CS 210" also yields the
+    joined form "cs210", so codes match however the student types them.
+    """
+    tokens = [t for t in TOKEN_PATTERN.findall((text or "").lower()) if t not in STOPWORDS]
+    joined = [a + b for a, b in zip(tokens, tokens[1:]) if a.isalpha() and b.isdigit()]
+    return tokens + joined
+
+
+# ============================================================
+# BM25 INDEX
+# ============================================================
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of documents. Postings are stored per term as
+    NumPy arrays of document ids and precomputed term weights, so scoring a
+    query is a handful of vectorized adds.
+    """
+
+    def __init__(self, documents: List[List[str]], k1: float = 1.5, b: float = 0.75):
+        self.size = len(documents)
+        lengths = np.array([len(doc) for doc in documents], dtype=np.float64)
+        avg_length = lengths.mean() if self.size and lengths.sum() else 1.0
+        norm = k1 * (1 - b + b * lengths / avg_length)
+
+        postings: Dict[str, Dict[int, int]] = {}
+        for doc_id, doc in enumerate(documents):
+            for term in doc:
+                counts = postings.setdefault(term, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        self.postings: Dict[str, tuple] = {}
+        for term, counts in postings.items():
+            doc_ids = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+            tf = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+            idf = np.log(1 + (self.size - len(counts) + 0.5) / (len(counts) + 0.5))
+            weights = idf * tf * (k1 + 1) / (tf + norm[doc_ids])
+            self.postings[term] = (doc_ids, weights)
+
+    def scores(self, query_tokens: List[str]) -> np.ndarray:
+        scores = np.zeros(self.size, dtype=np.float64)
+        for term in set(query_tokens):
+            posting = self.postings.get(term)
+            if posting is not None:
+                doc_ids, weights = posting
+                scores[doc_ids] += weights
+        return scores
+
+    def top_k(self, query_tokens: List[str], k: int) -> List[int]:
+        """
+        Ids of the k best-scoring documents with a positive score, best first.
+        """
+        scores = self.scores(query_tokens)
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [int(i) for i in ranked if scores[i] > 0]
+
+
+# ============================================================
+# COURSE RETRIEVER
+# ============================================================
+class CourseRetriever:
+    """
+    BM25 over the catalog snapshot. Titles are counted twice and codes three
+    times so a direct mention outranks a passing word in a description.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        documents = [
+            tokenize(" ".join([code] * 3 + [title] * 2 + [description]))
+            for code, title, description in zip(snapshot.codes, snapshot.titles, snapshot.descriptions)
+        ]
+        self.index = BM25Index(documents)
+
+    def search(self, question: str, k: int) -> List[int]:
+        return self.index.top_k(tokenize(question), k)
+
+    def context_rows(self, question: str, k: int) -> List[Dict]:
+        """
+        Rows for the top-k courses followed by their direct prerequisites, capped
+        at 2 * k rows; the shape of GRAPH_CONTEXT_QUERY. Empty when nothing matches.
+        """
+        snapshot = self.snapshot
+        hits = self.search(question, k)
+        chosen = list(hits)
+        for c in hits:
+            for g in snapshot.groups_of(c):
+                chosen.extend(snapshot.members_of(g))
+
+        rows, seen = [], set()
+        for c in chosen:
+            if c in seen:
+                continue
+            seen.add(c)
+            rows.append(snapshot.overview_row(c))
+            if len(rows) >= 2 * k:
+                break
+        return rows
+
+
+def build_retriever(version: str) -> CourseRetriever:
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise RuntimeError("catalog snapshot unavailable")
+    return CourseRetriever(snapshot)
+
+
+retriever_artifact = VersionedArtifact("retriever", build_retriever)
+
+
+def get_retriever() -> Optional[CourseRetriever]:
+    return retriever_artifact.get()
@@ -1,7 +1,19 @@
-from django.test import TestCase
+import asyncio
+import json
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
 from neo4j import GraphDatabase
-from CourseCompass.CourseCompass.neo4j_driver import driver
-from . import agent as advisor
+from CourseCompass import metrics
+from CourseCompass.neo4j_driver import get_driver
+from . import agent as advisor, recorder
+from .benchmark import StubGroqServer, install_catalog, percentile, synthetic_catalog
+from .conversation import ConversationState, HISTORY_TURNS
+from .eligibility import EligibilityMatrix
+from .planner import format_plan, parse_planning_question, plan_degree
+from .resolver import CourseResolver, edit_distance
+from .retrieval import CourseRetriever
+from courses.catalog import CatalogSnapshot
 
 
 class Neo4jIntegrationTests(TestCase):
@@ -14,7 +26,7 @@ class Neo4jIntegrationTests(TestCase):
         """Check if Neo4j connection works."""
         print("\n🔍 Checking Neo4j connection...")
         try:
-            with driver.session() as session:
+            with get_driver().session() as session:
                 msg = session.run("RETURN 'Connected to Neo4j!' AS msg").single()["msg"]
             self.assertEqual(msg, "Connected to Neo4j!")
             print("✅ Connection successful")
@@ -25,7 +37,7 @@ class Neo4jIntegrationTests(TestCase):
         """Check graph schema — labels, relationship types, and node count."""
         print("\n🔍 Checking schema...")
         try:
-            with driver.session() as session:
+            with get_driver().session() as session:
                 labels = [r[0] for r in session.run("CALL db.labels()")]
                 rels = [r[0] for r in session.run("CALL db.relationshipTypes()")]
                 count = session.run("MATCH (n) RETURN count(n) AS cnt").single()["cnt"]
@@ -63,9 +75,745 @@ class Neo4jIntegrationTests(TestCase):
         
     def test_course_property_keys(self):
         print("\n🔍 Inspecting Course node properties...")
-        with driver.session() as session:
+        with get_driver().session() as session:
             result = session.run("MATCH (c:Course) RETURN keys(c) AS props, c LIMIT 3")
             rows = [r["props"] for r in result]
             print(rows or "No Course nodes found!")
             self.assertTrue(rows, "No Course nodes found in Neo4j.")
 
+
+class IntentRouterTests(SimpleTestCase):
+    """Fast-path intent routing; runs without Groq or Neo4j (fallback resolver)."""
+
+    def setUp(self):
+        patcher = mock.patch("bot.resolver.get_resolver", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_clear_questions_are_routed_locally(self):
+        cases = {
+            "hi": ("smalltalk", []),
+            "prereqs for CS210": ("prereq_query", ["CS 210"]),
+            "What do I need before I can take CS340?": ("all_prerequisites", ["CS 340"]),
+            "What can I take after CS110?": ("next_course_query", ["CS 110"]),
+            "Which courses require CS210?": ("next_course_query", ["CS 210"]),
+            "Tell me about CS215.": ("course_info", ["CS 215"]),
+            "Can you help me plan my degree?": ("advising", []),
+        }
+        for question, (intent, codes) in cases.items():
+            plan = advisor.route_question(question)
+            self.assertIsNotNone(plan, question)
+            self.assertEqual(plan["intent"], intent, question)
+            self.assertEqual(plan["course_codes"], codes, question)
+            self.assertGreaterEqual(plan["confidence"], advisor.ROUTER_MIN_CONFIDENCE, question)
+
+    def test_ambiguous_questions_fall_back(self):
+        self.assertIsNone(advisor.route_question("Can I take CS110 and CS115 together?"))
+        self.assertIsNone(advisor.route_question("When does the semester start?"))
+        # "next semester" is about timing, not the courses that follow CS210.
+        self.assertIsNone(advisor.route_question("Can I take CS210 next semester?"))
+
+    def test_questions_naming_several_courses_fall_back(self):
+        for question in ("Can I take CS 210 after CS 110?", "Is CS 210 required for CS 215?",
+                         "What's the difference between CS 110 and CS 115?"):
+            self.assertIsNone(advisor.route_question(question), question)
+        plan = advisor.route_question("What can I take now? I've passed CS110 and CS115")
+        self.assertEqual((plan["intent"], plan["course_codes"]), ("eligibility", ["CS 110", "CS 115"]))
+
+    def test_smalltalk_must_be_the_whole_message(self):
+        for greeting in ("hi", "Thanks!", "hello, how are you?", "thank you so much!"):
+            self.assertEqual(advisor.route_question(greeting)["intent"], "smalltalk", greeting)
+        self.assertIsNone(advisor.route_question("thanks! and what is after that?"))
+        plan = advisor.route_question("thanks! and what is after that?", last_code="CS 210")
+        self.assertEqual((plan["intent"], plan["course_codes"]), ("next_course_query", ["CS 210"]))
+
+    def test_follow_up_reuses_last_course(self):
+        plan = advisor.route_question("and what can I take after that?", last_code="CS 210")
+        self.assertEqual(plan["intent"], "next_course_query")
+        self.assertEqual(plan["course_codes"], ["CS 210"])
+        self.assertIsNone(advisor.route_question("and what can I take after that?"))
+
+
+class ConversationStateTests(SimpleTestCase):
+    def test_history_is_bounded_and_summarized(self):
+        state = ConversationState()
+        for i in range(HISTORY_TURNS + 4):
+            state.add("user", f"question {i}")
+        self.assertEqual(len(state.turns), HISTORY_TURNS)
+        self.assertEqual(state.turns[0]["content"], "question 4")
+        self.assertIn("question 0", state.summary)
+
+    def test_record_plan_is_per_state(self):
+        first, second = ConversationState(), ConversationState()
+        advisor.record_plan("prereqs for CS210", {"intent": "prereq_query", "course_codes": ["CS 210"]}, first)
+        plan = advisor.record_plan("what about its successors?", {"intent": "next_course_query", "course_codes": []}, first)
+        self.assertEqual(plan["code"], "CS 210")
+        plan = advisor.record_plan("what about its successors?", {"intent": "next_course_query", "course_codes": []}, second)
+        self.assertIsNone(plan["code"])
+
+    def test_round_trips_through_dict(self):
+        state = ConversationState(last_course_code="CS 115")
+        state.add("user", "hello")
+        restored = ConversationState.from_dict(state.to_dict())
+        self.assertEqual(list(restored.turns), list(state.turns))
+        self.assertEqual(restored.last_course_code, "CS 115")
+
+    def test_transcript_reaches_the_planner_and_general_prompts(self):
+        state = ConversationState()
+        self.assertEqual(state.transcript(), "")
+        self.assertNotIn("Conversation so far", advisor.planner_prompt("and the one after?", state.transcript()))
+
+        state.add("user", "Tell me about CS 210")
+        state.add("assistant", "CS 210 is Data Structures.")
+        history = state.transcript()
+        self.assertEqual(history, "Student: Tell me about CS 210\nAdvisor: CS 210 is Data Structures.")
+        self.assertIn(history, advisor.planner_prompt("and the one after?", history))
+        draft = advisor.draft_general("is it hard?", catalog_rows=[], history=history)
+        self.assertIn("Advisor: CS 210 is Data Structures.", draft["prompt"])
+
+    def test_prompt_history_keeps_the_latest_turns(self):
+        from .prompting import HISTORY_MAX_TOKENS, build_prompt, estimate_tokens
+
+        state = ConversationState()
+        for i in range(HISTORY_TURNS):
+            state.add("user", f"question {i} " + "x" * 190)
+        prompt = build_prompt("planner", "{history}", history=state.transcript())
+        self.assertLessEqual(estimate_tokens(prompt), HISTORY_MAX_TOKENS + 1)
+        self.assertIn(f"question {HISTORY_TURNS - 1}", prompt)
+        self.assertNotIn("question 0", prompt)
+
+
+class LLMCacheTests(SimpleTestCase):
+    def setUp(self):
+        import os
+        import tempfile
+        from .llm_cache import LLMCache
+
+        handle, self.path = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+        self.make_cache = lambda **kw: LLMCache(self.path, **kw)
+
+    def test_round_trip_through_disk(self):
+        key = self.make_cache().make_key("prompt", None, {"model": "m", "temperature": 0.0})
+        self.make_cache().set(key, "answer")
+
+        fresh = self.make_cache()
+        self.assertEqual(fresh.get(key), "answer")
+        self.assertEqual(fresh.stats()["disk_hits"], 1)
+        self.assertEqual(fresh.get(key), "answer")
+        self.assertEqual(fresh.stats()["memory_hits"], 1)
+
+    def test_key_depends_on_params(self):
+        cache = self.make_cache()
+        a = cache.make_key("prompt", None, {"temperature": 0.0})
+        b = cache.make_key("prompt", None, {"temperature": 0.7})
+        self.assertNotEqual(a, b)
+
+    def test_expired_and_evicted_entries_miss(self):
+        cache = self.make_cache(ttl=0)
+        cache.set("k", "v")
+        self.assertIsNone(cache.get("k"))
+
+        cache = self.make_cache(max_memory_entries=1)
+        cache.path = None  # memory only
+        cache.set("a", "1")
+        cache.set("b", "2")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("b"), "2")
+
+    def test_async_calls_use_the_cache_off_the_event_loop(self):
+        import threading
+        from .groqllm import GroqLLM
+
+        cache = self.make_cache()
+        threads = []
+        for name in ("get", "set"):
+            method = getattr(cache, name)
+            def spy(*args, _method=method):
+                threads.append(threading.get_ident())
+                return _method(*args)
+            setattr(cache, name, spy)
+
+        llm = GroqLLM(api_key="test", response_cache=cache)
+        cache.set(cache.make_key("hi", None, llm._identifying_params), "cached answer")
+        threads.clear()
+
+        async def ask():
+            return await llm.ainvoke("hi"), threading.get_ident()
+
+        answer, loop_thread = asyncio.run(ask())
+        self.assertEqual(answer, "cached answer")
+        self.assertTrue(threads)
+        self.assertNotIn(loop_thread, threads)
+
+
+class EchoGroqServer(StubGroqServer):
+    """The benchmark stub answering with the prompt upper-cased and failing on "fail"."""
+
+    def completion(self, prompt):
+        return [prompt.upper()]
+
+    def respond(self, prompt):
+        if prompt == "fail" and not self.script:
+            return 400, {}, {"error": "bad prompt"}
+        return super().respond(prompt)
+
+
+class GroqTransportTests(SimpleTestCase):
+    """Retry and circuit-breaker behaviour against a local stub of the Groq API."""
+
+    def setUp(self):
+        self.stub = EchoGroqServer(latency=0, tokens_per_second=100_000).__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        self.url = self.stub.url
+
+    def make_llm(self, **transport_kwargs):
+        from .groqllm import GroqLLM
+        from .transport import GroqTransport
+
+        transport = GroqTransport(backoff_base=0.01, backoff_max=0.05, **transport_kwargs)
+        return GroqLLM(api_key="test", api_url=self.url, transport=transport)
+
+    def test_retries_429_honouring_retry_after(self):
+        ok = {"choices": [{"message": {"content": "hello"}}]}
+        self.stub.script = [(429, {"Retry-After": "0"}, {"error": "slow down"}), (503, {}, {}), (200, {}, ok)]
+        self.assertEqual(self.make_llm().invoke("hi"), "hello")
+        self.assertEqual(self.stub.requests, 3)
+
+    def test_usage_is_recorded(self):
+        from .prompting import usage_stats
+
+        before = usage_stats.snapshot()["prompt_tokens"]
+        ok = {"choices": [{"message": {"content": "hello"}}], "usage": {"prompt_tokens": 7, "completion_tokens": 2}}
+        self.stub.script = [(200, {}, ok)]
+        self.make_llm().invoke("hi")
+        self.assertEqual(usage_stats.snapshot()["prompt_tokens"] - before, 7)
+
+    def test_client_errors_are_not_retried(self):
+        self.stub.script = [(400, {}, {"error": "bad request"})]
+        with self.assertRaisesRegex(RuntimeError, "Groq error 400"):
+            self.make_llm().invoke("hi")
+        self.assertEqual(self.stub.requests, 1)
+
+    def test_breaker_fails_fast_after_repeated_failures(self):
+        from .transport import CircuitBreaker, CircuitOpenError
+
+        self.stub.script = [(500, {}, {})]
+        llm = self.make_llm(max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        for _ in range(2):
+            with self.assertRaises(RuntimeError):
+                llm.invoke("hi")
+        with self.assertRaises(CircuitOpenError):
+            llm.invoke("hi")
+        self.assertEqual(self.stub.requests, 2)
+
+    def sse(self, *deltas, usage=None, extra=()):
+        lines = [f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': d}}]})}" for d in deltas]
+        lines += list(extra)
+        if usage is not None:
+            lines.append(f"data: {json.dumps({'choices': [], 'x_groq': {'usage': usage}})}")
+        return lines + ["data: [DONE]"]
+
+    def test_post_stream_parses_events_until_done(self):
+        from .transport import GroqTransport
+
+        self.stub.stream_lines = [": keep-alive"] + self.sse("Hel", "lo") + ['data: {"choices": [{"delta": {"content": "late"}}]}']
+        events = list(GroqTransport().post_stream(self.url, {}, {"stream": True}, 5))
+        self.assertEqual([e["choices"][0]["delta"]["content"] for e in events], ["Hel", "lo"])
+
+    def test_stream_text_skips_the_usage_only_chunk(self):
+        from .prompting import usage_stats
+
+        before = usage_stats.snapshot()["prompt_tokens"]
+        self.stub.stream_lines = self.sse("Hel", "", "lo", usage={"prompt_tokens": 11, "completion_tokens": 2})
+        self.assertEqual(list(self.make_llm().stream_text("hi")), ["Hel", "lo"])
+        self.assertEqual(usage_stats.snapshot()["prompt_tokens"] - before, 11)
+
+    def test_malformed_stream_events_raise(self):
+        llm = self.make_llm()
+        self.stub.stream_lines = self.sse("Hel", extra=['data: {"choices": "oops"}'])
+        with self.assertRaisesRegex(ValueError, "Unexpected Groq stream event"):
+            list(llm.stream_text("hi"))
+        self.stub.stream_lines = self.sse("Hel", extra=["data: {not json"])
+        with self.assertRaises(ValueError):
+            list(llm.stream_text("hi"))
+
+    @override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                            "LOCATION": "stream-view-tests"}},
+                       SESSION_ENGINE="django.contrib.sessions.backends.cache")
+    def test_stream_message_emits_tokens_errors_and_done(self):
+        from django.test import AsyncClient
+        from django.urls import reverse
+        from courses.tests import SAMPLE_COURSES, SAMPLE_GROUPS
+
+        install_catalog(SAMPLE_COURSES, SAMPLE_GROUPS)
+        self.addCleanup(setattr, advisor.llm, "api_url", advisor.llm.api_url)
+        self.addCleanup(setattr, advisor.llm, "response_cache", advisor.llm.response_cache)
+        advisor.llm.api_url, advisor.llm.response_cache = self.url, None
+
+        async def post():
+            response = await AsyncClient().post(reverse("bot:stream_message"), {"message": "Tell me about CS 210."})
+            body = b"".join([chunk async for chunk in response.streaming_content]).decode()
+            return [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line.startswith("data: ")]
+
+        self.stub.stream_lines = self.sse("Data ", "structures.", usage={"prompt_tokens": 5, "completion_tokens": 2})
+        events = asyncio.run(post())
+        self.assertEqual([e for e in events if e["type"] == "token"],
+                         [{"type": "token", "content": "Data "}, {"type": "token", "content": "structures."}])
+        self.assertNotIn("error", [e["type"] for e in events])
+        self.assertEqual(events[-1], {"type": "done"})
+
+        self.stub.stream_lines = self.sse("Data ", extra=['data: {"choices": "oops"}'])
+        events = asyncio.run(post())
+        self.assertEqual([e["type"] for e in events], ["token", "error", "done"])
+
+    def test_half_open_trial_is_released_after_an_unexpected_error(self):
+        from .transport import CircuitBreaker, GroqTransport
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        transport = GroqTransport(max_retries=0, breaker=breaker)
+        with mock.patch.object(transport.session, "post", side_effect=KeyError("boom")):
+            with self.assertRaises(KeyError):
+                transport.post_json(self.url, {}, {}, 5)
+        self.assertTrue(breaker.allow())
+
+    def test_async_client_is_closed_with_its_loop(self):
+        from .transport import GroqTransport
+
+        transport = GroqTransport()
+
+        async def use():
+            client = transport.async_client()
+            self.assertIs(transport.async_client(), client)
+            return client
+
+        self.assertTrue(asyncio.run(use()).is_closed)
+
+    def test_read_timeouts_are_not_retried(self):
+        import requests
+        from .transport import GroqTransport
+
+        transport = GroqTransport(max_retries=3, backoff_base=0.01)
+        with mock.patch.object(transport.session, "post", side_effect=requests.ReadTimeout("slow")) as post:
+            with self.assertRaisesRegex(RuntimeError, "Groq request failed"):
+                transport.post_json(self.url, {}, {}, 5)
+        self.assertEqual(post.call_count, 1)
+
+    def test_single_invoke_raises_instead_of_returning_empty(self):
+        import asyncio
+
+        llm = self.make_llm()
+        with self.assertRaisesRegex(RuntimeError, "Groq error 400"):
+            llm.invoke("fail")
+        with self.assertRaisesRegex(RuntimeError, "Groq error 400"):
+            asyncio.run(llm.ainvoke("fail"))
+
+    def test_batch_keeps_order_and_isolates_errors(self):
+        llm = self.make_llm()
+        llm.batch_concurrency = 3
+        prompts = ["a", "b", "fail", "c", "d"]
+        result = llm.generate(prompts)
+        texts = [g[0].text for g in result.generations]
+        self.assertEqual(texts, ["A", "B", "", "C", "D"])
+        self.assertIn("Groq error 400", result.generations[2][0].generation_info["error"])
+
+
+class PrereqDescriptionTests(SimpleTestCase):
+    def test_groups_keep_and_or_logic(self):
+        groups = [
+            {"type": "OR", "recommended": True, "courses": ["MATH 104", "MATH 103"]},
+            {"type": "AND", "recommended": False, "courses": ["CS 115", "CS 110"]},
+        ]
+        self.assertEqual(
+            advisor.describe_prereq_groups(groups),
+            "CS 110 and CS 115; one of MATH 103 or MATH 104 (recommended)",
+        )
+        self.assertEqual(advisor.describe_prereq_groups([]), "None")
+
+
+class RetrievalTests(SimpleTestCase):
+    def setUp(self):
+        from courses.tests import SAMPLE_COURSES, SAMPLE_GROUPS
+        courses = [dict(c) for c in SAMPLE_COURSES]
+        courses[2]["description"] = "Stacks, queues, trees and hash tables."
+        courses[3]["description"] = "Building web applications backed by a relational database."
+        self.retriever = CourseRetriever(CatalogSnapshot("v1", courses, SAMPLE_GROUPS))
+
+    def test_ranks_by_title_and_description(self):
+        rows = self.retriever.context_rows("I want to learn about databases and web apps", k=1)
+        self.assertEqual(rows[0]["code"], "CS 215")
+        # Direct prerequisites of the hit follow it.
+        self.assertEqual([r["code"] for r in rows], ["CS 215", "CS 210"])
+
+    def test_codes_match_with_or_without_space(self):
+        self.assertEqual(self.retriever.search("cs210", k=1), self.retriever.search("CS 210", k=1))
+
+    def test_unrelated_question_returns_nothing(self):
+        self.assertEqual(self.retriever.context_rows("zzz qqq", k=5), [])
+
+
+class DegreePlannerTests(SimpleTestCase):
+    def setUp(self):
+        from courses.tests import SAMPLE_COURSES, SAMPLE_GROUPS
+        groups = SAMPLE_GROUPS + [
+            {"course": "CS 215", "id": "g5", "type": "OR", "recommended": False, "members": ["MATH 103", "CS 110"]},
+        ]
+        self.snapshot = CatalogSnapshot("v1", SAMPLE_COURSES, groups)
+
+    def terms(self, plan):
+        return [[c["code"] for c in term["courses"]] for term in plan["terms"]]
+
+    def test_schedule_respects_prerequisites(self):
+        plan = plan_degree(self.snapshot, [], ["CS 215"])
+        # The OR group is satisfied by CS 110, already needed on the AND chain.
+        self.assertEqual(self.terms(plan), [["CS 110"], ["CS 115"], ["CS 210"], ["CS 215"]])
+        self.assertEqual(plan["unscheduled"], [])
+
+    def test_completed_courses_and_credit_limit(self):
+        plan = plan_degree(self.snapshot, ["cs110"], ["CS 215", "MATH 103"], credit_limit=3)
+        self.assertEqual(self.terms(plan), [["CS 115"], ["CS 210"], ["MATH 103"], ["CS 215"]])
+        plan = plan_degree(self.snapshot, ["CS 110"], ["CS 215", "MATH 103"], credit_limit=6)
+        self.assertEqual(self.terms(plan), [["CS 115", "MATH 103"], ["CS 210"], ["CS 215"]])
+
+    def test_question_parsing(self):
+        parsed = parse_planning_question(
+            self.snapshot, "I've already taken CS110 and CS 115. Plan my way to cs215 at 9 credits a term")
+        self.assertEqual(parsed, {"completed": ["CS 110", "CS 115"], "targets": ["CS 215"], "credit_limit": 9})
+        plan = plan_degree(self.snapshot, parsed["completed"], parsed["targets"], parsed["credit_limit"])
+        self.assertEqual(format_plan(plan)[0], "Term 1 (3 credits): CS 210 Data Structures")
+
+    def test_goal_verbs_are_not_completed_courses(self):
+        parsed = parse_planning_question(self.snapshot, "I need to complete CS 215")
+        self.assertEqual((parsed["completed"], parsed["targets"]), ([], ["CS 215"]))
+        parsed = parse_planning_question(self.snapshot, "How do I get to CS 215? I have CS 110")
+        self.assertEqual((parsed["completed"], parsed["targets"]), (["CS 110"], ["CS 215"]))
+
+    def test_unknown_and_cyclic_courses_are_reported(self):
+        groups = [{"course": "CS 110", "id": "c1", "type": "AND", "recommended": False, "members": ["CS 115"]},
+                  {"course": "CS 115", "id": "c2", "type": "AND", "recommended": False, "members": ["CS 110"]}]
+        from courses.tests import SAMPLE_COURSES
+        plan = plan_degree(CatalogSnapshot("v1", SAMPLE_COURSES, groups), [], ["CS 115", "CS 999"])
+        self.assertEqual(plan["unscheduled"], ["CS 110", "CS 115"])
+        self.assertEqual(plan["unknown"], ["CS 999"])
+
+
+class CourseResolverTests(SimpleTestCase):
+    def setUp(self):
+        from courses.tests import SAMPLE_COURSES, SAMPLE_GROUPS
+        courses = SAMPLE_COURSES + [{"code": "PHIL 101", "title": "Introduction to Ethics"}]
+        self.resolver = CourseResolver(CatalogSnapshot("v1", courses, SAMPLE_GROUPS))
+
+    def test_codes_for_every_catalog_department(self):
+        self.assertEqual(self.resolver.resolve("Is phil101 harder than CS-210 or math 103?"),
+                         ["PHIL 101", "CS 210", "MATH 103"])
+        self.assertEqual(self.resolver.resolve("any level 300 courses?"), [])
+
+    def test_titles_aliases_and_typos(self):
+        self.assertEqual(self.resolver.resolve("is Web and Database Programming hard?"), ["CS 215"])
+        self.assertEqual(self.resolver.resolve("what comes after data strucures"), ["CS 210"])
+        # Only whole phrases count: "intro to" is not the start of a title.
+        self.assertEqual(self.resolver.resolve("intro to ethcs then applied calculus i"), ["MATH 103"])
+        self.assertEqual(self.resolver.resolve("introduction to ethcs then applied calculus i"),
+                         ["PHIL 101", "MATH 103"])
+
+    def test_mentions_carry_spans(self):
+        text = "Tell me about object oriented programming"
+        [(start, end, code)] = self.resolver.mentions(text)
+        self.assertEqual((text[start:end], code), ("object oriented programming", "CS 115"))
+
+    def test_edit_distance_is_bounded(self):
+        self.assertEqual(edit_distance("strucures", "structures", 2), 1)
+        self.assertEqual(edit_distance("ethics", "physics", 1), 2)
+
+
+class EligibilityTests(SimpleTestCase):
+    def setUp(self):
+        from courses.tests import SAMPLE_COURSES, SAMPLE_GROUPS
+        groups = SAMPLE_GROUPS + [
+            {"course": "CS 215", "id": "g5", "type": "OR", "recommended": False, "members": ["MATH 103", "CS 115"]},
+        ]
+        self.matrix = EligibilityMatrix(CatalogSnapshot("v1", SAMPLE_COURSES, groups))
+
+    def codes(self, courses):
+        return [c["code"] for c in courses]
+
+    def test_and_or_groups(self):
+        self.assertEqual(self.codes(self.matrix.eligible([])), ["CS 110", "MATH 103"])
+        # MATH 103 on CS 210 is only recommended.
+        self.assertEqual(self.codes(self.matrix.eligible(["CS 110", "CS 115"])), ["MATH 103", "CS 210"])
+        # CS 215 needs CS 210 and one of MATH 103 / CS 115.
+        self.assertEqual(self.codes(self.matrix.eligible(["CS 110", "cs115", "CS 210"])), ["MATH 103", "CS 215"])
+
+    def test_batch_matches_single_evaluation(self):
+        histories = [[], ["CS 110"], ["CS 110", "CS 115", "CS 210", "MATH 103"], ["CS 999"]]
+        batch = self.matrix.eligible_batch(histories)
+        self.assertEqual(batch, [self.matrix.eligible(h) for h in histories])
+        self.assertEqual(self.codes(batch[2]), ["CS 215"])
+
+    @mock.patch("bot.resolver.get_resolver", return_value=None)
+    def test_eligibility_intent_is_routed_and_answered(self, _):
+        plan = advisor.route_question("What can I take now? I've passed CS110")
+        self.assertEqual(plan["intent"], "eligibility")
+        self.assertEqual(advisor.route_question("What can I take after CS110?")["intent"], "next_course_query")
+        draft = advisor.draft_eligibility("I've passed CS110", matrix=self.matrix)
+        self.assertIsNone(draft["prompt"])
+        self.assertIn("CS 115", draft["fallback"])
+
+    def api_get(self, query, session=None, staff=False):
+        from django.contrib.auth.models import AnonymousUser
+        from django.test import RequestFactory
+        from .views import eligibility_api
+
+        request = RequestFactory().get("/chat/api/eligibility/", query)
+        request.session = session or {}
+        request.user = mock.Mock(is_staff=True) if staff else AnonymousUser()
+        with mock.patch("bot.views.get_eligibility", return_value=self.matrix), \
+                mock.patch("bot.views.completed_by_student", return_value={}):
+            return eligibility_api(request)
+
+    def test_api_only_reads_the_sessions_own_enrollments(self):
+        self.assertEqual(self.api_get({"completed": "CS110"}).status_code, 200)
+        self.assertEqual(self.api_get({"student_id": "S2"}, {"student_id": "S1"}).status_code, 403)
+        self.assertEqual(self.api_get({"student_id": "S2"}).status_code, 403)
+        self.assertEqual(self.api_get({"student_id": "S1"}, {"student_id": "S1"}).status_code, 200)
+        self.assertEqual(self.api_get({"student_id": "S2"}, staff=True).status_code, 200)
+
+
+@override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                                        "LOCATION": "async-advisor-tests"}},
+                   SESSION_ENGINE="django.contrib.sessions.backends.cache")
+class AsyncAdvisorTests(SimpleTestCase):
+    """The ASGI pipeline and views against a stub Groq endpoint and an in-memory catalog."""
+
+    def setUp(self):
+        from courses.tests import SAMPLE_COURSES, SAMPLE_GROUPS
+
+        install_catalog(SAMPLE_COURSES, SAMPLE_GROUPS)
+        # finish_draft falls back to the canned answer below four words.
+        stub = StubGroqServer(latency=0, tokens_per_second=10_000, tokens=4).__enter__()
+        self.addCleanup(stub.__exit__, None, None, None)
+        self.addCleanup(setattr, advisor.llm, "api_url", advisor.llm.api_url)
+        self.addCleanup(setattr, advisor.llm, "response_cache", advisor.llm.response_cache)
+        advisor.llm.api_url, advisor.llm.response_cache = stub.url, None
+
+    def test_aadvisor_response_answers_and_remembers_the_course(self):
+        from .async_agent import aadvisor_response
+
+        state = ConversationState()
+        result = asyncio.run(aadvisor_response("Tell me about CS 210.", state))
+        self.assertEqual(result["type"], "text")
+        self.assertEqual(result["content"], "word0 word1 word2 word3")
+        self.assertEqual(state.last_course_code, "CS 210")
+
+    def test_aadvisor_response_stream_yields_tokens_then_done(self):
+        from .async_agent import aadvisor_response_stream
+
+        async def collect():
+            return [event async for event in aadvisor_response_stream("Tell me about CS 210.", ConversationState())]
+
+        events = asyncio.run(collect())
+        self.assertEqual("".join(e["content"] for e in events if e["type"] == "token"), "word0 word1 word2 word3 ")
+        self.assertNotIn("error", [e["type"] for e in events])
+        self.assertEqual(events[-1], {"type": "done"})
+
+    def test_views_answer_over_the_async_client(self):
+        from django.test import AsyncClient
+        from django.urls import reverse
+
+        async def run():
+            http = AsyncClient()
+            page = await http.post(reverse("bot:send_message"), {"message": "Tell me about CS 210."})
+            stream = await http.post(reverse("bot:stream_message"), {"message": "What can I take after CS 115?"})
+            body = b"".join([chunk async for chunk in stream.streaming_content]).decode()
+            return page, stream, body
+
+        page, stream, body = asyncio.run(run())
+        self.assertEqual(page.status_code, 200)
+        self.assertIn("word0 word1 word2 word3", page.content.decode())
+        self.assertEqual(stream["Content-Type"], "text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in body.split("\n\n") if line.startswith("data: ")]
+        self.assertIn("token", [e["type"] for e in events])
+        self.assertEqual(events[-1], {"type": "done"})
+
+
+class BenchmarkTests(SimpleTestCase):
+    def test_synthetic_catalog_is_seeded_and_acyclic(self):
+        courses, groups = synthetic_catalog(300, seed=3)
+        self.assertEqual((courses, groups), synthetic_catalog(300, seed=3))
+        snapshot = CatalogSnapshot("bench", courses, groups)
+        self.assertEqual(len(snapshot), 300)
+        for group in groups:
+            owner = snapshot.lookup(group["course"])
+            self.assertTrue(all(snapshot.lookup(code) < owner for code in group["members"]))
+
+    def test_percentile_is_nearest_rank(self):
+        samples = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(samples, 50), 50.0)
+        self.assertEqual(percentile(samples, 99), 99.0)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_stub_serves_chat_completions(self):
+        from .transport import GroqTransport
+
+        with StubGroqServer(latency=0, tokens_per_second=10_000, tokens=3) as stub:
+            transport = GroqTransport()
+            payload = {"messages": [{"role": "user", "content": "hello"}]}
+            data = transport.post_json(stub.url, {}, payload, 5)
+            events = list(transport.post_stream(stub.url, {}, {**payload, "stream": True}, 5))
+        self.assertEqual(data["choices"][0]["message"]["content"], "word0 word1 word2 ")
+        self.assertEqual("".join(e["choices"][0]["delta"]["content"] for e in events if e["choices"]),
+                         "word0 word1 word2 ")
+        self.assertEqual(events[-1]["usage"]["completion_tokens"], 3)
+
+
+class MetricsTests(SimpleTestCase):
+    def setUp(self):
+        token = metrics.current_intent.set("none")
+        self.addCleanup(metrics.current_intent.reset, token)
+
+    def test_turn_restores_the_intent_across_generator_yields(self):
+        def stream():
+            with metrics.turn() as status:
+                metrics.set_intent("metrics_stream")
+                yield "token"
+                status["ok"] = False
+            yield "done"
+
+        before = metrics.TURNS.value("metrics_stream", "error")
+        self.assertEqual(list(stream()), ["token", "done"])
+        self.assertEqual(metrics.TURNS.value("metrics_stream", "error"), before + 1)
+        self.assertEqual(metrics.current_intent.get(), "none")
+
+    def test_spans_are_labelled_with_the_planned_intent(self):
+        before = metrics.STAGE_SECONDS.count("llm", "metrics_test")
+        with metrics.turn():
+            with metrics.span("plan"):
+                metrics.set_intent("metrics_test")
+            with metrics.span("llm"):
+                pass
+        self.assertEqual(metrics.STAGE_SECONDS.count("llm", "metrics_test"), before + 1)
+        self.assertEqual(metrics.current_intent.get(), "none")
+        self.assertIn('coursecompass_turns_total{intent="metrics_test",outcome="ok"}', metrics.render())
+
+    def test_failed_stage_is_counted(self):
+        @metrics.timed("cypher")
+        def failing():
+            raise RuntimeError("down")
+
+        before = metrics.STAGE_ERRORS.value("cypher", "none")
+        with self.assertRaises(RuntimeError):
+            failing()
+        self.assertEqual(metrics.STAGE_ERRORS.value("cypher", "none"), before + 1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = metrics.Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, "x")
+        lines = histogram.expose()
+        self.assertIn('test_seconds_bucket{stage="x",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{stage="x",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{stage="x",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{stage="x"} 3', lines)
+
+
+class RecorderTests(SimpleTestCase):
+    def test_log_rotates_by_size(self):
+        import os
+        import tempfile
+
+        directory = tempfile.mkdtemp()
+        log = recorder.TurnLog(os.path.join(directory, "turns-{pid}.jsonl"), max_bytes=200, backups=2)
+        for i in range(20):
+            log.submit({"question": f"question {i}", "padding": "x" * 40})
+        log.close()
+        files = sorted(os.listdir(directory))
+        self.assertEqual(len(files), 3)
+        self.assertTrue(all(str(os.getpid()) in name for name in files))
+        with open(log.path) as f:
+            self.assertEqual(json.loads(f.readlines()[-1])["question"], "question 19")
+
+    def test_sampling_keeps_whole_sessions(self):
+        self.assertTrue(recorder.sampled("abc", 1.0))
+        self.assertFalse(recorder.sampled("abc", 0.0))
+        kept = [recorder.sampled(f"session-{i}", 0.5) for i in range(200)]
+        self.assertEqual(kept, [recorder.sampled(f"session-{i}", 0.5) for i in range(200)])
+        self.assertTrue(60 < sum(kept) < 140)
+
+    def test_recorded_backend_replays_lookups_and_completions(self):
+        calls = []
+
+        @recorder.captured
+        def cypher_lookup(code, depth=1):
+            calls.append(code)
+            return {"code": code, "depth": depth}
+
+        with recorder.collect() as turn:
+            cypher_lookup("CS 210", depth=2)
+            recorder.record_llm("prompt", "completion", 0.0)
+        backend = recorder.RecordedBackend(json.loads(json.dumps(turn)))
+
+        token = recorder.replay_source.set(backend)
+        try:
+            self.assertEqual(cypher_lookup("CS 210", depth=2), {"code": "CS 210", "depth": 2})
+        finally:
+            recorder.replay_source.reset(token)
+        self.assertEqual(calls, ["CS 210"])
+        self.assertEqual(backend.get(backend.make_key("prompt", None, {})), "completion")
+        self.assertEqual(backend.get("unrecorded prompt"), "")
+        self.assertEqual(backend.misses, 1)
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def test_catalog_is_trimmed_to_budget(self):
+        from .prompting import budget_for, build_prompt, encode_catalog, estimate_tokens
+
+        rows = [{"code": f"CS {100 + i}", "title": f"Course {i}", "level": 100, "credits": 3, "prereqs": ["CS 110"]}
+                for i in range(500)]
+        lines = encode_catalog(rows)
+        self.assertEqual(lines[1], "CS 100|Course 0|100|3|CS 110")
+
+        prompt = build_prompt("advising", advisor.ADVISING_PROMPT, elastic="catalog", min_lines=2,
+                              question="x" * 10000, history="", catalog=lines)
+        self.assertLessEqual(estimate_tokens(prompt), budget_for("advising"))
+        self.assertIn("code|title|level|credits|prereqs\nCS 100|", prompt)
+        self.assertNotIn("CS 599", prompt)
+
+    def test_small_prompts_are_untouched(self):
+        from .prompting import build_prompt
+
+        prompt = build_prompt("course_info", "Description: {description}", elastic="description",
+                              description="Stacks and queues.")
+        self.assertEqual(prompt, "Description: Stacks and queues.")
+
+
+class LazyDriverTests(SimpleTestCase):
+    def test_driver_is_created_once_per_process(self):
+        from unittest import mock
+        from CourseCompass import neo4j_driver
+
+        self.addCleanup(setattr, neo4j_driver, "_driver", neo4j_driver._driver)
+        self.addCleanup(setattr, neo4j_driver, "_driver_pid", neo4j_driver._driver_pid)
+        neo4j_driver._driver, neo4j_driver._driver_pid = None, None
+        with mock.patch.object(neo4j_driver.GraphDatabase, "driver", side_effect=lambda *a, **kw: object()) as create:
+            first = neo4j_driver.get_driver()
+            self.assertIs(neo4j_driver.get_driver(), first)
+            with mock.patch("os.getpid", return_value=-1):
+                self.assertIsNot(neo4j_driver.get_driver(), first)
+        self.assertEqual(create.call_count, 2)
+        self.assertEqual(create.call_args.kwargs["max_connection_pool_size"], neo4j_driver.POOL_SETTINGS["max_connection_pool_size"])
+
+    def test_async_driver_is_closed_with_its_loop(self):
+        from CourseCompass import neo4j_driver
+
+        async_driver = mock.MagicMock()
+        async_driver.close = mock.AsyncMock()
+
+        async def use():
+            self.assertIs(neo4j_driver.get_async_driver(), neo4j_driver.get_async_driver())
+
+        with mock.patch.object(neo4j_driver.AsyncGraphDatabase, "driver", return_value=async_driver) as create:
+            asyncio.run(use())
+        self.assertEqual(create.call_count, 1)
+        async_driver.close.assert_awaited_once()
@@ -0,0 +1,322 @@
+"""
+HTTP transport for GroqLLM
+--------------------------
+One pooled, keep-alive `requests.Session` per worker process (and one
+`httpx.AsyncClient` per event loop for the async path), with exponential
+backoff on 429/5xx and connection errors (honouring Retry-After) and a circuit
+breaker that fails fast while the API is degraded instead of holding a worker
+for the full timeout. Read timeouts are not retried: the request has already
+waited the whole timeout once.
+"""
+
+import asyncio
+import email.utils
+import json
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Dict, Iterator, Mapping, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without making a request while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed    -> requests flow; `failure_threshold` consecutive failures open it.
+    open      -> requests fail fast for `reset_timeout` seconds.
+    half-open -> one trial request; success closes, failure re-opens.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if now - self._opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def acquire(self) -> Optional[bool]:
+        """
+        None if the request must fail fast, otherwise whether it is the
+        half-open trial (whose caller must call release_trial() when done).
+        """
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return None
+
+    def release_trial(self) -> None:
+        """
+        Frees the half-open trial slot if the trial ended without recording an
+        outcome (cancelled, or an unexpected error), so the next request can try.
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class GroqTransport:
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        pool_maxsize: int = 16,
+        async_max_connections: int = 100,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.pool_maxsize = pool_maxsize
+        self.async_max_connections = async_max_connections
+        self.breaker = breaker or CircuitBreaker()
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._lock = threading.Lock()
+        # loop -> (client, task that closes the client when the loop shuts down)
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple]" = weakref.WeakKeyDictionary()
+
+    @property
+    def session(self) -> requests.Session:
+        # Sessions must not be shared across a fork (gunicorn preload), so a
+        # worker that inherits one from its parent builds its own.
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize)
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    self._session, self._session_pid = session, pid
+        return self._session
+
+    def post_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        return self._send(url, headers, payload, timeout).json()
+
+    def post_stream(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> Iterator[Dict[str, Any]]:
+        """
+        POSTs a `stream: true` request and yields each server-sent event's JSON
+        payload until `data: [DONE]`. Retries only happen before the first byte.
+        """
+        resp = self._send(url, headers, payload, timeout, stream=True)
+        try:
+            for line in resp.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                yield json.loads(data)
+        finally:
+            resp.close()
+
+    def _send(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float,
+              stream: bool = False) -> requests.Response:
+        trial = self.breaker.acquire()
+        if trial is None:
+            raise CircuitOpenError("Groq API circuit is open; failing fast")
+
+        attempt = 0
+        try:
+            while True:
+                try:
+                    resp = self.session.post(url, headers=headers, json=payload, timeout=timeout, stream=stream)
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    # A read timeout already waited the full timeout; do not wait it again.
+                    delay = self._connection_failed(e, attempt, retry=not isinstance(e, requests.ReadTimeout))
+                else:
+                    if resp.ok:
+                        self.breaker.record_success()
+                        return resp
+                    delay = self._failed_status(resp.status_code, resp.text, resp.headers, attempt)
+                    resp.close()
+
+                attempt += 1
+                logger.warning("Retrying Groq request in %.2fs (attempt %d)", delay, attempt)
+                time.sleep(delay)
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    # -- async (httpx) ------------------------------------------------
+    def async_client(self) -> httpx.AsyncClient:
+        """
+        One pooled httpx.AsyncClient per event loop (a client cannot be shared
+        across loops); under an ASGI server that is one per worker. The client
+        is closed when its loop shuts down.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            client = httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.async_max_connections,
+                max_keepalive_connections=self.pool_maxsize,
+            ))
+            entry = self._async_clients[loop] = (client, loop.create_task(_close_with_loop(client)))
+        return entry[0]
+
+    async def apost_json(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        resp = await self._asend(url, headers, payload, timeout)
+        return resp.json()
+
+    async def apost_stream(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float) -> AsyncIterator[Dict[str, Any]]:
+        resp = await self._asend(url, headers, payload, timeout, stream=True)
+        try:
+            async for line in resp.aiter_lines():
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                yield json.loads(data)
+        finally:
+            await resp.aclose()
+
+    async def _asend(self, url: str, headers: Dict[str, str], payload: Dict[str, Any], timeout: float,
+                     stream: bool = False) -> httpx.Response:
+        trial = self.breaker.acquire()
+        if trial is None:
+            raise CircuitOpenError("Groq API circuit is open; failing fast")
+
+        client = self.async_client()
+        attempt = 0
+        try:
+            while True:
+                try:
+                    request = client.build_request("POST", url, headers=headers, json=payload, timeout=timeout)
+                    resp = await client.send(request, stream=stream)
+                except httpx.TransportError as e:
+                    delay = self._connection_failed(e, attempt, retry=not isinstance(e, httpx.ReadTimeout))
+                else:
+                    if resp.is_success:
+                        self.breaker.record_success()
+                        return resp
+                    await resp.aread()
+                    delay = self._failed_status(resp.status_code, resp.text, resp.headers, attempt)
+                    await resp.aclose()
+
+                attempt += 1
+                logger.warning("Retrying Groq request in %.2fs (attempt %d)", delay, attempt)
+                await asyncio.sleep(delay)
+        finally:
+            # Also runs on CancelledError, which is not an Exception.
+            if trial:
+                self.breaker.release_trial()
+
+    # -- retry policy shared by both paths -----------------------------
+    def _connection_failed(self, error: Exception, attempt: int, retry: bool = True) -> float:
+        """
+        Returns the delay before retrying a request that never got a response.
+        """
+        if not retry or attempt >= self.max_retries:
+            self.breaker.record_failure()
+            raise RuntimeError(f"Groq request failed: {error}") from error
+        return self._backoff(attempt)
+
+    def _failed_status(self, status: int, text: str, headers: Mapping[str, str], attempt: int) -> float:
+        """
+        Returns the delay before retrying an error response, or raises if it is final.
+        """
+        if status not in RETRY_STATUSES:
+            # Our request is wrong (400/401/...); the API itself is healthy.
+            self.breaker.record_success()
+            raise RuntimeError(f"Groq error {status}: {text}")
+        if attempt >= self.max_retries:
+            self.breaker.record_failure()
+            raise RuntimeError(f"Groq error {status}: {text}")
+        delay = self._retry_after(headers) if status == 429 else None
+        return self._backoff(attempt) if delay is None else delay
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _retry_after(self, headers: Mapping[str, str]) -> Optional[float]:
+        value = headers.get("Retry-After")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0.0), self.backoff_max)
+
+
+async def _close_with_loop(client: httpx.AsyncClient) -> None:
+    """
+    Parked on the client's loop until it is cancelled: asyncio.run() and
+    asgiref's async_to_sync cancel pending tasks before closing a loop (see
+    CourseCompass.neo4j_driver.get_async_driver).
+    """
+    try:
+        await asyncio.get_running_loop().create_future()
+    finally:
+        await client.aclose()
+
+
+_default_transport: Optional[GroqTransport] = None
+
+
+def default_transport() -> GroqTransport:
+    """
+    Process-wide transport shared by every GroqLLM instance in the worker.
+    """
+    global _default_transport
+    if _default_transport is None:
+        _default_transport = GroqTransport(
+            max_retries=int(os.getenv("GROQ_MAX_RETRIES", 3)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(os.getenv("GROQ_BREAKER_THRESHOLD", 5)),
+                reset_timeout=float(os.getenv("GROQ_BREAKER_RESET", 30)),
+            ),
+        )
+    return _default_transport
@@ -6,4 +6,6 @@ app_name = "bot"
 urlpatterns = [
     path('', views.chat_page, name='chat_page'),
     path('send-message/', views.send_message, name='send_message'),
+    path('stream-message/', views.stream_message, name='stream_message'),
+    path('api/eligibility/', views.eligibility_api, name='eligibility_api'),
 ]
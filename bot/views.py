@@ -1,8 +1,23 @@
+import json
+
 from django.shortcuts import render
-from django.http import HttpResponse
-from django.views.decorators.http import require_POST
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_http_methods, require_POST
 from django.utils.safestring import mark_safe
-from .agent import advisor_response
+from .async_agent import aadvisor_response, aadvisor_response_stream
+from .conversation import aload_state, asave_state
+from .eligibility import get_eligibility
+from .planner import completed_by_student
+from .recorder import session_label
+
+
+async def _session_key(request) -> str:
+    """
+    Conversation state is keyed by the Django session; create one on first message.
+    """
+    if not request.session.session_key:
+        await request.session.acreate()
+    return request.session.session_key
 
 
 def chat_page(request):
@@ -13,15 +28,21 @@ def chat_page(request):
 
 
 @require_POST
-def send_message(request):
+async def send_message(request):
     """
     Handles chat messages and renders appropriate response (text or HTML).
+    Async so an ASGI worker is not held while waiting on Groq or Neo4j.
     """
     user_message = request.POST.get('message', '').strip()
     if not user_message:
         return HttpResponse('')
 
-    bot_result = advisor_response(user_message)
+    session_key = await _session_key(request)
+    state = await aload_state(session_key)
+    state.student_id = await request.session.aget("student_id")
+    state.session_id = session_label(session_key)
+    bot_result = await aadvisor_response(user_message, state)
+    await asave_state(session_key, state)
 
     # Process result (dict or text)
     if isinstance(bot_result, dict):
@@ -39,4 +60,119 @@ def send_message(request):
         "bot_response": bot_response,
     }
 
-    return render(request, "bot/chat_messages.html", context)
\ No newline at end of file
+    return render(request, "bot/chat_messages.html", context)
+
+
+@require_POST
+async def stream_message(request):
+    """
+    Streams the answer as server-sent events so the chat can show tokens as they
+    arrive. See advisor_response_stream for the event types.
+    """
+    user_message = request.POST.get('message', '').strip()
+    if not user_message:
+        return HttpResponse('')
+
+    session_key = await _session_key(request)
+    state = await aload_state(session_key)
+    state.student_id = await request.session.aget("student_id")
+    state.session_id = session_label(session_key)
+
+    async def events():
+        async for event in aadvisor_response_stream(user_message, state):
+            if event["type"] == "done":
+                await asave_state(session_key, state)
+            yield f"data: {json.dumps(event)}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # disable proxy buffering (nginx)
+    return response
+
+
+# ============================================================
+# ELIGIBILITY API
+# ============================================================
+ELIGIBILITY_MAX_BATCH = 500
+
+
+def _eligibility_requests(request):
+    """
+    [(id, completed codes or None, student_id or None)] from the query string
+    (?completed=CS110,CS115 or ?student_id=...) or a JSON body
+    {"students": [{"id", "completed": [...], "student_id"}, ...]}. Raises ValueError.
+    """
+    if request.method == 'GET':
+        completed = [c for c in request.GET.get('completed', '').split(',') if c.strip()]
+        student_id = request.GET.get('student_id', '').strip() or None
+        return [(student_id or 'request', completed, student_id)]
+
+    try:
+        students = json.loads(request.body or b'{}').get('students')
+    except (ValueError, AttributeError):
+        raise ValueError("Body must be a JSON object with a 'students' list.")
+    if not isinstance(students, list) or not students:
+        raise ValueError("Body must be a JSON object with a 'students' list.")
+    if len(students) > ELIGIBILITY_MAX_BATCH:
+        raise ValueError(f"At most {ELIGIBILITY_MAX_BATCH} students per request.")
+
+    parsed = []
+    for i, student in enumerate(students):
+        if not isinstance(student, dict):
+            raise ValueError(f"students[{i}] must be an object.")
+        completed = student.get('completed') or []
+        if not isinstance(completed, list):
+            raise ValueError(f"students[{i}].completed must be a list of course codes.")
+        student_id = student.get('student_id')
+        parsed.append((student.get('id', student_id or i), [str(c) for c in completed], student_id))
+    return parsed
+
+
+def _may_read_enrollments(request, student_ids) -> bool:
+    """
+    Enrollment rows are private: a session may read only its own student's,
+    staff may read anyone's.
+    """
+    if not student_ids:
+        return True
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_staff:
+        return True
+    own = request.session.get('student_id')
+    return own is not None and set(student_ids) == {own}
+
+
+@require_http_methods(['GET', 'POST'])
+def eligibility_api(request):
+    """
+    Courses each student can take next. Completed courses are the given codes
+    plus, for a student_id, their passing or in-progress Enrollment rows (the
+    session's own student, or any student for staff). POST evaluates a batch
+    of students in one matrix pass and needs the CSRF token like any POST.
+    """
+    try:
+        students = _eligibility_requests(request)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if not _may_read_enrollments(request, {student_id for _, _, student_id in students if student_id}):
+        return JsonResponse({'error': 'Not allowed to read these students\' enrollments.'}, status=403)
+
+    matrix = get_eligibility()
+    if matrix is None:
+        return JsonResponse({'error': 'Course catalog is unavailable.'}, status=503)
+
+    snapshot = matrix.snapshot
+    enrolled = completed_by_student({student_id for _, _, student_id in students if student_id})
+    completed = [set(codes) | enrolled.get(student_id, set()) for _, codes, student_id in students]
+    eligible = matrix.eligible_batch(completed)
+
+    results = []
+    for (student, _, _), codes, courses in zip(students, completed, eligible):
+        known = {snapshot.lookup(c) for c in codes} - {None}
+        results.append({
+            'id': student,
+            'completed': sorted(snapshot.codes[c] for c in known),
+            'unknown': sorted(c for c in codes if c not in snapshot),
+            'eligible': courses,
+        })
+    return JsonResponse({'version': matrix.version, 'results': results})
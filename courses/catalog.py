@@ -0,0 +1,478 @@
+"""
+In-process snapshot of the course catalog graph
+-----------------------------------------------
+Every worker keeps a compact, array-backed copy of the
+(Course)-[:REQUIRES]->(PrerequisiteGroup)-[:HAS]->(Course) graph so the bot can
+answer course, prerequisite and next-course lookups without a Neo4j round trip.
+
+The snapshot is tied to a catalog version stored in Django's cache. Any write to
+the graph (see courses/views.py) calls `bump_catalog_version()`, and the next
+lookup in every worker sees the new version and reloads the snapshot.
+Point CACHE_URL at a shared backend (file, redis, memcached) so that all
+workers observe the same version.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from array import array
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.core.cache import cache
+
+from CourseCompass.neo4j_driver import get_driver
+
+logger = logging.getLogger(__name__)
+
+CATALOG_VERSION_KEY = "courses:catalog_version"
+CATALOG_UPDATED_KEY = "courses:catalog_updated_at"
+SHARED_ARTIFACT_TTL = 24 * 3600
+# Seconds before a failed artifact build is retried for the same catalog version.
+ARTIFACT_RETRY_SECONDS = 30
+
+
+# ============================================================
+# CATALOG VERSION
+# ============================================================
+def catalog_version() -> str:
+    """
+    Returns the current catalog version token, creating one if the cache is empty.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_UPDATED_KEY, time.time(), None)
+        cache.add(CATALOG_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def catalog_updated_at() -> float:
+    """
+    Unix time of the last catalog change (or of the first version lookup, if
+    the cache was empty). Used for Last-Modified headers.
+    """
+    updated = cache.get(CATALOG_UPDATED_KEY)
+    if updated is None:
+        cache.add(CATALOG_UPDATED_KEY, time.time(), None)
+        updated = cache.get(CATALOG_UPDATED_KEY)
+    return updated
+
+
+def bump_catalog_version() -> str:
+    """
+    Marks the catalog as changed. Call after every write to Course or
+    PrerequisiteGroup nodes so snapshots and derived caches are rebuilt.
+    """
+    version = uuid.uuid4().hex
+    cache.set_many({CATALOG_VERSION_KEY: version, CATALOG_UPDATED_KEY: time.time()}, None)
+    return version
+
+
+def code_key(code: str) -> str:
+    """
+    Lookup key for a course code: "cs 210", "CS-210" and "CS210" all map to "CS210".
+    """
+    return "".join(ch for ch in (code or "").upper() if ch.isalnum())
+
+
+# ============================================================
+# SNAPSHOT
+# ============================================================
+class CatalogSnapshot:
+    """
+    Immutable, array-backed view of the course graph.
+
+    Courses are numbered 0..n-1 and groups 0..m-1. Adjacency is stored in CSR
+    form (a pointer array plus a flat index array):
+
+      course_groups[course_group_ptr[c]:course_group_ptr[c + 1]]  groups course c REQUIRES
+      group_members[group_ptr[g]:group_ptr[g + 1]]                courses group g HAS
+      member_of[member_of_ptr[c]:member_of_ptr[c + 1]]            groups that contain course c
+    """
+
+    def __init__(self, version: str, courses: List[Dict[str, Any]], groups: List[Dict[str, Any]]):
+        self.version = version
+        self.codes: List[str] = []
+        self.titles: List[str] = []
+        self.credits: List[Any] = []
+        self.levels: List[Any] = []
+        self.descriptions: List[str] = []
+        self.index: Dict[str, int] = {}
+
+        for row in courses:
+            key = code_key(row.get("code"))
+            if not key or key in self.index:
+                continue
+            self.index[key] = len(self.codes)
+            self.codes.append(row["code"])
+            self.titles.append(row.get("title") or "")
+            self.credits.append(row.get("credits"))
+            self.levels.append(row.get("level"))
+            self.descriptions.append(row.get("description") or "")
+
+        n = len(self.codes)
+        owned: List[List[int]] = [[] for _ in range(n)]
+        containing: List[List[int]] = [[] for _ in range(n)]
+
+        self.group_ids: List[Optional[str]] = []
+        self.group_types: List[str] = []
+        self.group_recommended: List[Optional[bool]] = []
+        self.group_owner = array("i")
+        self.group_ptr = array("i", [0])
+        self.group_members = array("i")
+
+        for row in groups:
+            owner = self.index.get(code_key(row.get("course")))
+            if owner is None:
+                continue
+            g = len(self.group_ids)
+            self.group_ids.append(row.get("id"))
+            self.group_types.append(row.get("type") or "CUSTOM")
+            self.group_recommended.append(row.get("recommended"))
+            self.group_owner.append(owner)
+            owned[owner].append(g)
+
+            seen = set()
+            for member_code in row.get("members") or []:
+                m = self.index.get(code_key(member_code))
+                if m is None or m in seen:
+                    continue
+                seen.add(m)
+                self.group_members.append(m)
+                containing[m].append(g)
+            self.group_ptr.append(len(self.group_members))
+
+        self.course_group_ptr, self.course_groups = _to_csr(owned)
+        self.member_of_ptr, self.member_of = _to_csr(containing)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __contains__(self, code: str) -> bool:
+        return code_key(code) in self.index
+
+    # -- raw adjacency ------------------------------------------------
+    def lookup(self, code: str) -> Optional[int]:
+        return self.index.get(code_key(code))
+
+    def groups_of(self, c: int) -> array:
+        return self.course_groups[self.course_group_ptr[c]:self.course_group_ptr[c + 1]]
+
+    def members_of(self, g: int) -> array:
+        return self.group_members[self.group_ptr[g]:self.group_ptr[g + 1]]
+
+    def groups_containing(self, c: int) -> array:
+        return self.member_of[self.member_of_ptr[c]:self.member_of_ptr[c + 1]]
+
+    # -- query helpers (same shapes as the Cypher helpers in bot/agent.py) --
+    def course_info(self, code: str) -> List[Dict[str, Any]]:
+        c = self.lookup(code)
+        if c is None:
+            return []
+        return [{
+            "code": self.codes[c],
+            "title": self.titles[c],
+            "credits": self.credits[c],
+            "level": self.levels[c],
+            "description": self.descriptions[c],
+        }]
+
+    def prereqs(self, code: str, depth: int = 3) -> Dict[str, Any]:
+        """
+        Walks REQUIRES/HAS breadth-first up to `depth` course hops. Each prerequisite
+        carries the type/recommended flag of the group it was first reached through
+        and the course that group belongs to (`required_by`).
+        """
+        c = self.lookup(code)
+        if c is None:
+            return {"target": {}, "prereqs": []}
+
+        target = {
+            "code": self.codes[c],
+            "title": self.titles[c],
+            "description": self.descriptions[c],
+        }
+
+        prereqs = []
+        seen = {c}
+        frontier = [c]
+        for _ in range(max(depth, 1)):
+            next_frontier = []
+            for course in frontier:
+                for g in self.groups_of(course):
+                    for p in self.members_of(g):
+                        if p in seen:
+                            continue
+                        seen.add(p)
+                        next_frontier.append(p)
+                        prereqs.append({
+                            "code": self.codes[p],
+                            "title": self.titles[p],
+                            "description": self.descriptions[p],
+                            "type": self.group_types[g],
+                            "recommended": bool(self.group_recommended[g]),
+                            "required_by": self.codes[course],
+                        })
+            if not next_frontier:
+                break
+            frontier = next_frontier
+
+        prereqs.sort(key=lambda p: (p["type"], p["code"]))
+        return {"target": target, "prereqs": prereqs}
+
+    def course_detail(self, code: str) -> Optional[Dict[str, Any]]:
+        """
+        Course info, its prerequisite groups, transitive prerequisites (up to five
+        hops) and successor courses; the shape of COURSE_DETAIL_QUERY in bot/agent.py.
+        """
+        c = self.lookup(code)
+        if c is None:
+            return None
+        detail = self.course_info(code)[0]
+        detail["groups"] = [
+            {
+                "type": self.group_types[g],
+                "recommended": self.group_recommended[g],
+                "courses": [self.codes[m] for m in self.members_of(g)],
+            }
+            for g in self.groups_of(c)
+        ]
+        detail["all_prereqs"] = [p["code"] for p in self.prereqs(code, depth=5)["prereqs"]]
+        detail["next_courses"] = self.successors(code)
+        return detail
+
+    def overview(self) -> List[Dict[str, Any]]:
+        """
+        Every course with its direct prerequisite codes, ordered by level then
+        code (courses without a level last); the shape of GRAPH_CONTEXT_QUERY.
+        """
+        order = sorted(
+            range(len(self.codes)),
+            key=lambda c: (self.levels[c] is None, self.levels[c] or 0, self.codes[c]),
+        )
+        return [self.overview_row(c) for c in order]
+
+    def overview_row(self, c: int) -> Dict[str, Any]:
+        prereqs = []
+        for g in self.groups_of(c):
+            for m in self.members_of(g):
+                if self.codes[m] not in prereqs:
+                    prereqs.append(self.codes[m])
+        return {
+            "code": self.codes[c],
+            "title": self.titles[c],
+            "level": self.levels[c],
+            "credits": self.credits[c],
+            "prereqs": prereqs,
+        }
+
+    def neighbourhood(self, c: int, depth: int = 1) -> List[int]:
+        """
+        Course c plus every course within `depth` prerequisite hops of it, in
+        either direction (what it builds on and what builds on it).
+        """
+        seen = {c}
+        frontier = [c]
+        for _ in range(depth):
+            next_frontier = []
+            for course in frontier:
+                neighbours = [m for g in self.groups_of(course) for m in self.members_of(g)]
+                neighbours += [self.group_owner[g] for g in self.groups_containing(course)]
+                for n in neighbours:
+                    if n not in seen:
+                        seen.add(n)
+                        next_frontier.append(n)
+            frontier = next_frontier
+        return sorted(seen)
+
+    def successors(self, code: str) -> List[Dict[str, Any]]:
+        c = self.lookup(code)
+        if c is None:
+            return []
+        owners = sorted({self.group_owner[g] for g in self.groups_containing(c)}, key=self.codes.__getitem__)
+        return [{"code": self.codes[n], "title": self.titles[n]} for n in owners]
+
+
+def _to_csr(lists: List[List[int]]):
+    ptr = array("i", [0])
+    flat = array("i")
+    for items in lists:
+        flat.extend(items)
+        ptr.append(len(flat))
+    return ptr, flat
+
+
+# ============================================================
+# VERSIONED ARTIFACTS
+# ============================================================
+class VersionedArtifact:
+    """
+    A value derived from the catalog that is rebuilt only when the catalog
+    version changes. `builder(version)` is called at most once per version per
+    process; if it fails, `get()` returns None so callers can fall back to Neo4j,
+    and keeps returning None for that version for `retry_after` seconds instead
+    of rebuilding on every call while the database is down.
+
+    With `shared=True` the built value is also stored in Django's cache under the
+    version, so only the first worker to see a new version pays for the build.
+    Shared values must be picklable.
+
+    `update(previous_value, version)`, if given, is tried first when a previous
+    version's value is in memory; it returns the new value derived from the old
+    one, or None to fall back to a full build.
+    """
+
+    def __init__(self, name: str, builder: Callable[[str], Any], shared: bool = False,
+                 update: Optional[Callable[[Any, str], Any]] = None,
+                 retry_after: float = ARTIFACT_RETRY_SECONDS):
+        self.name = name
+        self.builder = builder
+        self.shared = shared
+        self.update = update
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._value: Any = None
+        # (version, time.monotonic()) of the last failed build.
+        self._failed: Optional[Tuple[str, float]] = None
+        self.hits = 0
+        self.shared_hits = 0
+        self.builds = 0
+        self.updates = 0
+        self.failures = 0
+        self.last_build_seconds = 0.0
+
+    def get(self) -> Any:
+        version = catalog_version()
+        if self._version == version:
+            self.hits += 1
+            return self._value
+        if self._backing_off(version):
+            return None
+
+        with self._lock:
+            if self._version == version:
+                self.hits += 1
+                return self._value
+            if self._backing_off(version):
+                return None
+            value = self._load_shared(version)
+            if value is None:
+                value = self._build(version)
+                if value is None:
+                    self._failed = (version, time.monotonic())
+                    return None
+            self._value, self._version, self._failed = value, version, None
+            return value
+
+    def _backing_off(self, version: str) -> bool:
+        failed = self._failed
+        return failed is not None and failed[0] == version and time.monotonic() - failed[1] < self.retry_after
+
+    def _shared_key(self, version: str) -> str:
+        return f"courses:artifact:{self.name}:{version}"
+
+    def _load_shared(self, version: str) -> Any:
+        if not self.shared:
+            return None
+        try:
+            value = cache.get(self._shared_key(version))
+        except Exception:
+            logger.exception("Failed to read shared catalog artifact %r", self.name)
+            return None
+        if value is not None:
+            self.shared_hits += 1
+        return value
+
+    def _build(self, version: str) -> Any:
+        started = time.perf_counter()
+        value = self._update(version)
+        if value is not None:
+            self.last_build_seconds = time.perf_counter() - started
+            self.updates += 1
+            logger.info("Updated catalog artifact %r for version %s in %.3fs", self.name, version, self.last_build_seconds)
+            return value
+        try:
+            value = self.builder(version)
+        except Exception:
+            self.failures += 1
+            logger.exception("Failed to build catalog artifact %r", self.name)
+            return None
+        self.last_build_seconds = time.perf_counter() - started
+        self.builds += 1
+        logger.info("Built catalog artifact %r for version %s in %.3fs", self.name, version, self.last_build_seconds)
+        if self.shared:
+            # Versions never repeat, so stale entries only need to age out.
+            cache.set(self._shared_key(version), value, SHARED_ARTIFACT_TTL)
+        return value
+
+    def _update(self, version: str) -> Any:
+        if self.update is None or self._value is None:
+            return None
+        try:
+            return self.update(self._value, version)
+        except Exception:
+            logger.exception("Failed to update catalog artifact %r; rebuilding", self.name)
+            return None
+
+    def prime(self, value: Any, version: Optional[str] = None) -> None:
+        """
+        Installs a prebuilt value for `version` (default: the current one), e.g.
+        a synthetic snapshot for benchmarks.
+        """
+        with self._lock:
+            self._value, self._version, self._failed = value, version or catalog_version(), None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._version, self._value, self._failed = None, None, None
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.builds + self.updates + self.failures
+        return {
+            "name": self.name,
+            "version": self._version,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "builds": self.builds,
+            "updates": self.updates,
+            "failures": self.failures,
+            "hit_rate": (self.hits + self.shared_hits) / lookups if lookups else 0.0,
+            "last_build_seconds": self.last_build_seconds,
+        }
+
+
+def load_snapshot(version: str) -> CatalogSnapshot:
+    """
+    Reads every Course and PrerequisiteGroup in a single read transaction.
+    """
+    def read(tx):
+        courses = tx.run("""
+            MATCH (c:Course)
+            RETURN c.code AS code, c.title AS title, c.credits AS credits,
+                   c.level AS level, c.description AS description
+            ORDER BY c.code
+        """).data()
+        groups = tx.run("""
+            MATCH (c:Course)-[:REQUIRES]->(g:PrerequisiteGroup)
+            OPTIONAL MATCH (g)-[:HAS]->(p:Course)
+            RETURN c.code AS course, g.id AS id, g.type AS type,
+                   g.recommended AS recommended, collect(p.code) AS members
+        """).data()
+        return courses, groups
+
+    with get_driver().session() as session:
+        courses, groups = session.execute_read(read)
+    return CatalogSnapshot(version, courses, groups)
+
+
+snapshot_artifact = VersionedArtifact("snapshot", load_snapshot)
+
+
+def get_snapshot() -> Optional[CatalogSnapshot]:
+    """
+    Returns the current worker's catalog snapshot, reloading it if the catalog
+    version moved. Returns None when the graph cannot be read.
+    """
+    return snapshot_artifact.get()
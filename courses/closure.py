@@ -0,0 +1,253 @@
+"""
+Transitive prerequisite closure
+-------------------------------
+Materialises, for every course in a CatalogSnapshot, the full set of courses it
+builds on, so "everything needed before X" and "is X ever needed for Y" are bit
+lookups instead of a variable-length graph expansion.
+
+Sets are Python ints used as bitsets over the snapshot's course indices. Each
+course carries three of them:
+
+  ancestors   every course reachable through any prerequisite group
+  required    reachable through required (non-recommended) groups only
+  must        courses a student cannot avoid: every member of a required AND
+              group, and of a required OR/custom group only what all of its
+              options need
+
+plus `descendants`, the transpose of `ancestors`.
+
+When the catalog changes and the course list is unchanged (the usual case of a
+course's groups being edited), the new closure is derived from the previous one
+by recomputing only the edited courses and the courses that build on them.
+"""
+
+from functools import reduce
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from .catalog import CatalogSnapshot, VersionedArtifact, get_snapshot
+
+KINDS = ("all", "required", "must")
+
+
+def bit_indices(bits: int) -> List[int]:
+    """
+    Indices of the set bits, lowest first; O(number of set bits).
+    """
+    indices = []
+    while bits:
+        low = bits & -bits
+        indices.append(low.bit_length() - 1)
+        bits ^= low
+    return indices
+
+
+def group_signature(snapshot: CatalogSnapshot, c: int) -> Tuple:
+    """
+    Order-independent description of course c's prerequisite groups, used to
+    find the courses whose groups changed between two snapshots.
+    """
+    return tuple(sorted(
+        (snapshot.group_types[g], bool(snapshot.group_recommended[g]), tuple(sorted(snapshot.members_of(g))))
+        for g in snapshot.groups_of(c)
+    ))
+
+
+class PrerequisiteClosure:
+    """
+    Ancestor/descendant bitsets for one snapshot; see the module docstring.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot, previous: Optional["PrerequisiteClosure"] = None):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        n = len(snapshot)
+        self.signatures = [group_signature(snapshot, c) for c in range(n)]
+        self.updated_courses: Optional[int] = None
+
+        if previous is not None and previous.snapshot.codes == snapshot.codes:
+            self.ancestors = list(previous.ancestors)
+            self.required = list(previous.required)
+            self.must = list(previous.must)
+            self.descendants = list(previous.descendants)
+            changed = [c for c in range(n) if self.signatures[c] != previous.signatures[c]]
+            affected = set(changed)
+            for c in changed:
+                affected.update(bit_indices(previous.descendants[c]))
+            old = {c: previous.ancestors[c] for c in affected}
+            self._compute(affected)
+            for c in affected:
+                for p in bit_indices(old[c] ^ self.ancestors[c]):
+                    self.descendants[p] ^= 1 << c
+            self.updated_courses = len(affected)
+        else:
+            self.ancestors = [0] * n
+            self.required = [0] * n
+            self.must = [0] * n
+            self._compute(set(range(n)))
+            self.descendants = [0] * n
+            for c in range(n):
+                for p in bit_indices(self.ancestors[c]):
+                    self.descendants[p] |= 1 << c
+
+    def __len__(self) -> int:
+        return len(self.ancestors)
+
+    # -- construction ---------------------------------------------------
+    def _row(self, c: int) -> Tuple[int, int, int]:
+        snapshot = self.snapshot
+        ancestors = required = must = 0
+        for g in snapshot.groups_of(c):
+            members = snapshot.members_of(g)
+            if not len(members):
+                continue
+            for m in members:
+                ancestors |= (1 << m) | self.ancestors[m]
+            if snapshot.group_recommended[g]:
+                continue
+            for m in members:
+                required |= (1 << m) | self.required[m]
+            options = [(1 << m) | self.must[m] for m in members]
+            if snapshot.group_types[g].upper() == "AND":
+                must |= reduce(int.__or__, options)
+            else:
+                must |= reduce(int.__and__, options)
+        own = ~(1 << c)
+        return ancestors & own, required & own, must & own
+
+    def _compute(self, courses: Set[int]) -> None:
+        """
+        Recomputes the rows of `courses`, prerequisites first; rows outside
+        `courses` are taken as final. Courses on a prerequisite cycle are
+        iterated to a fixed point.
+        """
+        snapshot = self.snapshot
+        preds = {c: {m for g in snapshot.groups_of(c) for m in snapshot.members_of(g)} & courses for c in courses}
+        waiting = {c: len(p - {c}) for c, p in preds.items()}
+        succs: Dict[int, List[int]] = {c: [] for c in courses}
+        for c, p in preds.items():
+            for m in p - {c}:
+                succs[m].append(c)
+
+        ready = [c for c, count in waiting.items() if count == 0]
+        done = set()
+        while ready:
+            c = ready.pop()
+            done.add(c)
+            self.ancestors[c], self.required[c], self.must[c] = self._row(c)
+            for s in succs[c]:
+                waiting[s] -= 1
+                if waiting[s] == 0:
+                    ready.append(s)
+
+        cyclic = sorted(courses - done)
+        for c in cyclic:
+            self.ancestors[c] = self.required[c] = self.must[c] = 0
+        changed = bool(cyclic)
+        while changed:
+            changed = False
+            for c in cyclic:
+                row = self._row(c)
+                if row != (self.ancestors[c], self.required[c], self.must[c]):
+                    self.ancestors[c], self.required[c], self.must[c] = row
+                    changed = True
+
+    # -- lookups ----------------------------------------------------------
+    def _bits(self, c: int, kind: str) -> int:
+        if kind == "all":
+            return self.ancestors[c]
+        if kind == "required":
+            return self.required[c]
+        if kind == "must":
+            return self.must[c]
+        raise ValueError(f"unknown closure kind {kind!r}; expected one of {KINDS}")
+
+    def _codes(self, bits: int) -> List[str]:
+        return sorted(self.snapshot.codes[i] for i in bit_indices(bits))
+
+    def ancestors_of(self, code: str, kind: str = "all") -> List[str]:
+        """
+        Codes of every prerequisite of `code` (transitively), of the given kind.
+        """
+        c = self.snapshot.lookup(code)
+        return [] if c is None else self._codes(self._bits(c, kind))
+
+    def descendants_of(self, code: str) -> List[str]:
+        """
+        Codes of every course that builds on `code`, directly or indirectly.
+        """
+        c = self.snapshot.lookup(code)
+        return [] if c is None else self._codes(self.descendants[c])
+
+    def is_needed(self, prereq: str, course: str, kind: str = "all") -> bool:
+        """
+        Whether `prereq` is (transitively) a prerequisite of `course`; O(1).
+        """
+        p, c = self.snapshot.lookup(prereq), self.snapshot.lookup(course)
+        if p is None or c is None:
+            return False
+        return bool(self._bits(c, kind) >> p & 1)
+
+    def prereqs(self, code: str) -> Dict[str, Any]:
+        """
+        Every prerequisite of `code`, in the shape of CatalogSnapshot.prereqs.
+        Each one carries the group that links it to the target (or, for
+        indirect prerequisites, to the first course in the closure that
+        requires it) and whether it is on a required path / unavoidable.
+        """
+        snapshot = self.snapshot
+        c = snapshot.lookup(code)
+        if c is None:
+            return {"target": {}, "prereqs": []}
+
+        closure = self.ancestors[c] | (1 << c)
+        prereqs = []
+        for p in bit_indices(self.ancestors[c]):
+            links = [
+                (snapshot.group_owner[g] != c, snapshot.codes[snapshot.group_owner[g]], g)
+                for g in snapshot.groups_containing(p)
+                if closure >> snapshot.group_owner[g] & 1
+            ]
+            _, owner, g = min(links)
+            prereqs.append({
+                "code": snapshot.codes[p],
+                "title": snapshot.titles[p],
+                "description": snapshot.descriptions[p],
+                "type": snapshot.group_types[g],
+                "recommended": bool(snapshot.group_recommended[g]),
+                "required_by": owner,
+                "required": bool(self.required[c] >> p & 1),
+                "must": bool(self.must[c] >> p & 1),
+            })
+
+        prereqs.sort(key=lambda p: (p["type"], p["code"]))
+        target = {
+            "code": snapshot.codes[c],
+            "title": snapshot.titles[c],
+            "description": snapshot.descriptions[c],
+        }
+        return {"target": target, "prereqs": prereqs}
+
+
+def build_closure(version: str) -> PrerequisiteClosure:
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise RuntimeError("catalog snapshot unavailable")
+    return PrerequisiteClosure(snapshot)
+
+
+def update_closure(previous: PrerequisiteClosure, version: str) -> Optional[PrerequisiteClosure]:
+    snapshot = get_snapshot()
+    if snapshot is None or snapshot.codes != previous.snapshot.codes:
+        return None
+    return PrerequisiteClosure(snapshot, previous)
+
+
+# Holds its snapshot, so it stays per-process rather than shared.
+closure_artifact = VersionedArtifact("closure", build_closure, update=update_closure)
+
+
+def get_closure() -> Optional[PrerequisiteClosure]:
+    """
+    The closure for the current catalog version, or None when the graph cannot be read.
+    """
+    return closure_artifact.get()
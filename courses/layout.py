@@ -0,0 +1,154 @@
+"""
+Layered layout of the prerequisite graph
+----------------------------------------
+Computes fixed node coordinates for the course graph page once per catalog
+version, so the browser draws the graph without running physics.
+
+Courses are placed in layers by prerequisite depth (a course sits one layer
+below its deepest prerequisite), ordered within each layer by repeated
+barycenter sweeps to reduce edge crossings, and wide layers are wrapped over
+several rows. The result is cached in-process and in Django's cache.
+"""
+
+from typing import Dict, List, Sequence
+
+from .catalog import CatalogSnapshot, VersionedArtifact, get_snapshot
+
+X_SPACING = 180
+Y_SPACING = 120
+ROW_GAP = 70
+MAX_ROW_WIDTH = 40
+SWEEPS = 4
+
+
+def prerequisite_lists(snapshot: CatalogSnapshot):
+    """
+    (preds, succs): for each course, the distinct courses it requires and the
+    courses that require it.
+    """
+    n = len(snapshot)
+    preds: List[List[int]] = []
+    succs: List[List[int]] = [[] for _ in range(n)]
+    for c in range(n):
+        direct = sorted({m for g in snapshot.groups_of(c) for m in snapshot.members_of(g)} - {c})
+        preds.append(direct)
+        for p in direct:
+            succs[p].append(c)
+    return preds, succs
+
+
+def assign_layers(preds: Sequence[Sequence[int]], succs: Sequence[Sequence[int]]) -> List[int]:
+    """
+    Longest-path layering (Kahn's algorithm). Courses caught in a prerequisite
+    cycle go one layer below their deepest prerequisite outside the cycle.
+    """
+    n = len(preds)
+    layer = [0] * n
+    remaining = [len(p) for p in preds]
+    queue = [c for c in range(n) if remaining[c] == 0]
+    placed = [False] * n
+    while queue:
+        c = queue.pop()
+        placed[c] = True
+        for s in succs[c]:
+            layer[s] = max(layer[s], layer[c] + 1)
+            remaining[s] -= 1
+            if remaining[s] == 0:
+                queue.append(s)
+
+    for c in range(n):
+        if not placed[c]:
+            layer[c] = max((layer[p] + 1 for p in preds[c] if placed[p]), default=0)
+    return layer
+
+
+def order_layers(layers: List[List[int]], layer: Sequence[int], preds, succs, sweeps: int = SWEEPS) -> None:
+    """
+    Barycenter crossing reduction, in place: alternately sweeps down (ordering
+    each layer by the mean position of its prerequisites) and up (by the mean
+    position of its successors). Positions are normalised to [0, 1] so layers
+    of different widths compare.
+    """
+    position = [0.0] * len(layer)
+
+    def index(rows):
+        for row in rows:
+            scale = max(len(row) - 1, 1)
+            for i, c in enumerate(row):
+                position[c] = i / scale
+
+    def reorder(row, neighbours, before):
+        def barycenter(c):
+            linked = [position[n] for n in neighbours[c] if before(layer[n])]
+            return sum(linked) / len(linked) if linked else position[c]
+        row.sort(key=barycenter)
+
+    index(layers)
+    for _ in range(sweeps):
+        for depth in range(1, len(layers)):
+            reorder(layers[depth], preds, lambda d, depth=depth: d < depth)
+            index([layers[depth]])
+        for depth in range(len(layers) - 2, -1, -1):
+            reorder(layers[depth], succs, lambda d, depth=depth: d > depth)
+            index([layers[depth]])
+
+
+def count_crossings(layers: List[List[int]], preds) -> int:
+    """
+    Crossings between edges joining adjacent layers (for tests and tuning).
+    """
+    slot = {}
+    for row in layers:
+        for i, c in enumerate(row):
+            slot[c] = i
+    crossings = 0
+    for depth in range(1, len(layers)):
+        upper = set(layers[depth - 1])
+        edges = [(slot[p], slot[c]) for c in layers[depth] for p in preds[c] if p in upper]
+        for i, (a1, b1) in enumerate(edges):
+            for a2, b2 in edges[i + 1:]:
+                if (a1 - a2) * (b1 - b2) < 0:
+                    crossings += 1
+    return crossings
+
+
+def compute_layout(snapshot: CatalogSnapshot, max_row_width: int = MAX_ROW_WIDTH) -> Dict[str, Dict[str, int]]:
+    """
+    {course code: {"x", "y", "layer"}} for every course in the snapshot.
+    """
+    preds, succs = prerequisite_lists(snapshot)
+    layer = assign_layers(preds, succs)
+
+    layers: List[List[int]] = [[] for _ in range(max(layer, default=-1) + 1)]
+    for c in sorted(range(len(snapshot)), key=snapshot.codes.__getitem__):
+        layers[layer[c]].append(c)
+    order_layers(layers, layer, preds, succs)
+
+    positions = {}
+    y = 0
+    for depth, row in enumerate(layers):
+        for start in range(0, len(row), max_row_width):
+            chunk = row[start:start + max_row_width]
+            offset = (len(chunk) - 1) / 2
+            for i, c in enumerate(chunk):
+                positions[snapshot.codes[c]] = {"x": round((i - offset) * X_SPACING), "y": y, "layer": depth}
+            y += ROW_GAP
+        y += Y_SPACING - ROW_GAP
+    return positions
+
+
+def build_layout(version: str) -> Dict[str, Dict[str, int]]:
+    snapshot = get_snapshot()
+    if snapshot is None:
+        raise RuntimeError("catalog snapshot unavailable")
+    return compute_layout(snapshot)
+
+
+layout_artifact = VersionedArtifact("layout", build_layout, shared=True)
+
+
+def get_layout() -> Dict[str, Dict[str, int]]:
+    """
+    Node positions for the current catalog version; empty if they cannot be built.
+    """
+    return layout_artifact.get() or {}
@@ -0,0 +1,87 @@
+"""
+manage.py ensure_schema [--skip-verify] [--strict]
+
+Creates the uniqueness constraints on Course.code and PrerequisiteGroup.id and
+the course_text full-text index (all IF NOT EXISTS, so safe to run on every
+deploy), then checks with PROFILE/EXPLAIN that the bot's and the course
+views' hot queries are planned as index seeks.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from CourseCompass.neo4j_driver import get_driver
+from courses import writes
+from courses.schema import apply_schema, check_plan, duplicates, profile
+
+
+def hot_queries(code: str, group_id: str):
+    """
+    (name, query, params, execute) for every query that anchors on a course
+    code or group id. Writes are only EXPLAINed.
+    """
+    from bot import agent
+
+    queries = [
+        ("course_info", agent.COURSE_INFO_QUERY, {"code": code}, True),
+        ("prereqs_full", agent.PREREQS_FULL_QUERY.format(depth=3), {"code": code}, True),
+        ("next_after", agent.NEXT_AFTER_QUERY, {"code": code}, True),
+        ("course_detail", agent.COURSE_DETAIL_QUERY, {"code": code}, True),
+        ("missing_codes", writes.MISSING_CODES_QUERY, {"codes": [code]}, True),
+    ]
+    rows = [{"code": code, "course": code, "id": group_id, "group": group_id, "prereq": code,
+             "keep": [group_id], "title": "", "credits": 0, "level": 0, "description": "",
+             "type": "AND", "recommended": False}]
+    queries += [
+        ("write_courses", writes.WRITE_COURSES_QUERY, {"rows": rows}, False),
+        ("delete_stale_groups", writes.DELETE_STALE_GROUPS_QUERY, {"rows": rows}, False),
+        ("write_groups", writes.WRITE_GROUPS_QUERY, {"rows": rows}, False),
+        ("write_edges", writes.WRITE_EDGES_QUERY, {"rows": rows}, False),
+    ]
+    return queries
+
+
+class Command(BaseCommand):
+    help = "Create Neo4j constraints/indexes for the course graph and verify the hot queries use them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--skip-verify", action="store_true", help="Only create the schema")
+        parser.add_argument("--strict", action="store_true", help="Fail if a hot query does not use an index seek")
+
+    def handle(self, *args, **options):
+        with get_driver().session() as session:
+            found = duplicates(session)
+            if found:
+                for name, info in found.items():
+                    self.stderr.write(f"{info['total']} duplicate {name} values, e.g. {', '.join(map(str, info['keys']))}")
+                raise CommandError("Remove the duplicates above before the uniqueness constraints can be created.")
+
+            for name in apply_schema(session):
+                self.stdout.write(f"ensured {name}")
+
+            if options["skip_verify"]:
+                return
+            self.verify(session, options["strict"])
+
+    def verify(self, session, strict: bool):
+        record = session.run("""
+            MATCH (c:Course)
+            OPTIONAL MATCH (c)-[:REQUIRES]->(g:PrerequisiteGroup)
+            RETURN c.code AS code, g.id AS group_id LIMIT 1
+        """).single()
+        if record is None:
+            self.stdout.write("No courses in the graph yet; skipping query plan verification.")
+            return
+
+        failures = []
+        for name, query, params, execute in hot_queries(record["code"], record["group_id"] or ""):
+            problem = check_plan(profile(session, query, params, execute))
+            if problem:
+                failures.append(name)
+                self.stderr.write(f"{name}: {problem}")
+            else:
+                self.stdout.write(f"{name}: index seek")
+
+        if failures and strict:
+            raise CommandError(f"{len(failures)} hot queries are not using an index seek.")
+        if not failures:
+            self.stdout.write(self.style.SUCCESS("All hot queries use index seeks."))
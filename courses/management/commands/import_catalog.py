@@ -0,0 +1,254 @@
+"""
+manage.py import_catalog <file> [--format csv|jsonl] [--batch-size N] [--dry-run]
+
+Bulk-loads courses and their prerequisite groups with batched UNWIND writes.
+
+JSONL: one object per line with code, title, credits, level, description and
+optional "required", "recommended", "custom" lists of {"type", "courses"}
+groups (a plain list of codes is read as a group of the kind's default type).
+
+CSV: columns code, title, credits, level, description, required, recommended,
+custom. A group column holds groups separated by ";", each written as
+"TYPE:CODE,CODE" (the type may be left out for required = AND and
+recommended = OR; custom groups need one).
+
+The file is read three times (validate, courses, groups) so memory stays flat
+for large catalogs. Re-running an import is idempotent.
+"""
+
+import csv
+import json
+import time
+from typing import Any, Dict, Iterator, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from CourseCompass.neo4j_driver import get_driver
+from courses.catalog import bump_catalog_version
+from courses.writes import (
+    DEFAULT_GROUP_TYPES, GROUP_KINDS, build_groups, missing_codes, normalize_code,
+    write_courses, write_groups,
+)
+
+MAX_REPORTED_ERRORS = 20
+
+
+def iter_raw(path: str, fmt: str) -> Iterator[Tuple[int, Any]]:
+    """
+    Yields (line number, record dict) pairs; a line that cannot be decoded
+    yields the exception instead of a dict.
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        if fmt == "csv":
+            reader = csv.DictReader(handle)
+            for row in reader:
+                yield reader.line_num, row
+            return
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+
+
+def parse_groups(value: Any, kind: str) -> List[Dict[str, Any]]:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.split(";") if part.strip()]
+
+    groups = []
+    for item in value:
+        if isinstance(item, dict):
+            group_type, courses = item.get("type") or DEFAULT_GROUP_TYPES[kind], item.get("courses") or []
+        elif isinstance(item, list):
+            group_type, courses = DEFAULT_GROUP_TYPES[kind], item
+        else:
+            group_type, _, codes = item.rpartition(":")
+            group_type = group_type.strip() or DEFAULT_GROUP_TYPES[kind]
+            courses = codes.split(",")
+        courses = [normalize_code(str(c)) for c in courses if str(c).strip()]
+        if not group_type:
+            raise ValueError(f"{kind} group {courses} needs a type")
+        if courses:
+            if kind != "custom":
+                group_type = group_type.upper()
+            groups.append({"type": group_type, "courses": courses})
+    return groups
+
+
+def parse_record(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validates one input record and returns the course row plus its groups.
+    Raises ValueError with a readable message.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("record is not an object")
+    code = normalize_code(str(raw.get("code") or ""))
+    title = str(raw.get("title") or "").strip()
+    if not code:
+        raise ValueError("missing code")
+    if not title:
+        raise ValueError(f"{code}: missing title")
+    try:
+        credits = int(raw.get("credits"))
+        level = int(raw.get("level"))
+    except (TypeError, ValueError):
+        raise ValueError(f"{code}: credits and level must be integers")
+
+    record = {
+        "course": {
+            "code": code,
+            "title": title,
+            "credits": credits,
+            "level": level,
+            "description": str(raw.get("description") or "").strip(),
+        },
+    }
+    for kind in GROUP_KINDS:
+        try:
+            record[kind] = parse_groups(raw.get(kind), kind)
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"{code}: {e}")
+    if any(code in group["courses"] for kind in GROUP_KINDS for group in record[kind]):
+        raise ValueError(f"{code}: a course cannot be its own prerequisite")
+    return record
+
+
+def iter_records(path: str, fmt: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Yields (line number, parsed record), skipping invalid lines (validate first).
+    """
+    for line_no, raw in iter_raw(path, fmt):
+        if isinstance(raw, Exception):
+            continue
+        try:
+            yield line_no, parse_record(raw)
+        except ValueError:
+            continue
+
+
+def batched(items: Iterator, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = "Bulk import courses and prerequisite groups from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file to import")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=500, help="Courses per write transaction")
+        parser.add_argument("--dry-run", action="store_true", help="Validate only; write nothing")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("csv" if path.lower().endswith(".csv") else "jsonl")
+        batch_size = max(options["batch_size"], 1)
+
+        started = time.perf_counter()
+        summary = self.validate(path, fmt)
+        self.stdout.write(
+            f"Validated {summary['courses']} courses, {summary['groups']} groups, "
+            f"{summary['edges']} prerequisite edges in {time.perf_counter() - started:.2f}s"
+        )
+        if options["dry_run"]:
+            self.stdout.write(self.style.SUCCESS("Dry run: nothing written."))
+            return
+
+        try:
+            with get_driver().session() as session:
+                started = time.perf_counter()
+                written = 0
+                for batch in batched((r["course"] for _, r in iter_records(path, fmt)), batch_size):
+                    written += session.execute_write(write_courses, batch)
+                self.report("courses", written, time.perf_counter() - started)
+
+                started = time.perf_counter()
+                totals = {"groups": 0, "edges": 0, "deleted": 0}
+                for batch in batched((r for _, r in iter_records(path, fmt)), batch_size):
+                    codes = [r["course"]["code"] for r in batch]
+                    groups = [
+                        group
+                        for r in batch
+                        for group in build_groups(r["course"]["code"], r["required"], r["recommended"], r["custom"])
+                    ]
+                    counts = session.execute_write(write_groups, codes, groups)
+                    for key in totals:
+                        totals[key] += counts[key]
+                elapsed = time.perf_counter() - started
+                self.report("groups", totals["groups"], elapsed)
+                self.report("prerequisite edges", totals["edges"], elapsed)
+                if totals["deleted"]:
+                    self.stdout.write(f"Removed {totals['deleted']} stale prerequisite groups")
+        finally:
+            # Even a partial import changed the graph.
+            bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS("Import complete."))
+
+    def validate(self, path: str, fmt: str) -> Dict[str, int]:
+        """
+        Checks every record and that each prerequisite exists in the file or the
+        graph. Raises CommandError listing the problems; writes nothing.
+        """
+        errors = []
+        seen: Dict[str, int] = {}
+        referenced = set()
+        summary = {"courses": 0, "groups": 0, "edges": 0}
+
+        try:
+            for line_no, raw in iter_raw(path, fmt):
+                if isinstance(raw, Exception):
+                    errors.append((line_no, f"invalid JSON: {raw}"))
+                    continue
+                try:
+                    record = parse_record(raw)
+                except ValueError as e:
+                    errors.append((line_no, str(e)))
+                    continue
+                code = record["course"]["code"]
+                if code in seen:
+                    errors.append((line_no, f"{code}: duplicate of line {seen[code]}"))
+                    continue
+                seen[code] = line_no
+                summary["courses"] += 1
+                for kind in GROUP_KINDS:
+                    for group in record[kind]:
+                        summary["groups"] += 1
+                        summary["edges"] += len(group["courses"])
+                        referenced.update(group["courses"])
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            raise CommandError(f"Cannot read {path}: {e}")
+
+        outside = referenced - seen.keys()
+        if outside:
+            try:
+                with get_driver().session() as session:
+                    missing = session.execute_read(missing_codes, outside)
+            except Exception as e:
+                raise CommandError(f"Cannot check prerequisites against the graph: {e}")
+            if missing:
+                errors.append((0, f"prerequisites not in the file or the graph: {', '.join(missing)}"))
+
+        if errors:
+            for line_no, message in errors[:MAX_REPORTED_ERRORS]:
+                where = f"line {line_no}: " if line_no else ""
+                self.stderr.write(f"{where}{message}")
+            if len(errors) > MAX_REPORTED_ERRORS:
+                self.stderr.write(f"... and {len(errors) - MAX_REPORTED_ERRORS} more")
+            raise CommandError(f"{len(errors)} problem(s) found; nothing was written.")
+        return summary
+
+    def report(self, label: str, count: int, seconds: float) -> None:
+        rate = count / seconds if seconds > 0 else float("inf")
+        self.stdout.write(f"Wrote {count} {label} in {seconds:.2f}s ({rate:,.0f}/s)")
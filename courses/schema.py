@@ -0,0 +1,101 @@
+"""
+Neo4j schema bootstrap
+----------------------
+Constraints and indexes the catalog queries rely on (see docs/schema.md), and
+a check that the hot queries are planned as index seeks rather than label
+scans. Used by `manage.py ensure_schema`.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+SCHEMA_STATEMENTS = [
+    # Uniqueness constraints also create the range indexes used for seeks.
+    ("course_code_unique",
+     "CREATE CONSTRAINT course_code_unique IF NOT EXISTS "
+     "FOR (c:Course) REQUIRE c.code IS UNIQUE"),
+    ("prerequisite_group_id_unique",
+     "CREATE CONSTRAINT prerequisite_group_id_unique IF NOT EXISTS "
+     "FOR (g:PrerequisiteGroup) REQUIRE g.id IS UNIQUE"),
+    ("course_text",
+     "CREATE FULLTEXT INDEX course_text IF NOT EXISTS "
+     "FOR (c:Course) ON EACH [c.title, c.description]"),
+]
+
+# Constraint creation fails on existing duplicates; find them first.
+DUPLICATE_QUERIES = {
+    "Course.code": """
+        MATCH (c:Course) WITH c.code AS key, count(*) AS n WHERE n > 1
+        RETURN collect(key)[..10] AS keys, count(key) AS total
+    """,
+    "PrerequisiteGroup.id": """
+        MATCH (g:PrerequisiteGroup) WITH g.id AS key, count(*) AS n WHERE n > 1
+        RETURN collect(key)[..10] AS keys, count(key) AS total
+    """,
+}
+
+SEEK_OPERATORS = {
+    "NodeUniqueIndexSeek", "NodeIndexSeek", "MultiNodeIndexSeek",
+    "NodeUniqueIndexSeekByRange", "NodeIndexSeekByRange",
+}
+SCAN_OPERATORS = {"NodeByLabelScan", "AllNodesScan", "NodeIndexScan"}
+
+
+def duplicates(session) -> Dict[str, Dict[str, Any]]:
+    """
+    {property: {"keys": [...up to 10], "total": n}} for properties that hold
+    duplicate values and would block their uniqueness constraint.
+    """
+    found = {}
+    for name, query in DUPLICATE_QUERIES.items():
+        record = session.run(query).single()
+        if record and record["total"]:
+            found[name] = {"keys": record["keys"], "total": record["total"]}
+    return found
+
+
+def apply_schema(session) -> List[str]:
+    """
+    Runs every schema statement (all are IF NOT EXISTS) and waits for the
+    indexes to come online. Returns the names of the statements applied.
+    """
+    applied = []
+    for name, statement in SCHEMA_STATEMENTS:
+        session.run(statement).consume()
+        applied.append(name)
+    session.run("CALL db.awaitIndexes(300)").consume()
+    return applied
+
+
+def plan_operators(plan: Optional[Dict[str, Any]]) -> Set[str]:
+    """
+    Operator names in a PROFILE/EXPLAIN plan tree, without the "@neo4j" suffix.
+    """
+    if not plan:
+        return set()
+    operators = {plan.get("operatorType", "").split("@")[0]}
+    for child in plan.get("children") or []:
+        operators |= plan_operators(child)
+    return operators
+
+
+def check_plan(operators: Iterable[str]) -> Optional[str]:
+    """
+    None when the plan seeks an index and scans no labels, else the reason.
+    """
+    operators = set(operators)
+    scans = operators & SCAN_OPERATORS
+    if scans:
+        return f"uses {', '.join(sorted(scans))}"
+    if not operators & SEEK_OPERATORS:
+        return "no index seek"
+    return None
+
+
+def profile(session, query: str, params: Dict[str, Any], execute: bool = True) -> Set[str]:
+    """
+    Plan operators for `query`. PROFILE runs it (reads only); EXPLAIN plans
+    without executing, which is what write queries need.
+    """
+    prefix = "PROFILE" if execute else "EXPLAIN"
+    summary = session.run(f"{prefix} {query}", params).consume()
+    return plan_operators(summary.profile if execute else summary.plan)
@@ -1,3 +1,286 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from .catalog import CatalogSnapshot, VersionedArtifact
+from .closure import PrerequisiteClosure
+from .management.commands.import_catalog import parse_record
+from .layout import assign_layers, compute_layout, count_crossings, order_layers, prerequisite_lists
+from .schema import check_plan, plan_operators
+from .writes import build_groups
+
+
+SAMPLE_COURSES = [
+    {"code": "CS 110", "title": "Intro to Programming", "credits": 3, "level": 100, "description": ""},
+    {"code": "CS 115", "title": "Object Oriented Programming", "credits": 3, "level": 100, "description": ""},
+    {"code": "CS 210", "title": "Data Structures", "credits": 3, "level": 200, "description": ""},
+    {"code": "CS 215", "title": "Web and Database Programming", "credits": 3, "level": 200, "description": ""},
+    {"code": "MATH 103", "title": "Applied Calculus I", "credits": 3, "level": 100, "description": ""},
+]
+
+SAMPLE_GROUPS = [
+    {"course": "CS 115", "id": "g1", "type": "AND", "recommended": False, "members": ["CS 110"]},
+    {"course": "CS 210", "id": "g2", "type": "AND", "recommended": False, "members": ["CS 115"]},
+    {"course": "CS 210", "id": "g3", "type": "OR", "recommended": True, "members": ["MATH 103"]},
+    {"course": "CS 215", "id": "g4", "type": "AND", "recommended": False, "members": ["CS 210"]},
+]
+
+
+class CatalogSnapshotTests(SimpleTestCase):
+    def setUp(self):
+        self.snapshot = CatalogSnapshot("v1", SAMPLE_COURSES, SAMPLE_GROUPS)
+
+    def test_lookup_ignores_spacing_and_case(self):
+        self.assertIn("cs210", self.snapshot)
+        self.assertEqual(self.snapshot.course_info("CS-210")[0]["code"], "CS 210")
+        self.assertEqual(self.snapshot.course_info("CS 999"), [])
+
+    def test_direct_prereqs_keep_group_flags(self):
+        data = self.snapshot.prereqs("CS 210", depth=1)
+        self.assertEqual(data["target"]["code"], "CS 210")
+        by_code = {p["code"]: p for p in data["prereqs"]}
+        self.assertEqual(set(by_code), {"CS 115", "MATH 103"})
+        self.assertEqual(by_code["MATH 103"]["type"], "OR")
+        self.assertTrue(by_code["MATH 103"]["recommended"])
+        self.assertFalse(by_code["CS 115"]["recommended"])
+
+    def test_transitive_prereqs_follow_depth(self):
+        codes = {p["code"] for p in self.snapshot.prereqs("CS 215", depth=5)["prereqs"]}
+        self.assertEqual(codes, {"CS 210", "CS 115", "MATH 103", "CS 110"})
+
+    def test_successors_use_reverse_adjacency(self):
+        self.assertEqual([r["code"] for r in self.snapshot.successors("CS 115")], ["CS 210"])
+        self.assertEqual(self.snapshot.successors("CS 215"), [])
+
+    def test_course_detail_combines_groups_and_successors(self):
+        detail = self.snapshot.course_detail("CS 210")
+        self.assertEqual(detail["title"], "Data Structures")
+        self.assertEqual(
+            sorted((g["type"], g["recommended"], tuple(g["courses"])) for g in detail["groups"]),
+            [("AND", False, ("CS 115",)), ("OR", True, ("MATH 103",))],
+        )
+        self.assertEqual(sorted(detail["all_prereqs"]), ["CS 110", "CS 115", "MATH 103"])
+        self.assertEqual([n["code"] for n in detail["next_courses"]], ["CS 215"])
+        self.assertIsNone(self.snapshot.course_detail("CS 999"))
+
+    def test_overview_lists_direct_prereqs_by_level(self):
+        rows = self.snapshot.overview()
+        self.assertEqual([r["code"] for r in rows], ["CS 110", "CS 115", "MATH 103", "CS 210", "CS 215"])
+        by_code = {r["code"]: r["prereqs"] for r in rows}
+        self.assertEqual(by_code["CS 210"], ["CS 115", "MATH 103"])
+        self.assertEqual(by_code["CS 110"], [])
+
+
+class VersionedArtifactTests(SimpleTestCase):
+    def test_rebuilds_only_when_version_changes(self):
+        builds = []
+        artifact = VersionedArtifact("test", lambda version: builds.append(version) or version)
+        with mock.patch("courses.catalog.catalog_version", return_value="v1"):
+            self.assertEqual(artifact.get(), "v1")
+            self.assertEqual(artifact.get(), "v1")
+        with mock.patch("courses.catalog.catalog_version", return_value="v2"):
+            self.assertEqual(artifact.get(), "v2")
+        self.assertEqual(builds, ["v1", "v2"])
+        stats = artifact.stats()
+        self.assertEqual((stats["hits"], stats["builds"]), (1, 2))
+        self.assertAlmostEqual(stats["hit_rate"], 1 / 3)
+
+    def test_update_derives_from_previous_value(self):
+        artifact = VersionedArtifact("test", lambda version: [version],
+                                     update=lambda previous, version: previous + [version])
+        with mock.patch("courses.catalog.catalog_version", return_value="v1"):
+            self.assertEqual(artifact.get(), ["v1"])
+        with mock.patch("courses.catalog.catalog_version", return_value="v2"):
+            self.assertEqual(artifact.get(), ["v1", "v2"])
+        self.assertEqual((artifact.stats()["builds"], artifact.stats()["updates"]), (1, 1))
+
+    def test_failed_build_is_not_retried_on_every_call(self):
+        calls = []
+
+        def failing(version):
+            calls.append(version)
+            raise RuntimeError("neo4j down")
+
+        artifact = VersionedArtifact("test", failing, retry_after=60)
+        with mock.patch("courses.catalog.catalog_version", return_value="v1"):
+            self.assertIsNone(artifact.get())
+            self.assertIsNone(artifact.get())
+            self.assertEqual(calls, ["v1"])
+            with mock.patch("courses.catalog.time.monotonic", return_value=time.monotonic() + 61):
+                self.assertIsNone(artifact.get())
+            self.assertEqual(calls, ["v1", "v1"])
+        with mock.patch("courses.catalog.catalog_version", return_value="v2"):
+            self.assertIsNone(artifact.get())
+        self.assertEqual(calls, ["v1", "v1", "v2"])
+        self.assertEqual(artifact.stats()["failures"], 3)
+
+
+class PrerequisiteClosureTests(SimpleTestCase):
+    def setUp(self):
+        self.closure = PrerequisiteClosure(CatalogSnapshot("v1", SAMPLE_COURSES, SAMPLE_GROUPS))
+
+    def test_ancestor_kinds(self):
+        self.assertEqual(self.closure.ancestors_of("CS 215"), ["CS 110", "CS 115", "CS 210", "MATH 103"])
+        self.assertEqual(self.closure.ancestors_of("CS 215", "required"), ["CS 110", "CS 115", "CS 210"])
+        self.assertEqual(self.closure.descendants_of("CS 110"), ["CS 115", "CS 210", "CS 215"])
+        self.assertTrue(self.closure.is_needed("cs110", "CS 215", "must"))
+        self.assertFalse(self.closure.is_needed("MATH 103", "CS 215", "required"))
+        self.assertFalse(self.closure.is_needed("CS 215", "CS 110"))
+
+    def test_or_groups_only_force_shared_prerequisites(self):
+        groups = SAMPLE_GROUPS + [
+            {"course": "CS 215", "id": "g5", "type": "OR", "recommended": False, "members": ["CS 115", "MATH 103"]},
+        ]
+        closure = PrerequisiteClosure(CatalogSnapshot("v1", SAMPLE_COURSES, groups))
+        self.assertEqual(closure.ancestors_of("CS 215", "must"), ["CS 110", "CS 115", "CS 210"])
+        self.assertEqual(closure.ancestors_of("CS 215", "required"), ["CS 110", "CS 115", "CS 210", "MATH 103"])
+
+    def test_prereqs_match_snapshot_shape(self):
+        data = self.closure.prereqs("CS 215")
+        by_code = {p["code"]: p for p in data["prereqs"]}
+        self.assertEqual(data["target"]["code"], "CS 215")
+        self.assertEqual(by_code["CS 210"]["required_by"], "CS 215")
+        self.assertEqual(by_code["MATH 103"]["required_by"], "CS 210")
+        self.assertTrue(by_code["MATH 103"]["recommended"])
+        self.assertFalse(by_code["MATH 103"]["must"])
+
+    def test_incremental_update_matches_full_build(self):
+        groups = [g for g in SAMPLE_GROUPS if g["id"] != "g2"] + [
+            {"course": "CS 210", "id": "g6", "type": "AND", "recommended": False, "members": ["MATH 103"]},
+        ]
+        snapshot = CatalogSnapshot("v2", SAMPLE_COURSES, groups)
+        updated = PrerequisiteClosure(snapshot, previous=self.closure)
+        rebuilt = PrerequisiteClosure(snapshot)
+        self.assertEqual(updated.updated_courses, 2)
+        for attr in ("ancestors", "required", "must", "descendants"):
+            self.assertEqual(getattr(updated, attr), getattr(rebuilt, attr))
+        self.assertEqual(updated.descendants_of("CS 110"), ["CS 115"])
+
+    def test_cycles_terminate(self):
+        groups = SAMPLE_GROUPS + [
+            {"course": "CS 110", "id": "g7", "type": "AND", "recommended": False, "members": ["CS 210"]},
+        ]
+        closure = PrerequisiteClosure(CatalogSnapshot("v1", SAMPLE_COURSES, groups))
+        self.assertEqual(closure.ancestors_of("CS 110", "must"), ["CS 115", "CS 210"])
+        self.assertIn("CS 110", closure.ancestors_of("CS 215"))
+
+
+class CatalogImportParsingTests(SimpleTestCase):
+    def test_csv_group_syntax(self):
+        record = parse_record({
+            "code": "cs 215", "title": "Web and Database Programming", "credits": "3", "level": "200",
+            "required": "CS 210", "recommended": "math 103, MATH 104", "custom": "",
+        })
+        self.assertEqual(record["course"]["code"], "CS 215")
+        self.assertEqual(record["required"], [{"type": "AND", "courses": ["CS 210"]}])
+        self.assertEqual(record["recommended"], [{"type": "OR", "courses": ["MATH 103", "MATH 104"]}])
+
+    def test_jsonl_groups_and_errors(self):
+        record = parse_record({
+            "code": "CS 210", "title": "Data Structures", "credits": 3, "level": 200,
+            "required": [{"type": "and", "courses": ["CS 115"]}], "custom": ["2 of:CS 110,CS 115"],
+        })
+        self.assertEqual(record["required"], [{"type": "AND", "courses": ["CS 115"]}])
+        self.assertEqual(record["custom"], [{"type": "2 of", "courses": ["CS 110", "CS 115"]}])
+
+        for bad in ({"title": "x", "credits": 3, "level": 100},
+                    {"code": "CS 1", "title": "x", "credits": "three", "level": 100},
+                    {"code": "CS 1", "title": "x", "credits": 3, "level": 100, "custom": "CS 2"},
+                    {"code": "CS 1", "title": "x", "credits": 3, "level": 100, "required": "CS 1"}):
+            with self.assertRaises(ValueError):
+                parse_record(bad)
+
+    def test_group_ids_are_deterministic(self):
+        first = build_groups("CS 210", required=[{"type": "AND", "courses": ["CS 115", "cs 110"]}])
+        again = build_groups("CS 210", required=[{"type": "AND", "courses": ["CS 110", "CS 115"]}])
+        self.assertEqual(first[0]["id"], again[0]["id"])
+        other = build_groups("CS 210", recommended=[{"type": "AND", "courses": ["CS 110", "CS 115"]}])
+        self.assertNotEqual(first[0]["id"], other[0]["id"])
+
+
+class CourseFormGroupsTests(SimpleTestCase):
+    def test_parse_groups_reads_each_kind(self):
+        from .views import _parse_groups
+
+        required, recommended, custom = _parse_groups({
+            "required_courses_0": "cs 110, CS 115",
+            "required_group_type_0": "OR",
+            "recommended_courses_1": "MATH 103",
+            "custom_courses_2": "CS 210",
+            "custom_group_type_2": "",
+        })
+        self.assertEqual(required, [{"type": "OR", "courses": ["CS 110", "CS 115"]}])
+        self.assertEqual(recommended, [{"type": "OR", "courses": ["MATH 103"]}])
+        self.assertEqual(custom, [])
+
+
+class SchemaPlanTests(SimpleTestCase):
+    def test_seek_plans_pass_and_scans_fail(self):
+        seek = {"operatorType": "ProduceResults@neo4j", "children": [
+            {"operatorType": "Expand(All)@neo4j", "children": [
+                {"operatorType": "NodeUniqueIndexSeek@neo4j", "children": []}]}]}
+        scan = {"operatorType": "ProduceResults@neo4j", "children": [
+            {"operatorType": "Filter@neo4j", "children": [
+                {"operatorType": "NodeByLabelScan@neo4j", "children": []}]}]}
+        self.assertIn("NodeUniqueIndexSeek", plan_operators(seek))
+        self.assertIsNone(check_plan(plan_operators(seek)))
+        self.assertEqual(check_plan(plan_operators(scan)), "uses NodeByLabelScan")
+
+
+class GraphApiFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.snapshot = CatalogSnapshot("v1", SAMPLE_COURSES, SAMPLE_GROUPS)
+
+    def select(self, **params):
+        from .views import _graph_filters, _graph_selection
+
+        return [self.snapshot.codes[c] for c in _graph_selection(self.snapshot, _graph_filters(params))]
+
+    def test_department_and_level_filters(self):
+        self.assertEqual(self.select(dept="cs", level_min="200"), ["CS 210", "CS 215"])
+        self.assertEqual(self.select(dept="MATH"), ["MATH 103"])
+
+    def test_neighbourhood_goes_both_ways(self):
+        self.assertEqual(self.select(around="cs210"), ["CS 115", "CS 210", "CS 215", "MATH 103"])
+        self.assertEqual(self.select(around="CS 110", depth="2"), ["CS 110", "CS 115", "CS 210"])
+        self.assertEqual(self.select(around="CS 999"), [])
+
+    def test_invalid_parameters_are_rejected(self):
+        from .views import _graph_filters
+
+        for params in ({"page": "0"}, {"depth": "9"}, {"level_min": "abc"}, {"page_size": "100000"}):
+            with self.assertRaises(ValueError):
+                _graph_filters(params)
+
+
+class LayeredLayoutTests(SimpleTestCase):
+    def test_layers_follow_prerequisite_depth(self):
+        positions = compute_layout(CatalogSnapshot("v1", SAMPLE_COURSES, SAMPLE_GROUPS))
+        layers = {code: p["layer"] for code, p in positions.items()}
+        self.assertEqual(layers, {"CS 110": 0, "MATH 103": 0, "CS 115": 1, "CS 210": 2, "CS 215": 3})
+        self.assertLess(positions["CS 110"]["y"], positions["CS 115"]["y"])
+
+    def test_barycenter_ordering_removes_crossings(self):
+        courses = [{"code": code, "title": code} for code in ("A 1", "A 2", "B 1", "B 2")]
+        groups = [
+            {"course": "B 1", "id": "g1", "type": "AND", "recommended": False, "members": ["A 2"]},
+            {"course": "B 2", "id": "g2", "type": "AND", "recommended": False, "members": ["A 1"]},
+        ]
+        snapshot = CatalogSnapshot("v1", courses, groups)
+        preds, succs = prerequisite_lists(snapshot)
+        layer = assign_layers(preds, succs)
+        layers = [[0, 1], [2, 3]]
+        self.assertEqual(count_crossings(layers, preds), 1)
+        order_layers(layers, layer, preds, succs)
+        self.assertEqual(count_crossings(layers, preds), 0)
+
+    def test_wide_layers_wrap_and_cycles_are_placed(self):
+        courses = [{"code": f"X {i}", "title": ""} for i in range(5)]
+        groups = [
+            {"course": "X 0", "id": "g1", "type": "AND", "recommended": False, "members": ["X 1"]},
+            {"course": "X 1", "id": "g2", "type": "AND", "recommended": False, "members": ["X 0"]},
+        ]
+        positions = compute_layout(CatalogSnapshot("v1", courses, groups), max_row_width=2)
+        self.assertEqual(len(positions), 5)
+        self.assertEqual(len({p["y"] for p in positions.values()}), 3)
@@ -1,11 +1,55 @@
+import hashlib
+import json
 import re
-import uuid
-import re
-import uuid
+from datetime import datetime, timezone
 from django.shortcuts import render, redirect
 from django.contrib import messages
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_GET
 from .forms import CourseForm
-from CourseCompass.neo4j_driver import driver
+from CourseCompass.neo4j_driver import get_driver
+from .catalog import bump_catalog_version, catalog_updated_at, catalog_version, code_key, get_snapshot
+from .layout import get_layout
+from .writes import build_groups, missing_codes, save_course
+
+
+def _parse_groups(post):
+    """
+    Reads the required/recommended/custom prerequisite groups submitted by the
+    course form as three lists of {'type', 'courses'} dicts.
+    """
+    required_groups = []
+    recommended_groups = []
+    custom_groups = []
+
+    for key, value in post.items():
+        match_req = re.match(r'required_courses_(\d+)', key)
+        match_rec = re.match(r'recommended_courses_(\d+)', key)
+        match_cust = re.match(r'custom_courses_(\d+)', key)
+
+        if match_req:
+            index = match_req.group(1)
+            courses = [c.strip().upper() for c in value.split(',') if c.strip()]
+            group_type = post.get(f'required_group_type_{index}', 'AND')
+            if courses:
+                required_groups.append({'type': group_type, 'courses': courses})
+
+        if match_rec:
+            index = match_rec.group(1)
+            courses = [c.strip().upper() for c in value.split(',') if c.strip()]
+            group_type = post.get(f'recommended_group_type_{index}', 'OR')
+            if courses:
+                recommended_groups.append({'type': group_type, 'courses': courses})
+
+        if match_cust:
+            index = match_cust.group(1)
+            courses = [c.strip().upper() for c in value.split(',') if c.strip()]
+            group_type = post.get(f'custom_group_type_{index}', '').strip()
+            if courses and group_type:
+                custom_groups.append({'type': group_type, 'courses': courses})
+
+    return required_groups, recommended_groups, custom_groups
 
 
 def add_course(request):
@@ -19,49 +63,11 @@ def add_course(request):
             level = int(data['level'])
             description = data['description'].strip()
 
-            required_groups = []
-            recommended_groups = []
-            custom_groups = []
-
-            for key, value in request.POST.items():
-                match_req = re.match(r'required_courses_(\d+)', key)
-                match_rec = re.match(r'recommended_courses_(\d+)', key)
-                match_cust = re.match(r'custom_courses_(\d+)', key)
-
-                if match_req:
-                    index = match_req.group(1)
-                    courses = [c.strip().upper() for c in value.split(',') if c.strip()]
-                    group_type = request.POST.get(f'required_group_type_{index}', 'AND')
-                    if courses:
-                        required_groups.append({'type': group_type, 'courses': courses})
-
-                if match_rec:
-                    index = match_rec.group(1)
-                    courses = [c.strip().upper() for c in value.split(',') if c.strip()]
-                    group_type = request.POST.get(f'recommended_group_type_{index}', 'OR')
-                    if courses:
-                        recommended_groups.append({'type': group_type, 'courses': courses})
-
-                if match_cust:
-                    index = match_cust.group(1)
-                    courses = [c.strip().upper() for c in value.split(',') if c.strip()]
-                    group_type = request.POST.get(f'custom_group_type_{index}', '').strip()
-                    if courses and group_type:
-                        custom_groups.append({'type': group_type, 'courses': courses})
-
-            all_prereq_codes = {c for group in (required_groups + recommended_groups + custom_groups) for c in group['courses']}
-
-            with driver.session() as session:
-                missing = []
-                for code_check in all_prereq_codes:
-                    exists = session.run("MATCH (c:Course {code: $code}) RETURN c", code=code_check).single()
-                missing = []
-                for code_check in all_prereq_codes:
-                    exists = session.run("MATCH (c:Course {code: $code}) RETURN c", code=code_check).single()
-                    if not exists:
-                        missing.append(code_check)
-                        missing.append(code_check)
+            required_groups, recommended_groups, custom_groups = _parse_groups(request.POST)
+            groups = build_groups(code, required_groups, recommended_groups, custom_groups)
 
+            with get_driver().session() as session:
+                missing = session.execute_read(missing_codes, {c for group in groups for c in group['courses']})
                 if missing:
                     messages.error(request, f"Missing prerequisite courses: {', '.join(missing)}")
                     return render(request, 'courses/course_form.html', {
@@ -72,36 +78,15 @@ def add_course(request):
                         'custom_groups': custom_groups
                     })
 
-                session.run("""
-                    MERGE (c:Course {code: $code})
-                    SET c.title = $title, 
-                        c.credits = $credits, 
-                        c.level = $level,
-                        c.description = $description
-                """, code=code, title=title, credits=credits, level=level, description=description)
-
-                def add_prereq_group(tx, groups, is_recommended):
-                    for group in groups:
-                        group_type = group['type']
-                        group_id = str(uuid.uuid4())
-
-                        tx.run("""
-                            MATCH (c:Course {code: $course_code})
-                            CREATE (g:PrerequisiteGroup {id: $group_id, type: $group_type, recommended: $is_rec})
-                            MERGE (c)-[:REQUIRES]->(g)
-                        """, course_code=code, group_id=group_id, group_type=group_type, is_rec=is_recommended)
-
-                        for course in group['courses']:
-                            tx.run("""
-                                MATCH (p:Course {code: $prereq})
-                                MATCH (g:PrerequisiteGroup {id: $group_id})
-                                MERGE (g)-[:HAS]->(p)
-                            """, group_id=group_id, prereq=course)
-
-                session.write_transaction(add_prereq_group, required_groups, False)
-                session.write_transaction(add_prereq_group, recommended_groups, True)
-                session.write_transaction(add_prereq_group, custom_groups, None)
+                session.execute_write(save_course, {
+                    'code': code,
+                    'title': title,
+                    'credits': credits,
+                    'level': level,
+                    'description': description,
+                }, groups)
 
+            bump_catalog_version()
             messages.success(request, f"Course '{code}' added successfully.")
             return redirect('view_courses')
     else:
@@ -117,53 +102,162 @@ def add_course(request):
 
 
 def view_courses(request):
-    with driver.session() as session:
-        result = session.run("""
-            MATCH (c:Course)
-            OPTIONAL MATCH (c)-[:REQUIRES]->(g:PrerequisiteGroup)-[:HAS]->(p:Course)
-            RETURN c.code AS course_code, 
-                   c.title AS title, 
-                   c.description AS description,
-                   COLLECT(DISTINCT p.code) AS prerequisites
-            ORDER BY c.code
-        """)
-
-        courses = result.data()
-
-    nodes = []
-    edges = []
-    node_set = set()
-
-    for course in courses:
-        code = course['course_code']
-        title = course['title']
-        description = course.get('description', '') or ''
-        prerequisites = course['prerequisites']
-
-        if code not in node_set:
-            nodes.append({
-                'id': code,
-                'label': f"{code}\n{title}",
-                'description': description
-            })
-            node_set.add(code)
-
-        for prereq in prerequisites:
-            if prereq and prereq not in node_set:
-                nodes.append({'id': prereq, 'label': prereq, 'description': ''})
-                node_set.add(prereq)
-            if prereq:
-                edges.append({'from': prereq, 'to': code})  # Prereq → Course
-
-    return render(request, 'courses/view_graph.html', {
-        'nodes': nodes,
-        'edges': edges,
-        'courses': courses
-    })
+    """
+    Graph page; nodes, edges and the course table are fetched from graph_api.
+    """
+    return render(request, 'courses/view_graph.html')
+
+
+# ============================================================
+# GRAPH API
+# ============================================================
+GRAPH_PAGE_SIZE = 200
+GRAPH_MAX_PAGE_SIZE = 1000
+GRAPH_MAX_DEPTH = 3
+
+
+def _graph_filters(params):
+    """
+    Parses and validates the graph_api query string. Raises ValueError.
+    """
+    def integer(name, default=None, low=None, high=None):
+        value = params.get(name, '').strip()
+        if not value:
+            return default
+        number = int(value)
+        if low is not None and number < low:
+            raise ValueError(f"{name} must be at least {low}")
+        if high is not None and number > high:
+            raise ValueError(f"{name} must be at most {high}")
+        return number
+
+    return {
+        'dept': params.get('dept', '').strip().upper(),
+        'level_min': integer('level_min'),
+        'level_max': integer('level_max'),
+        'around': params.get('around', '').strip(),
+        'depth': integer('depth', 1, 1, GRAPH_MAX_DEPTH),
+        'page': integer('page', 1, 1),
+        'page_size': integer('page_size', GRAPH_PAGE_SIZE, 1, GRAPH_MAX_PAGE_SIZE),
+    }
+
+
+def _graph_selection(snapshot, filters):
+    """
+    Indices of the courses matching the filters, ordered by code.
+    """
+    if filters['around']:
+        c = snapshot.lookup(filters['around'])
+        candidates = snapshot.neighbourhood(c, filters['depth']) if c is not None else []
+    else:
+        candidates = range(len(snapshot))
+
+    dept = code_key(filters['dept'])
+    selected = []
+    for c in candidates:
+        level = snapshot.levels[c]
+        if dept and _department(snapshot.codes[c]) != dept:
+            continue
+        if filters['level_min'] is not None and (level is None or level < filters['level_min']):
+            continue
+        if filters['level_max'] is not None and (level is None or level > filters['level_max']):
+            continue
+        selected.append(c)
+    selected.sort(key=snapshot.codes.__getitem__)
+    return selected
+
+
+def _department(code):
+    return code_key(code).rstrip('0123456789')
+
+
+def _graph_etag(request, *args, **kwargs):
+    # The same query against the same catalog version always gives the same body.
+    query = hashlib.sha1(request.GET.urlencode().encode()).hexdigest()[:12]
+    return f"{catalog_version()}-{query}"
+
+
+def _graph_last_modified(request, *args, **kwargs):
+    return datetime.fromtimestamp(catalog_updated_at(), tz=timezone.utc)
+
+
+@require_GET
+@condition(etag_func=_graph_etag, last_modified_func=_graph_last_modified)
+def graph_api(request):
+    """
+    JSON nodes and edges of the prerequisite graph, one page of courses at a
+    time. Filters: dept (e.g. CS), level_min, level_max, around (a course code)
+    with depth (1-3 hops). Edges run prerequisite -> course and are listed
+    with the page holding their target course. Nodes carry fixed x/y/layer
+    coordinates from courses.layout when the layout is available.
+
+    Responses carry an ETag and Last-Modified derived from the catalog
+    version, so unchanged pages revalidate with a 304.
+    """
+    try:
+        filters = _graph_filters(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return JsonResponse({'error': 'Course catalog is unavailable.'}, status=503)
+
+    selected = _graph_selection(snapshot, filters)
+    layout = get_layout()
+    start = (filters['page'] - 1) * filters['page_size']
+    page = selected[start:start + filters['page_size']]
+    selected_set = set(selected)
+
+    def nodes():
+        for c in page:
+            node = {
+                'id': snapshot.codes[c],
+                'title': snapshot.titles[c],
+                'level': snapshot.levels[c],
+                'credits': snapshot.credits[c],
+                'description': snapshot.descriptions[c],
+                'prerequisites': snapshot.overview_row(c)['prereqs'],
+            }
+            node.update(layout.get(node['id'], {}))
+            yield node
+
+    def edges():
+        for c in page:
+            for g in snapshot.groups_of(c):
+                for m in snapshot.members_of(g):
+                    if m in selected_set:
+                        yield {
+                            'from': snapshot.codes[m],
+                            'to': snapshot.codes[c],
+                            'type': snapshot.group_types[g],
+                            'recommended': snapshot.group_recommended[g],
+                        }
+
+    def body():
+        # Streamed so a large page is never held as one string.
+        head = {
+            'version': snapshot.version,
+            'page': filters['page'],
+            'page_size': filters['page_size'],
+            'total': len(selected),
+            'has_next': start + len(page) < len(selected),
+        }
+        yield json.dumps(head)[:-1] + ', "nodes": ['
+        for i, node in enumerate(nodes()):
+            yield (',' if i else '') + json.dumps(node)
+        yield '], "edges": ['
+        for i, edge in enumerate(edges()):
+            yield (',' if i else '') + json.dumps(edge)
+        yield ']}'
+
+    response = StreamingHttpResponse(body(), content_type='application/json')
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    return response
 
 
 def edit_course(request, code):
-    with driver.session() as session:
+    with get_driver().session() as session:
         course_data = session.run("""
             MATCH (c:Course {code: $code})
             RETURN c.title AS title, 
@@ -185,44 +279,10 @@ def edit_course(request, code):
                 level = int(data['level'])
                 description = data['description'].strip()
 
-                required_groups = []
-                recommended_groups = []
-                custom_groups = []
-
-                for key, value in request.POST.items():
-                    match_req = re.match(r'required_courses_(\d+)', key)
-                    match_rec = re.match(r'recommended_courses_(\d+)', key)
-                    match_cust = re.match(r'custom_courses_(\d+)', key)
-
-                    if match_req:
-                        index = match_req.group(1)
-                        courses = [c.strip().upper() for c in value.split(',') if c.strip()]
-                        group_type = request.POST.get(f'required_group_type_{index}', 'AND')
-                        if courses:
-                            required_groups.append({'type': group_type, 'courses': courses})
-
-                    if match_rec:
-                        index = match_rec.group(1)
-                        courses = [c.strip().upper() for c in value.split(',') if c.strip()]
-                        group_type = request.POST.get(f'recommended_group_type_{index}', 'OR')
-                        if courses:
-                            recommended_groups.append({'type': group_type, 'courses': courses})
-
-                    if match_cust:
-                        index = match_cust.group(1)
-                        courses = [c.strip().upper() for c in value.split(',') if c.strip()]
-                        group_type = request.POST.get(f'custom_group_type_{index}', '').strip()
-                        if courses and group_type:
-                            custom_groups.append({'type': group_type, 'courses': courses})
-
-                all_prereq_codes = {c for group in (required_groups + recommended_groups + custom_groups) for c in group['courses']}
-
-                missing = []
-                for code_check in all_prereq_codes:
-                    exists = session.run("MATCH (c:Course {code: $code}) RETURN c", code=code_check).single()
-                    if not exists:
-                        missing.append(code_check)
+                required_groups, recommended_groups, custom_groups = _parse_groups(request.POST)
+                groups = build_groups(code, required_groups, recommended_groups, custom_groups)
 
+                missing = session.execute_read(missing_codes, {c for group in groups for c in group['courses']})
                 if missing:
                     messages.error(request, f"Missing prerequisite courses: {', '.join(missing)}")
                     return render(request, 'courses/course_form.html', {
@@ -234,41 +294,17 @@ def edit_course(request, code):
                         'code': code
                     })
 
-                session.run("""
-                    MATCH (c:Course {code: $code})
-                    SET c.title = $title, 
-                        c.credits = $credits, 
-                        c.level = $level,
-                        c.description = $description
-                """, code=code, title=title, credits=credits, level=level, description=description)
-
-                session.run("""
-                    MATCH (c:Course {code: $code})-[:REQUIRES]->(g:PrerequisiteGroup)
-                    DETACH DELETE g
-                """, code=code)
-
-                def add_prereq_group(tx, groups, is_recommended):
-                    for group in groups:
-                        group_type = group['type']
-                        group_id = str(uuid.uuid4())
-
-                        tx.run("""
-                            MATCH (c:Course {code: $course_code})
-                            CREATE (g:PrerequisiteGroup {id: $group_id, type: $group_type, recommended: $is_rec})
-                            MERGE (c)-[:REQUIRES]->(g)
-                        """, course_code=code, group_id=group_id, group_type=group_type, is_rec=is_recommended)
-
-                        for course in group['courses']:
-                            tx.run("""
-                                MATCH (p:Course {code: $prereq})
-                                MATCH (g:PrerequisiteGroup {id: $group_id})
-                                MERGE (g)-[:HAS]->(p)
-                            """, group_id=group_id, prereq=course)
-
-                session.write_transaction(add_prereq_group, required_groups, False)
-                session.write_transaction(add_prereq_group, recommended_groups, True)
-                session.write_transaction(add_prereq_group, custom_groups, None)
-
+                # Course properties and all groups/edges in one transaction;
+                # groups no longer submitted are removed by save_course.
+                session.execute_write(save_course, {
+                    'code': code,
+                    'title': title,
+                    'credits': credits,
+                    'level': level,
+                    'description': description,
+                }, groups)
+
+                bump_catalog_version()
                 messages.success(request, f"Course '{code}' updated successfully.")
                 return redirect('view_courses')
         else:
@@ -311,7 +347,7 @@ def edit_course(request, code):
 
 
 def delete_course(request, code):
-    with driver.session() as session:
+    with get_driver().session() as session:
         course_exists = session.run("MATCH (c:Course {code: $code}) RETURN c", code=code).single()
         if not course_exists:
             messages.error(request, f"Course '{code}' not found.")
@@ -323,5 +359,6 @@ def delete_course(request, code):
             DETACH DELETE c, g
         """, code=code)
 
+    bump_catalog_version()
     messages.success(request, f"Course '{code}' deleted successfully.")
     return redirect('view_courses')
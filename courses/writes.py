@@ -0,0 +1,149 @@
+"""
+Batched catalog writes
+----------------------
+UNWIND-based write helpers shared by the course views and the
+`import_catalog` management command. Each helper takes a transaction and a
+list of rows, so a caller decides how many courses go into one transaction.
+
+Prerequisite group ids are derived from their content (`group_id`), which
+makes re-running the same write a no-op: unchanged groups keep their node and
+HAS edges, and only groups that disappeared from a course are deleted.
+"""
+
+import re
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+GROUP_NAMESPACE = uuid.UUID("6c4b8a36-2d0f-4c39-9a55-2f5b8de3c0a1")
+
+# recommended flag of each group kind, as stored on PrerequisiteGroup nodes
+GROUP_KINDS = {"required": False, "recommended": True, "custom": None}
+DEFAULT_GROUP_TYPES = {"required": "AND", "recommended": "OR", "custom": ""}
+
+
+def normalize_code(code: str) -> str:
+    """
+    "cs  210 " -> "CS 210"; the same upper-casing the course form applies.
+    """
+    return re.sub(r"\s+", " ", (code or "").strip().upper())
+
+
+def group_id(course_code: str, group_type: str, recommended: Optional[bool], courses: Iterable[str]) -> str:
+    """
+    Deterministic id for a prerequisite group: the same course, type, flag and
+    members always map to the same id.
+    """
+    members = ",".join(sorted(courses))
+    return str(uuid.uuid5(GROUP_NAMESPACE, f"{course_code}|{group_type}|{recommended}|{members}"))
+
+
+def build_groups(course_code: str, required=(), recommended=(), custom=()) -> List[Dict[str, Any]]:
+    """
+    Turns {'type', 'courses'} groups of each kind into rows for write_groups.
+    """
+    rows = []
+    for kind, groups in (("required", required), ("recommended", recommended), ("custom", custom)):
+        flag = GROUP_KINDS[kind]
+        for group in groups:
+            courses = list(dict.fromkeys(normalize_code(c) for c in group["courses"] if c.strip()))
+            rows.append({
+                "id": group_id(course_code, group["type"], flag, courses),
+                "course": course_code,
+                "type": group["type"],
+                "recommended": flag,
+                "courses": courses,
+            })
+    return rows
+
+
+# ============================================================
+# TRANSACTION HELPERS
+# ============================================================
+MISSING_CODES_QUERY = """
+    UNWIND $codes AS code
+    OPTIONAL MATCH (c:Course {code: code})
+    WITH code, c WHERE c IS NULL
+    RETURN collect(code) AS missing
+"""
+
+WRITE_COURSES_QUERY = """
+    UNWIND $rows AS row
+    MERGE (c:Course {code: row.code})
+    SET c.title = row.title,
+        c.credits = row.credits,
+        c.level = row.level,
+        c.description = row.description
+"""
+
+DELETE_STALE_GROUPS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (:Course {code: row.course})-[:REQUIRES]->(g:PrerequisiteGroup)
+    WHERE NOT g.id IN row.keep
+    DETACH DELETE g
+    RETURN count(*) AS deleted
+"""
+
+WRITE_GROUPS_QUERY = """
+    UNWIND $rows AS row
+    MATCH (c:Course {code: row.course})
+    MERGE (g:PrerequisiteGroup {id: row.id})
+    SET g.type = row.type, g.recommended = row.recommended
+    MERGE (c)-[:REQUIRES]->(g)
+"""
+
+WRITE_EDGES_QUERY = """
+    UNWIND $rows AS row
+    MATCH (g:PrerequisiteGroup {id: row.group})
+    MATCH (p:Course {code: row.prereq})
+    MERGE (g)-[:HAS]->(p)
+"""
+
+def missing_codes(tx, codes: Iterable[str]) -> List[str]:
+    """
+    Codes (of those given) that have no Course node, in one round trip.
+    """
+    record = tx.run(MISSING_CODES_QUERY, codes=sorted(set(codes))).single()
+    return sorted(record["missing"]) if record else []
+
+
+def write_courses(tx, courses: List[Dict[str, Any]]) -> int:
+    """
+    Creates or updates Course nodes from {code, title, credits, level, description} rows.
+    """
+    if not courses:
+        return 0
+    tx.run(WRITE_COURSES_QUERY, rows=courses)
+    return len(courses)
+
+
+def write_groups(tx, course_codes: List[str], groups: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Makes the prerequisite groups of `course_codes` exactly `groups` (rows from
+    build_groups): stale groups are deleted, new ones created with their HAS
+    edges, unchanged ones left alone. Prerequisite courses must already exist.
+    """
+    keep = {code: [] for code in course_codes}
+    for group in groups:
+        keep.setdefault(group["course"], []).append(group["id"])
+
+    stale = [{"course": code, "keep": ids} for code, ids in keep.items()]
+    deleted = tx.run(DELETE_STALE_GROUPS_QUERY, rows=stale).single()["deleted"]
+
+    if groups:
+        rows = [{k: group[k] for k in ("id", "course", "type", "recommended")} for group in groups]
+        tx.run(WRITE_GROUPS_QUERY, rows=rows)
+
+    edges = [{"group": group["id"], "prereq": code} for group in groups for code in group["courses"]]
+    if edges:
+        tx.run(WRITE_EDGES_QUERY, rows=edges)
+
+    return {"groups": len(groups), "edges": len(edges), "deleted": deleted}
+
+
+def save_course(tx, course: Dict[str, Any], groups: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Creates or updates one course and makes its prerequisite groups exactly
+    `groups`, inside the caller's transaction (used by the add/edit views).
+    """
+    write_courses(tx, [course])
+    return write_groups(tx, [course["code"]], groups)
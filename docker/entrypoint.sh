@@ -2,5 +2,7 @@
 
 python manage.py migrate
 python manage.py collectstatic --noinput
+# Idempotent; a Neo4j hiccup at boot should not keep the web server down.
+python manage.py ensure_schema || echo "ensure_schema failed; continuing without verifying the Neo4j schema" >&2
 
 exec "$@"